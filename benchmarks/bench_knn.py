@@ -0,0 +1,158 @@
+# benchmarks/bench_knn.py
+#
+# Время и память стадии knn (рёбра SIMILAR_TO, src/index/knn.py) на
+# синтетической матрице эмбеддингов: кластеры «тем» + шум, L2; секции
+# (соседи внутри секции пропускаются) от тем не зависят.
+# Матрица пишется на диск (np.memmap), в памяти — только блоки.
+#
+# Полный проход O(N²): для больших N считается выборка --sample-rows
+# строк-запросов против всех N строк, время экстраполируется линейно
+# по строкам (каждая строка — один и тот же объём работы).
+#
+#   python -m benchmarks.bench_knn --chunks 100k
+#   python -m benchmarks.bench_knn --chunks 1m --sample-rows 2048
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.index.knn import KnnConfig, knn_blocked
+
+from .run_scaling import parse_size, git_meta
+
+
+def anon_mb() -> float:
+    """Анонимная память процесса (без страниц memmap-файлов), МБ."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class PeakMemory:
+    """Пик anon_mb() в фоне, раз в interval_s секунд."""
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self.peak = anon_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, anon_mb())
+            time.sleep(self.interval_s)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, anon_mb())
+
+
+def make_embeddings(path: Path, n: int, dim: int, n_groups: int, seed: int = 0, block: int = 65536):
+    """
+    Кластерные L2-нормированные векторы в .npy (memmap) + коды секций.
+    Тема — ~200 chunk-ов, косинус внутри темы ~0.6.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 200), dim)).astype(np.float32)
+    topics = rng.integers(0, len(centers), n)
+    groups = rng.integers(0, n_groups, n)
+    emb = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, dim))
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        x = centers[topics[start:stop]] + 0.8 * rng.standard_normal((stop - start, dim)).astype(np.float32)
+        emb[start:stop] = x / np.linalg.norm(x, axis=1, keepdims=True)
+    emb.flush()
+    del emb
+    return np.load(path, mmap_mode="r"), groups
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="SIMILAR_TO kNN build benchmark")
+    p.add_argument("--chunks", default="100k", help="например 100k, 1m")
+    p.add_argument("--dim", type=int, default=768)
+    p.add_argument("--sections", type=int, default=0, help="число секций (0 — chunks / 20)")
+    p.add_argument("--top-m", type=int, default=8)
+    p.add_argument("--min-sim", type=float, default=0.5)
+    p.add_argument("--block-rows", type=int, default=1024)
+    p.add_argument("--block-cols", type=int, default=8192)
+    p.add_argument("--sample-rows", type=int, default=0, help="строк-запросов для замера (0 — все)")
+    p.add_argument("--work-dir", default=None, help="где держать матрицу (по умолчанию — временный каталог)")
+    p.add_argument("--out", default=None, help="куда записать результат (JSON)")
+    return p.parse_args()
+
+
+def run():
+    args = parse_args()
+    n = parse_size(args.chunks)
+    n_groups = args.sections or max(1, n // 20)
+    sample = min(args.sample_rows or n, n)
+    cfg = KnnConfig(
+        top_m=args.top_m, min_sim=args.min_sim,
+        block_rows=args.block_rows, block_cols=args.block_cols,
+    )
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        t0 = time.perf_counter()
+        emb, groups = make_embeddings(Path(tmp) / "emb.npy", n, args.dim, n_groups)
+        gen_s = time.perf_counter() - t0
+        print(f"[bench_knn] {n} x {args.dim} embeddings in {gen_s:.1f} s")
+
+        base = anon_mb()
+        t0 = time.perf_counter()
+        with PeakMemory() as mem:
+            nbr, sim = knn_blocked(emb, cfg, groups=groups, rows=(0, sample))
+        knn_s = time.perf_counter() - t0
+
+    total_s = knn_s * n / sample
+    result = {
+        **git_meta(),
+        "chunks": n,
+        "dim": args.dim,
+        "sections": n_groups,
+        "top_m": cfg.top_m,
+        "block_rows": cfg.block_rows,
+        "block_cols": cfg.block_cols,
+        "blas_threads": os.environ.get("OPENBLAS_NUM_THREADS") or os.environ.get("OMP_NUM_THREADS") or os.cpu_count(),
+        "sample_rows": sample,
+        "sample_s": round(knn_s, 3),
+        "total_s": round(total_s, 1),
+        "extrapolated": sample < n,
+        "gflops": round(2.0 * sample * n * args.dim / knn_s / 1e9, 1),
+        "block_mb": round(cfg.block_bytes() / 2**20, 1),
+        "peak_anon_mb": round(mem.peak - base, 1),
+        "embeddings_mb": round(n * args.dim * 4 / 2**20, 1),
+        "result_mb": round(n * cfg.top_m * (4 + 4) / 2**20, 1),
+        "edges_per_chunk": round(float((nbr >= 0).sum(axis=1).mean()), 2),
+    }
+
+    print()
+    print(f"  chunks            {n} x {args.dim}  ({result['embeddings_mb']} MB on disk, memmap)")
+    print(f"  knn rows          {sample}{' (sample)' if sample < n else ''}  {knn_s:.1f} s  {result['gflops']} GFLOP/s")
+    print(f"  knn total         {total_s:.1f} s{' (extrapolated)' if sample < n else ''}  BLAS threads {result['blas_threads']}")
+    print(f"  memory            block {result['block_mb']} MB, peak anon +{result['peak_anon_mb']} MB")
+    print(f"  result            {result['result_mb']} MB (int32 ids + float32 sims), {result['edges_per_chunk']} edges/chunk")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n[bench_knn] results -> {args.out}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,103 @@
+# benchmarks/bench_serialization.py
+#
+# Размер ответа и время сериализации по проекциям run_query().
+# Эмбеддинги случайные (модель не нужна), запросы — векторы секций с шумом.
+#
+#   python -m benchmarks.bench_serialization --queries 200
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.pipeline import OntologyRAGPipeline, PROJECTIONS
+from src.serve.encoding import dumps_compact
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="run_query payload / serialization benchmark")
+    p.add_argument("--nodes", default="graphrag_nodes.json")
+    p.add_argument("--edges", default="graphrag_edges.json")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--max-context-tokens", type=int, default=6000)
+    p.add_argument("--out", default=None, help="куда записать результаты (JSON)")
+    return p.parse_args()
+
+
+def make_pipeline(args):
+    sections, text_nodes, graph_adj = load_ontology(args.nodes, args.edges)
+    sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+    rng = np.random.default_rng(0)
+    for tn in text_nodes.values():
+        tn.embedding = rng.standard_normal(args.dim).astype(np.float32)
+    for sec in sections.values():
+        sec.E_local = rng.standard_normal(args.dim).astype(np.float32)
+        sec.E_subtree = sec.E_local
+
+    pipeline = OntologyRAGPipeline(
+        sections, text_nodes, graph_adj, embedding_model=None,
+        max_graph_depth=5, max_graph_nodes=800, top_k_text=60,
+    )
+
+    sec_vecs = [s.E_local for s in sections.values()]
+    queries = [
+        sec_vecs[i % len(sec_vecs)] + 0.1 * rng.standard_normal(args.dim).astype(np.float32)
+        for i in range(args.queries)
+    ]
+    return pipeline, queries
+
+
+def timed(fn, items):
+    t0 = time.perf_counter()
+    out = [fn(x) for x in items]
+    return out, (time.perf_counter() - t0) * 1000 / max(1, len(items))
+
+
+def run():
+    args = parse_args()
+    pipeline, queries = make_pipeline(args)
+
+    rows = []
+    for projection in PROJECTIONS:
+        results, run_ms = timed(
+            lambda q: pipeline.run_embedded(
+                "bench", q,
+                max_context_tokens=args.max_context_tokens,
+                projection=projection,
+            ),
+            queries,
+        )
+        pretty, pretty_ms = timed(
+            lambda r: json.dumps(r, ensure_ascii=False, indent=2).encode("utf-8"), results
+        )
+        compact, compact_ms = timed(dumps_compact, results)
+
+        rows.append({
+            "projection": projection,
+            "run_ms": run_ms,
+            "pretty_bytes": float(np.mean([len(b) for b in pretty])),
+            "pretty_ms": pretty_ms,
+            "compact_bytes": float(np.mean([len(b) for b in compact])),
+            "compact_ms": compact_ms,
+        })
+
+    print(f"{'projection':<14}{'run ms':>9}{'indent=2 KB':>13}{'ms':>8}{'compact KB':>12}{'ms':>8}")
+    for r in rows:
+        print(
+            f"{r['projection']:<14}{r['run_ms']:>9.2f}"
+            f"{r['pretty_bytes'] / 1024:>13.1f}{r['pretty_ms']:>8.3f}"
+            f"{r['compact_bytes'] / 1024:>12.1f}{r['compact_ms']:>8.3f}"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"queries": args.queries, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,270 @@
+# benchmarks/run_scaling.py
+#
+# Масштабный бенчмарк на синтетических онтологиях (см. synth_ontology.py):
+# время и память load_ontology, build_hierarchy, эмбеддингов, BM25,
+# save_index / load_index и стадий run_query. Результат — JSON
+# в benchmarks/results/, два таких файла сравниваются через --compare.
+#
+#   python -m benchmarks.run_scaling --sizes 10k,100k
+#   python -m benchmarks.run_scaling --sizes 10k --model st     # настоящая модель
+#   python -m benchmarks.run_scaling --compare old.json new.json
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.data.loaders import load_ontology, build_reverse_adj
+from src.ontology.hierarchy import build_hierarchy, build_section_chunks
+from src.index.section_index import SectionIndex
+from src.index.text_index import TextIndex
+from src.index.embeddings import EmbeddingModel, DEFAULT_MODEL, HASH_MODEL
+from src.index.lexical_index import build_lexical_indexes
+from src.index.store import save_index, save_lexical
+from src.rag.pipeline import OntologyRAGPipeline
+from src.rag.instrument import Instrumentation
+
+from .synth_ontology import SynthConfig, generate
+
+
+BENCH_DIR = Path(__file__).resolve().parent
+DATA_DIR = BENCH_DIR / "data"
+RESULTS_DIR = BENCH_DIR / "results"
+
+
+# -------------------------------------------------------------
+# Замеры
+# -------------------------------------------------------------
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextlib.contextmanager
+def stage(results: dict, name: str, quiet: bool = True):
+    """Время и RSS после стадии; print-ы индексаторов глушатся."""
+    before = rss_mb()
+    t0 = time.perf_counter()
+    out = io.StringIO() if quiet else sys.stdout
+    with contextlib.redirect_stdout(out):
+        yield
+    results[name] = {
+        "s": time.perf_counter() - t0,
+        "rss_mb": rss_mb(),
+        "rss_delta_mb": rss_mb() - before,
+    }
+    print(f"  {name:<16} {results[name]['s']:>9.3f} s   rss {results[name]['rss_mb']:>8.1f} MB")
+
+
+def percentiles(values) -> dict:
+    a = np.asarray(values, dtype=np.float64)
+    return {
+        "p50": float(np.percentile(a, 50)),
+        "p95": float(np.percentile(a, 95)),
+        "mean": float(a.mean()),
+    }
+
+
+def dir_size_mb(path: Path) -> float:
+    return sum(p.stat().st_size for p in path.iterdir() if p.is_file()) / 2**20
+
+
+def git_meta() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "-uno"))}
+
+
+# -------------------------------------------------------------
+# Один размер
+# -------------------------------------------------------------
+def ensure_data(n_nodes: int, cfg_kwargs: dict) -> Path:
+    """Синтетические данные кэшируются в benchmarks/data/<n>/ (пересоздаются при смене параметров)."""
+    cfg = SynthConfig(n_nodes=n_nodes, **cfg_kwargs)
+    out = DATA_DIR / str(n_nodes)
+    stats_path = out / "synth_stats.json"
+    if stats_path.exists():
+        with open(stats_path, encoding="utf-8") as f:
+            if json.load(f)["config"] == vars(cfg):
+                return out
+    print(f"[run_scaling] generating {n_nodes} nodes -> {out}")
+    generate(str(out), cfg)
+    return out
+
+
+def bench_size(n_nodes: int, args, model) -> dict:
+    data = ensure_data(n_nodes, {"depth": args.depth, "fanout": args.fanout, "seed": args.seed})
+    with open(data / "synth_stats.json", encoding="utf-8") as f:
+        synth = json.load(f)
+    print(f"\n=== {synth['nodes']} nodes / {synth['edges']} edges ===")
+
+    stages = {}
+    with stage(stages, "load_ontology"):
+        sections, text_nodes, graph_adj = load_ontology(
+            str(data / "graphrag_nodes.json"), str(data / "graphrag_edges.json")
+        )
+        graph_radj = build_reverse_adj(graph_adj)
+
+    with stage(stages, "build_hierarchy"):
+        build_hierarchy(sections, text_nodes)
+        section_chunks = build_section_chunks(sections, text_nodes)
+
+    with stage(stages, "embed_sections"):
+        SectionIndex(model).compute_section_embeddings(sections)
+
+    with stage(stages, "embed_text"):
+        txt_index = TextIndex(model)
+        txt_index.compute_textnode_embeddings(text_nodes)
+        txt_index.compute_token_counts(text_nodes)
+
+    with stage(stages, "lexical"):
+        lexical = build_lexical_indexes(sections, text_nodes)
+
+    index_dir = Path(tempfile.mkdtemp(prefix="bench_index_"))
+    try:
+        with stage(stages, "save_index"):
+            save_index(str(index_dir), sections, text_nodes, graph_adj, graph_radj, section_chunks)
+            save_lexical(str(index_dir), lexical)
+        index_mb = dir_size_mb(index_dir)
+
+        del sections, text_nodes, graph_adj, graph_radj, section_chunks, lexical
+
+        inst = Instrumentation(timings=True)
+        with stage(stages, "load_index"):
+            pipeline = OntologyRAGPipeline.from_index(
+                str(index_dir), model, instrument=inst, expand_cache_size=0
+            )
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+    # запросы — заголовки случайных секций: drill гарантированно что-то находит
+    rng = np.random.default_rng(args.seed)
+    sids = list(pipeline.sections)
+    picks = rng.choice(len(sids), size=min(args.queries, len(sids)), replace=False)
+    queries = [pipeline.section_title(sids[i]) or sids[i] for i in picks]
+
+    totals, per_stage = [], {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for q in queries:
+            t0 = time.perf_counter()
+            result = pipeline.run_query(q, max_context_tokens=args.max_context_tokens)
+            totals.append((time.perf_counter() - t0) * 1000)
+            for name, ms in result["timings"].items():
+                per_stage.setdefault(name, []).append(ms)
+
+    query = {
+        "n": len(queries),
+        "total_ms": percentiles(totals),
+        "stages_ms": {name: percentiles(v) for name, v in per_stage.items()},
+        "mean_counters": inst.summary()["mean_counters"],
+    }
+    print(f"  run_query        p50 {query['total_ms']['p50']:.2f} ms   "
+          f"p95 {query['total_ms']['p95']:.2f} ms   ({len(queries)} queries)")
+
+    return {
+        "size": n_nodes,
+        "synth": {"nodes": synth["nodes"], "edges": synth["edges"]},
+        "stages": stages,
+        "index_mb": index_mb,
+        "query": query,
+    }
+
+
+# -------------------------------------------------------------
+# Сравнение двух прогонов
+# -------------------------------------------------------------
+def compare(path_a: str, path_b: str):
+    with open(path_a, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(path_b, encoding="utf-8") as f:
+        b = json.load(f)
+
+    print(f"A: {a['meta'].get('commit')}  B: {b['meta'].get('commit')}")
+    runs_a = {r["size"]: r for r in a["runs"]}
+    for rb in b["runs"]:
+        ra = runs_a.get(rb["size"])
+        if ra is None:
+            continue
+        print(f"\n=== size {rb['size']} ===")
+        print(f"{'metric':<28}{'A':>12}{'B':>12}{'B/A':>8}")
+        rows = [(f"{k} s", ra["stages"][k]["s"], v["s"]) for k, v in rb["stages"].items() if k in ra["stages"]]
+        rows.append(("index MB", ra["index_mb"], rb["index_mb"]))
+        for p in ("p50", "p95"):
+            rows.append((f"run_query {p} ms", ra["query"]["total_ms"][p], rb["query"]["total_ms"][p]))
+        for name, va, vb in rows:
+            ratio = vb / va if va else float("nan")
+            print(f"{name:<28}{va:>12.3f}{vb:>12.3f}{ratio:>8.2f}")
+
+
+def parse_size(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 10**3, "m": 10**6}.get(s[-1], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="OntologyRAG scaling benchmark")
+    p.add_argument("--sizes", default="10k,100k", help="например 10k,100k,1m,10m")
+    p.add_argument("--depth", type=int, default=3)
+    p.add_argument("--fanout", type=int, default=4)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--max-context-tokens", type=int, default=6000)
+    p.add_argument("--model", choices=("hash", "st"), default="hash",
+                   help="hash — HashingBackend (n-граммы, без модели), st — SentenceTransformer")
+    p.add_argument("--out", default=None, help="файл результата (по умолчанию benchmarks/results/)")
+    p.add_argument("--compare", nargs=2, metavar=("A", "B"), default=None)
+    return p.parse_args()
+
+
+def run():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    model = EmbeddingModel(DEFAULT_MODEL if args.model == "st" else HASH_MODEL, device="cpu")
+
+    runs = [bench_size(parse_size(s), args, model) for s in args.sizes.split(",")]
+
+    meta = {
+        **git_meta(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "model": args.model,
+        "args": vars(args),
+    }
+
+    out = Path(args.out) if args.out else (
+        RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}_{(meta['commit'] or 'nogit')[:8]}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "runs": runs}, f, indent=2)
+    print(f"\n[run_scaling] results -> {out}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,296 @@
+# benchmarks/sweep.py
+#
+# Офлайн-перебор параметров пайплайна: recall@k, MRR, p50/p95 латентности
+# и размер payload для каждой конфигурации сетки + Парето-фронт.
+#
+# Файл с разметкой (JSONL): {"query": str, "sections": [section_id...], "chunks": [node_id...]}
+# (достаточно одного из полей), пример — benchmarks/queries_sample.jsonl.
+#
+#   python -m benchmarks.sweep --labels benchmarks/queries_sample.jsonl \
+#       --grid max_graph_depth=2,3,5 top_k_text=20,60 drill.top_k=1,2,3 top_r=1,3 \
+#       --target-recall 0.9
+
+import argparse
+import copy
+import io
+import itertools
+import json
+import contextlib
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.index.section_index import SectionIndex
+from src.index.text_index import TextIndex
+from src.index.embeddings import EmbeddingModel, DEFAULT_MODEL, HASH_MODEL
+from src.index.lexical_index import build_lexical_indexes
+from src.rag.pipeline import OntologyRAGPipeline
+from src.rag.drill import DrillConfig
+from src.rag.score import ScoreConfig
+from src.rag.instrument import Instrumentation
+from src.serve.encoding import dumps_compact
+
+
+DEFAULT_GRID = {
+    "max_graph_depth": [2, 3, 5],
+    "max_graph_nodes": [200, 800],
+    "top_k_text": [20, 60],
+    "top_r": [1, 3],
+    "drill.top_k": [1, 2, 3],
+}
+
+# атрибуты пайплайна, которые можно менять без перестройки индекса
+PIPELINE_PARAMS = {"max_graph_depth", "max_graph_nodes", "top_k_text", "top_r", "expand_mode", "expand_slack"}
+DRILL_PARAMS = {"tau_local", "tau_child", "margin", "top_k", "w_bm25"}
+
+
+# -------------------------------------------------------------
+# Разметка и сетка
+# -------------------------------------------------------------
+def load_labels(path: str) -> List[dict]:
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if not item.get("sections") and not item.get("chunks"):
+                raise ValueError(f"no 'sections' / 'chunks' labels for query {item.get('query')!r}")
+            labels.append(item)
+    return labels
+
+
+def parse_value(s: str):
+    for cast in (int, float):
+        try:
+            return cast(s)
+        except ValueError:
+            pass
+    return s
+
+
+def parse_grid(specs: Optional[List[str]], grid_file: Optional[str]) -> Dict[str, list]:
+    if grid_file:
+        with open(grid_file, encoding="utf-8") as f:
+            grid = json.load(f)
+    elif specs:
+        grid = {}
+        for spec in specs:
+            key, _, values = spec.partition("=")
+            grid[key] = [parse_value(v) for v in values.split(",")]
+    else:
+        grid = dict(DEFAULT_GRID)
+
+    for key in grid:
+        name = key[len("drill."):] if key.startswith("drill.") else key
+        known = DRILL_PARAMS if key.startswith("drill.") else PIPELINE_PARAMS
+        if name not in known:
+            raise SystemExit(f"[sweep] unknown parameter {key!r}; "
+                             f"expected one of {sorted(PIPELINE_PARAMS)} or drill.{sorted(DRILL_PARAMS)}")
+    return grid
+
+
+def grid_configs(grid: Dict[str, list]) -> List[dict]:
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def apply_config(pipeline: OntologyRAGPipeline, base_drill: DrillConfig, params: dict):
+    drill = copy.copy(base_drill)
+    for key, value in params.items():
+        if key.startswith("drill."):
+            setattr(drill, key[len("drill."):], value)
+        else:
+            setattr(pipeline, key, value)
+    pipeline.drill_cfg = drill
+
+
+# -------------------------------------------------------------
+# Метрики
+# -------------------------------------------------------------
+def recall_at(ranked: List[str], expected: set, k: int) -> float:
+    return len(expected.intersection(ranked[:k])) / len(expected)
+
+
+def reciprocal_rank(ranked: List[str], expected: set) -> float:
+    for i, x in enumerate(ranked, 1):
+        if x in expected:
+            return 1.0 / i
+    return 0.0
+
+
+def evaluate(results: List[dict], labels: List[dict], ks: List[int]) -> dict:
+    out = {}
+    for kind, get_ids in (
+        ("sections", lambda r: [c["section_id"] for c in r["section_candidates"]]),
+        ("chunks", lambda r: [t["node_id"] for t in r.get("text_nodes", [])]),
+    ):
+        pairs = [(get_ids(r), set(lab[kind])) for r, lab in zip(results, labels) if lab.get(kind)]
+        if not pairs:
+            continue
+        for k in ks:
+            out[f"{kind}_recall@{k}"] = float(np.mean([recall_at(ids, exp, k) for ids, exp in pairs]))
+        out[f"{kind}_mrr"] = float(np.mean([reciprocal_rank(ids, exp) for ids, exp in pairs]))
+    return out
+
+
+def pareto_front(rows: List[dict], recall_key: str) -> List[int]:
+    """Индексы конфигураций, которые не хуже других по recall, p95 и payload одновременно."""
+    front = []
+    for i, a in enumerate(rows):
+        dominated = False
+        for j, b in enumerate(rows):
+            if i == j:
+                continue
+            no_worse = (
+                b[recall_key] >= a[recall_key]
+                and b["p95_ms"] <= a["p95_ms"]
+                and b["payload_bytes"] <= a["payload_bytes"]
+            )
+            better = (
+                b[recall_key] > a[recall_key]
+                or b["p95_ms"] < a["p95_ms"]
+                or b["payload_bytes"] < a["payload_bytes"]
+            )
+            if no_worse and better:
+                dominated = True
+                break
+        if not dominated:
+            front.append(i)
+    return front
+
+
+# -------------------------------------------------------------
+# Пайплайн
+# -------------------------------------------------------------
+def make_pipeline(args, model) -> OntologyRAGPipeline:
+    """Готовый индекс (--index с text_nodes.pkl) или построение в памяти из JSON."""
+    kwargs = dict(drill_cfg=DrillConfig(), score_cfg=ScoreConfig(w_bm25=args.w_bm25), expand_cache_size=4096)
+
+    if args.index and (Path(args.index) / "text_nodes.pkl").exists():
+        return OntologyRAGPipeline.from_index(args.index, model, **kwargs)
+
+    print(f"[sweep] building in-memory index from {args.nodes}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        sections, text_nodes, graph_adj = load_ontology(args.nodes, args.edges)
+        build_hierarchy(sections, text_nodes)
+        SectionIndex(model).compute_section_embeddings(sections)
+        txt_index = TextIndex(model)
+        txt_index.compute_textnode_embeddings(text_nodes)
+        txt_index.compute_token_counts(text_nodes)
+        lexical = build_lexical_indexes(sections, text_nodes)
+    return OntologyRAGPipeline(
+        sections, text_nodes, graph_adj, model, lexical=lexical, **kwargs
+    )
+
+
+def run_config(pipeline, queries, q_embs, labels, params, args) -> dict:
+    apply_config(pipeline, args.base_drill, params)
+    opts = dict(max_context_tokens=args.max_context_tokens, batch_size=args.batch_size)
+
+    # прогрев кэша окрестностей для этой глубины — не меряем
+    pipeline.run_batch(queries, q_embs=q_embs, **opts)
+
+    results = pipeline.run_batch(queries, q_embs=q_embs, **opts)
+    latencies = [sum(r["timings"].values()) for r in results]
+    payload = [len(dumps_compact(r["section_candidates"])) for r in results]
+
+    row = {
+        "params": params,
+        **evaluate(results, labels, args.ks),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "payload_bytes": float(np.mean(payload)),
+        "context_tokens": float(np.mean([r["context_budget"]["used_tokens"] for r in results]))
+        if args.max_context_tokens is not None else None,
+    }
+    return row
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Recall vs latency sweep over pipeline parameters")
+    p.add_argument("--labels", required=True, help="JSONL: query, sections и/или chunks")
+    p.add_argument("--index", default="index", help="каталог индекса (если есть text_nodes.pkl)")
+    p.add_argument("--nodes", default="graphrag_nodes.json")
+    p.add_argument("--edges", default="graphrag_edges.json")
+    p.add_argument("--model", choices=("st", "hash"), default="st")
+    p.add_argument("--grid", nargs="*", default=None, help="param=v1,v2 ... (drill.* — поля DrillConfig)")
+    p.add_argument("--grid-file", default=None, help="JSON {param: [values]}")
+    p.add_argument("--k", default="1,3,5", help="k для recall@k")
+    p.add_argument("--target-recall", type=float, default=None)
+    p.add_argument("--w-bm25", type=float, default=0.3)
+    p.add_argument("--max-context-tokens", type=int, default=6000)
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--out", default=None, help="файл результата (JSON)")
+    return p.parse_args()
+
+
+def run():
+    args = parse_args()
+    args.ks = [int(k) for k in args.k.split(",")]
+    labels = load_labels(args.labels)
+    grid = parse_grid(args.grid, args.grid_file)
+    configs = grid_configs(grid)
+
+    model = EmbeddingModel(DEFAULT_MODEL if args.model == "st" else HASH_MODEL, device="cpu")
+
+    pipeline = make_pipeline(args, model)
+    pipeline.instrument = Instrumentation(timings=True)
+    args.base_drill = pipeline.drill_cfg
+
+    queries = [lab["query"] for lab in labels]
+    t0 = time.perf_counter()
+    q_embs = model.encode(queries)
+    embed_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    print(f"[sweep] {len(queries)} queries, {len(configs)} configs, embedding {embed_ms:.2f} ms/query")
+
+    rows = []
+    for i, params in enumerate(configs, 1):
+        rows.append(run_config(pipeline, queries, q_embs, labels, params, args))
+        print(f"  [{i}/{len(configs)}] {params}")
+
+    kind = "sections" if any(lab.get("sections") for lab in labels) else "chunks"
+    recall_key = f"{kind}_recall@{max(args.ks)}"
+    front = set(pareto_front(rows, recall_key))
+    for i, row in enumerate(rows):
+        row["pareto"] = i in front
+
+    print(f"\n{'':2}{recall_key:>20}{'mrr':>8}{'p50 ms':>9}{'p95 ms':>9}{'payload KB':>12}  params")
+    for row in sorted(rows, key=lambda r: r["p95_ms"]):
+        print(
+            f"{'*' if row['pareto'] else ' ':2}{row[recall_key]:>20.3f}{row[f'{kind}_mrr']:>8.3f}"
+            f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['payload_bytes'] / 1024:>12.1f}  {row['params']}"
+        )
+    print("* — Парето-фронт (recall ↑, p95 ↓, payload ↓)")
+
+    best = None
+    if args.target_recall is not None:
+        ok = [r for r in rows if r[recall_key] >= args.target_recall]
+        if ok:
+            best = min(ok, key=lambda r: (r["p95_ms"], r["payload_bytes"]))
+            print(f"\nCheapest config with {recall_key} >= {args.target_recall}: {best['params']} "
+                  f"(p95 {best['p95_ms']:.2f} ms, payload {best['payload_bytes'] / 1024:.1f} KB)")
+        else:
+            print(f"\nNo config reaches {recall_key} >= {args.target_recall}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "labels": args.labels,
+                "grid": grid,
+                "recall_key": recall_key,
+                "embed_ms_per_query": embed_ms,
+                "rows": rows,
+                "pareto": [rows[i]["params"] for i in sorted(front)],
+                "best": best["params"] if best else None,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"[sweep] results -> {args.out}")
+
+
+if __name__ == "__main__":
+    run()
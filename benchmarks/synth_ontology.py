@@ -0,0 +1,293 @@
+# benchmarks/synth_ontology.py
+#
+# Синтетическая онтология в формате graphrag_nodes.json / graphrag_edges.json:
+# дерево секций (глубина, ветвление), chunk-и с текстом, пункты списков,
+# рисунки с подписями, ссылки LINKS_TO на страницы (ReferenceTarget) и URL.
+# JSON пишется потоково — 10M узлов не держатся в памяти.
+#
+#   python -m benchmarks.synth_ontology --nodes 100000 --out-dir benchmarks/data/100k
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+
+class SynthConfig:
+    """
+    Параметры генератора.
+
+    n_nodes            — целевое число узлов (генерация останавливается, когда достигнуто)
+    depth              — глубина дерева секций (1 — только корневые)
+    fanout             — число подсекций у секции
+    chunks_per_section — среднее число chunk-ов секции (Пуассон)
+    words_per_chunk    — среднее число слов в chunk-е
+    list_item_rate     — доля chunk-ов со списком (2–5 пунктов)
+    figure_rate        — доля chunk-ов-подписей к рисунку
+    links_rate         — среднее число LINKS_TO на chunk
+    url_share          — доля ссылок на URL (остальные — на страницы)
+    chunks_per_page    — chunk-ов на страницу документа
+    """
+
+    def __init__(
+        self,
+        n_nodes: int = 10_000,
+        depth: int = 3,
+        fanout: int = 4,
+        chunks_per_section: float = 12.0,
+        words_per_chunk: float = 25.0,
+        list_item_rate: float = 0.05,
+        figure_rate: float = 0.1,
+        links_rate: float = 0.2,
+        url_share: float = 0.1,
+        chunks_per_page: int = 8,
+        vocab_size: int = 20_000,
+        n_urls: int = 200,
+        seed: int = 0,
+    ):
+        self.n_nodes = n_nodes
+        self.depth = depth
+        self.fanout = fanout
+        self.chunks_per_section = chunks_per_section
+        self.words_per_chunk = words_per_chunk
+        self.list_item_rate = list_item_rate
+        self.figure_rate = figure_rate
+        self.links_rate = links_rate
+        self.url_share = url_share
+        self.chunks_per_page = chunks_per_page
+        self.vocab_size = vocab_size
+        self.n_urls = n_urls
+        self.seed = seed
+
+
+_SYLLABLES = [
+    "ра", "со", "ли", "ке", "ту", "ми", "на", "ве", "ло", "ди", "ка", "ро",
+    "пе", "зо", "ны", "ск", "ст", "тр", "кл", "вы", "по", "да", "ре", "ни",
+]
+
+
+def make_vocab(size: int, rng: np.random.Generator):
+    """Псевдослова из слогов; частоты — Zipf, как в реальном тексте."""
+    words = set()
+    while len(words) < size:
+        n = int(rng.integers(2, 5))
+        words.add("".join(_SYLLABLES[i] for i in rng.integers(0, len(_SYLLABLES), n)))
+    words = sorted(words)
+    rng.shuffle(words)          # частотный ранг не должен зависеть от алфавита
+    ranks = np.arange(1, size + 1, dtype=np.float64)
+    p = 1.0 / ranks
+    return words, p / p.sum()
+
+
+class _JsonArrayWriter:
+    """Потоковая запись JSON-массива объектов."""
+
+    def __init__(self, path: Path):
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write("[\n")
+        self.first = True
+        self.count = 0
+
+    def write(self, obj: dict):
+        if not self.first:
+            self.f.write(",\n")
+        self.f.write(json.dumps(obj, ensure_ascii=False))
+        self.first = False
+        self.count += 1
+
+    def close(self):
+        self.f.write("\n]\n")
+        self.f.close()
+
+
+class OntologySynth:
+    """
+    Генерирует документ обходом дерева секций в глубину
+    (порядок узлов = порядок документа, как в исходном JSON).
+    """
+
+    def __init__(self, cfg: SynthConfig):
+        self.cfg = cfg
+        self.rng = np.random.default_rng(cfg.seed)
+        self.vocab, self.vocab_p = make_vocab(cfg.vocab_size, self.rng)
+
+        # слова пачками — вызов rng.choice на каждый chunk заметно медленнее
+        self._word_buf = np.empty(0, dtype=np.int64)
+        self._word_pos = 0
+
+        self.ch = 0            # сквозной номер chunk_id
+        self.page = 1
+        self.page_fill = 0
+        self.fig = 0
+        self.nodes = None
+        self.edges = None
+        self.ref_pages = set()
+        self.urls_used = set()
+
+    # -------------------------------------------------------------
+    # Тексты
+    # -------------------------------------------------------------
+    def _words(self, n: int) -> str:
+        if self._word_pos + n > len(self._word_buf):
+            self._word_buf = self.rng.choice(len(self.vocab), size=1 << 16, p=self.vocab_p)
+            self._word_pos = 0
+        ids = self._word_buf[self._word_pos:self._word_pos + n]
+        self._word_pos += n
+        return " ".join(self.vocab[i] for i in ids)
+
+    def _text(self) -> str:
+        n = max(3, int(self.rng.poisson(self.cfg.words_per_chunk)))
+        return self._words(n).capitalize() + "."
+
+    # -------------------------------------------------------------
+    # Узлы и рёбра
+    # -------------------------------------------------------------
+    def _next_chunk_id(self) -> str:
+        cid = f"ch{self.ch:07d}"
+        self.ch += 1
+        return cid
+
+    def _node(self, node_id: str, node_type: str, text: str, **attrs):
+        attrs["label"] = node_type
+        self.nodes.write({"id": node_id, "type": node_type, "text": text, "attributes": attrs})
+
+    def _edge(self, source: str, target: str, rel: str):
+        self.edges.write({"source": source, "target": target, "type": rel})
+
+    def _advance_page(self, section_id: str):
+        self.page_fill += 1
+        if self.page_fill < self.cfg.chunks_per_page:
+            return
+        self.page_fill = 0
+        self.page += 1
+        # номер страницы отдельным chunk-ом секции — как в исходных данных
+        # (loader отбрасывает такие chunk-и)
+        cid = self._next_chunk_id()
+        self._node(f"chunk_{cid}", "Chunk", str(self.page), chunk_id=cid,
+                   page_start=float(self.page), page_end=float(self.page), type="paragraph")
+        self._edge(section_id, f"chunk_{cid}", "HAS_CHUNK")
+
+    def _chunk(self, section_id: str, text: str, kind: str = "paragraph") -> str:
+        cid = self._next_chunk_id()
+        nid = f"chunk_{cid}"
+        self._node(nid, "Chunk", text, chunk_id=cid,
+                   page_start=float(self.page), page_end=float(self.page), type=kind)
+        self._edge(section_id, nid, "HAS_CHUNK")
+        self._advance_page(section_id)
+        return nid
+
+    def _section(self, level: int, parent_id):
+        cfg, rng = self.cfg, self.rng
+        title = self._words(int(rng.integers(2, 6))).capitalize()
+
+        cid = f"ch{self.ch:07d}"
+        sid = f"section_{cid}"
+        self._node(sid, "Section", title, chunk_id=cid,
+                   page_start=float(self.page), page_end=float(self.page), level=float(level))
+        if parent_id is not None:
+            self._edge(parent_id, sid, "HAS_SUBSECTION")
+
+        # первый chunk секции — её заголовок
+        self._chunk(sid, title, kind="heading")
+
+        for _ in range(int(rng.poisson(cfg.chunks_per_section))):
+            if self.nodes.count >= cfg.n_nodes:
+                break
+
+            r = rng.random()
+            if r < cfg.figure_rate:
+                self.fig += 1
+                cap = self._chunk(sid, f"Рисунок {self.fig} — {self._words(4)}", kind="caption")
+                fid = f"figure_fig_{self.fig:07d}"
+                self._node(fid, "Figure", f"Рисунок {self.fig}", figure_id=f"fig_{self.fig:07d}",
+                           figure_number=float(self.fig), page=float(self.page))
+                self._edge(cap, fid, "CAPTIONS")
+                continue
+
+            nid = self._chunk(sid, self._text())
+
+            if r < cfg.figure_rate + cfg.list_item_rate:
+                for order in range(int(rng.integers(2, 6))):
+                    li = f"listitem_{self._next_chunk_id()}_{order}"
+                    self._node(li, "ListItem", f"{order + 1}. {self._words(8)}",
+                               page_start=float(self.page), order=float(order))
+                    self._edge(nid, li, "HAS_ITEM")
+
+            for _ in range(int(rng.poisson(cfg.links_rate))):
+                if rng.random() < cfg.url_share:
+                    k = int(rng.integers(0, cfg.n_urls))
+                    self.urls_used.add(k)
+                    self._edge(nid, f"url_{k}", "LINKS_TO")
+                else:
+                    p = int(rng.integers(1, self.page + 1))
+                    self.ref_pages.add(p)
+                    self._edge(nid, f"ref_{p}", "LINKS_TO")
+
+        return sid
+
+    def generate(self, out_dir: str):
+        cfg = self.cfg
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        self.nodes = _JsonArrayWriter(out / "graphrag_nodes.json")
+        self.edges = _JsonArrayWriter(out / "graphrag_edges.json")
+
+        # обход в глубину: (уровень, родитель)
+        stack = []
+        while self.nodes.count < cfg.n_nodes:
+            stack.append((1, None))
+            while stack and self.nodes.count < cfg.n_nodes:
+                level, parent = stack.pop()
+                sid = self._section(level, parent)
+                if level < cfg.depth:
+                    # дети в обратном порядке, чтобы первый вышел первым
+                    stack.extend((level + 1, sid) for _ in range(cfg.fanout))
+
+        # цели ссылок — в конце, как отдельные узлы
+        for p in sorted(self.ref_pages):
+            self._node(f"ref_{p}", "ReferenceTarget", str(p))
+        for k in sorted(self.urls_used):
+            self._node(f"url_{k}", "Url", f"https://example.org/doc/{k}")
+
+        n_nodes, n_edges = self.nodes.count, self.edges.count
+        self.nodes.close()
+        self.edges.close()
+
+        stats = {"nodes": n_nodes, "edges": n_edges, "pages": self.page, "config": vars(cfg)}
+        with open(out / "synth_stats.json", "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        return stats
+
+
+def generate(out_dir: str, cfg: SynthConfig = SynthConfig()) -> dict:
+    """Пишет graphrag_nodes.json / graphrag_edges.json в out_dir; возвращает статистику."""
+    return OntologySynth(cfg).generate(out_dir)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Synthetic graphrag ontology generator")
+    p.add_argument("--nodes", type=int, default=10_000)
+    p.add_argument("--depth", type=int, default=3)
+    p.add_argument("--fanout", type=int, default=4)
+    p.add_argument("--chunks-per-section", type=float, default=12.0)
+    p.add_argument("--words-per-chunk", type=float, default=25.0)
+    p.add_argument("--links-rate", type=float, default=0.2)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out-dir", required=True)
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    cfg = SynthConfig(
+        n_nodes=args.nodes,
+        depth=args.depth,
+        fanout=args.fanout,
+        chunks_per_section=args.chunks_per_section,
+        words_per_chunk=args.words_per_chunk,
+        links_rate=args.links_rate,
+        seed=args.seed,
+    )
+    stats = generate(args.out_dir, cfg)
+    print(f"[synth_ontology] {stats['nodes']} nodes, {stats['edges']} edges -> {args.out_dir}")
@@ -1,34 +1,61 @@
 # build_index.py
-
-from src.data.loaders import load_ontology
-from src.ontology.hierarchy import build_hierarchy
-from src.index.embeddings import EmbeddingModel
-from src.index.section_index import SectionIndex
-from src.index.text_index import TextIndex
-from src.index.store import save_index
-
-
-print("=== 1. Load ontology ===")
-sections, text_nodes, graph_adj = load_ontology(
-    "graphrag_nodes.json",
-    "graphrag_edges.json"
-)
-
-print("=== 2. Build hierarchy ===")
-build_hierarchy(sections, text_nodes)
-
-print("=== 3. Init embedding model ===")
-model = EmbeddingModel(device="cpu")
-
-print("=== 4. Compute section embeddings ===")
-sec_index = SectionIndex(model)
-sec_index.compute_section_embeddings(sections)
-
-print("=== 5. Compute text node embeddings ===")
-txt_index = TextIndex(model)
-txt_index.compute_textnode_embeddings(text_nodes)
-
-print("=== 6. Save index ===")
-save_index("index", sections, text_nodes, graph_adj)
-
-print("\n=== DONE. Index saved to /index ===")
+#
+# Поэтапная сборка оффлайн-индекса (см. src/index/staged_build.py):
+# промежуточные результаты — в index/.build/, повторный запуск
+# пропускает готовые стадии и продолжает эмбеддинги с последней пачки.
+#
+#   python build_index.py
+#   python build_index.py --force lexical        # пересобрать BM25 (и save)
+#   python build_index.py --dedup-threshold 0    # без склейки почти-дубликатов
+#   python build_index.py --knn-top-m 8          # + рёбра SIMILAR_TO между chunk-ами
+#   python build_index.py --memmap-embeddings    # векторы только в .npy (узлы и граф — в памяти)
+
+import argparse
+
+from src.index.dedup import DedupConfig
+from src.index.embeddings import resolve_model_name
+from src.index.knn import KnnConfig
+from src.index.staged_build import StagedBuild, BuildConfig, STAGES, DEFAULT_MODEL
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Build the OntologyRAG offline index")
+    p.add_argument("--nodes", default="graphrag_nodes.json")
+    p.add_argument("--edges", default="graphrag_edges.json")
+    p.add_argument("--out", default="index")
+    p.add_argument("--model-name", default=DEFAULT_MODEL, help='"hash" — HashingBackend, без весов модели')
+    p.add_argument("--batch-size", type=int, default=64, help="текстов на один вызов модели")
+    p.add_argument("--flush-every", type=int, default=8, help="сбрасывать эмбеддинги каждые N пачек")
+    p.add_argument("--dedup-threshold", type=float, default=0.8,
+                   help="порог Jaccard для склейки почти-дубликатов chunk-ов (0 — выключить)")
+    p.add_argument("--knn-top-m", type=int, default=0,
+                   help="рёбра SIMILAR_TO к top-M похожим chunk-ам (0 — не строить)")
+    p.add_argument("--knn-min-sim", type=float, default=0.5, help="минимальный косинус ребра SIMILAR_TO")
+    p.add_argument("--memmap-embeddings", action="store_true",
+                   help="эмбеддинги только в .npy через memmap, без векторов в pickle узлов "
+                        "(узлы, тексты, граф и BM25 сборка по-прежнему держит в памяти)")
+    p.add_argument("--force", nargs="*", choices=STAGES, default=[],
+                   help="пересобрать стадии (и зависящие от них)")
+    return p.parse_args()
+
+
+def make_model(model_name: str):
+    from src.index.embeddings import EmbeddingModel
+    return EmbeddingModel(model_name, device="cpu")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = BuildConfig(
+        nodes_path=args.nodes,
+        edges_path=args.edges,
+        out_dir=args.out,
+        # ONTOLOGYRAG_EMBEDDING_BACKEND=hash: векторы не попадут в кэш настоящей модели
+        model_name=resolve_model_name(args.model_name),
+        batch_size=args.batch_size,
+        flush_every=args.flush_every,
+        dedup=DedupConfig(threshold=args.dedup_threshold) if args.dedup_threshold > 0 else None,
+        knn=KnnConfig(top_m=args.knn_top_m, min_sim=args.knn_min_sim) if args.knn_top_m > 0 else None,
+        memmap_embeddings=args.memmap_embeddings,
+    )
+    StagedBuild(config, make_model).run(force=args.force)
@@ -0,0 +1,106 @@
+# inspect_index.py
+#
+# Сколько памяти стоит загруженный индекс и из чего он состоит.
+#
+#   python inspect_index.py                      # таблица по index/
+#   python inspect_index.py --json report.json   # полный отчёт в JSON
+#   python inspect_index.py --json -             # JSON в stdout
+#   python inspect_index.py --mmap               # эмбеддинги из .npy (mmap)
+
+import argparse
+import json
+import sys
+
+from src.index.accounting import index_report
+from src.index.store import (
+    load_index,
+    load_reverse_adj,
+    load_lexical,
+    load_section_chunks,
+)
+
+
+def mb(n: float) -> str:
+    return f"{n / 2**20:10.2f} MB"
+
+
+def print_report(report: dict):
+    total = report["total_bytes"]
+    print("=== Память по компонентам ===")
+    for name, n in sorted(report["components"].items(), key=lambda kv: -kv[1]):
+        share = f"{100 * n / total:5.1f}%" if total and name != "embeddings_mapped" else "   mmap"
+        print(f"  {name:<24}{mb(n)}  {share}")
+    print(f"  {'total (heap)':<24}{mb(total)}")
+    if "files" in report:
+        print(f"  {'on disk':<24}{mb(report['files']['total_bytes'])}")
+
+    print("\n=== Эмбеддинги ===")
+    for kind, e in report["embeddings"].items():
+        print(f"  {kind:<24}{e['count']:>8} x  data{mb(e['data_bytes'])}  mapped{mb(e['mapped_bytes'])}"
+              f"  headers{mb(e['header_bytes'])}")
+
+    t = report["texts"]
+    print("\n=== Тексты ===")
+    for kind in ("text_nodes", "section_local", "section_subtree"):
+        print(f"  {kind:<24}{mb(t[kind]['py_bytes'])}  (utf-8{mb(t[kind]['utf8_bytes'])})")
+    if t["subtree_over_local"] is not None:
+        print(f"  subtree_text / local_text = {t['subtree_over_local']:.2f}x, "
+              f"duplicate {mb(t['subtree_duplicate_bytes']).strip()}")
+
+    c = report["counts"]
+    print("\n=== Узлы и связи ===")
+    print(f"  sections: {c['sections']}  by level: {c['sections_by_level']}")
+    print(f"  text_nodes by type: {c['text_nodes_by_type']}")
+    print(f"  graph nodes by kind: {c['graph_nodes_by_kind']}")
+    print(f"  relations: {c['relations']}")
+    print(f"  sections missing E_local / E_subtree: "
+          f"{len(c['sections_missing_E_local'])} / {len(c['sections_missing_E_subtree'])}")
+    print(f"  text_nodes missing embedding: {c['text_nodes_missing_embedding']}, "
+          f"without section: {c['text_nodes_without_section']}")
+
+    d = report["degrees"]
+    print("\n=== Степени ===")
+    for kind in ("out", "in"):
+        p = d[kind]
+        if p:
+            print(f"  {kind:<4} p50 {p['p50']:.0f}  p90 {p['p90']:.0f}  p99 {p['p99']:.0f}  max {p['max']}"
+                  f"   {d[kind + '_histogram']}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="OntologyRAG index memory accounting")
+    p.add_argument("--index", default="index")
+    p.add_argument("--mmap", action="store_true", help="эмбеддинги из .npy через mmap (как serve.py --workers)")
+    p.add_argument("--json", default=None, metavar="PATH", help="записать отчёт в JSON ('-' — stdout)")
+    return p.parse_args()
+
+
+def run():
+    args = parse_args()
+
+    sections, text_nodes, graph_adj = load_index(args.index, mmap=args.mmap)
+
+    report = index_report(
+        sections,
+        text_nodes,
+        graph_adj,
+        graph_radj=load_reverse_adj(args.index),
+        lexical=load_lexical(args.index),
+        section_chunks=load_section_chunks(args.index),
+        dir_path=args.index,
+    )
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n[inspect_index] report -> {args.json}")
+
+
+if __name__ == "__main__":
+    run()
@@ -1,27 +1,148 @@
 # main.py
 
+import argparse
+import contextlib
 import json
+import sys
+from typing import Optional
 
-from src.index.store import load_index
 from src.index.embeddings import EmbeddingModel
-from src.rag.pipeline import OntologyRAGPipeline
+from src.rag.pipeline import OntologyRAGPipeline, PROJECTIONS
+from src.rag.score import ScoreConfig
+from src.rag.cache import SemanticCache
 
 
-def run():
-    print("=== Загрузка оффлайн-индекса ===")
-    sections, text_nodes, graph_adj = load_index("index")
+INDEX_DIR = "index"
+
+
+def add_pipeline_args(p: argparse.ArgumentParser):
+    """Настройки пайплайна, общие для main.py и serve.py; по умолчанию всё выключено."""
+    p.add_argument("--bm25-weight", type=float, default=0.0,
+                   help="вес BM25 в скоре (0 — только dense); помогает на точных UI-метках и текстах ошибок")
+    p.add_argument("--semantic-cache", type=float, default=None, metavar="THRESHOLD",
+                   help="кэш результатов для перефразированных запросов: порог косинуса, например 0.95")
+    p.add_argument("--max-context-tokens", type=int, default=None,
+                   help="бюджет токенов на section_candidates для LLM (по умолчанию без упаковки)")
+
+
+def check_pipeline_args(p: argparse.ArgumentParser, args):
+    if args.bm25_weight < 0:
+        p.error("--bm25-weight must be >= 0")
+    if args.semantic_cache is not None and not 0 < args.semantic_cache <= 1:
+        p.error("--semantic-cache must be in (0, 1]")
+    if args.max_context_tokens is not None and args.max_context_tokens <= 0:
+        p.error("--max-context-tokens must be positive")
 
-    print("=== Инициализация embedding-модели ===")
-    model = EmbeddingModel(device="cpu")
 
-    pipeline = OntologyRAGPipeline(
-        sections=sections,
-        text_nodes=text_nodes,
-        graph_adj=graph_adj,
-        embedding_model=model,
+def make_pipeline(
+    model,
+    index_dir: str = INDEX_DIR,
+    mmap: bool = False,
+    bm25_weight: float = 0.0,
+    semantic_cache: Optional[float] = None,
+) -> OntologyRAGPipeline:
+    """
+    Пайплайн с настройками CLI (используется также serve.py).
+
+    bm25_weight    — ScoreConfig.w_bm25 (0 — BM25 не участвует в скоре)
+    semantic_cache — порог SemanticCache (None — без кэша результатов)
+    """
+    return OntologyRAGPipeline.from_index(
+        index_dir,
+        model,
+        mmap=mmap,
+        score_cfg=ScoreConfig(w_bm25=bm25_weight),
         max_graph_depth=5,
         max_graph_nodes=800,
         top_k_text=60,
+        result_cache=None if semantic_cache is None
+        else SemanticCache(threshold=semantic_cache, max_entries=1024, ttl_s=3600),
+    )
+
+
+def run_batch(args):
+    """
+    Пакетный режим: JSONL запросов (файл или stdin) → JSONL результатов,
+    по компактной строке на запрос в порядке входа. Логи — в stderr.
+
+        python main.py --batch --input faq.jsonl --output faq.out.jsonl --workers 8
+        python main.py --batch --input faq.jsonl --output faq.out.jsonl --workers 8 --resume
+    """
+    from src.serve.batch import BatchRunner, BatchConfig, resume_offset, print_summary
+
+    start = args.start
+    if args.resume:
+        if args.output == "-":
+            sys.exit("--resume needs --output FILE")
+        start = max(start, resume_offset(args.output))
+        print(f"[batch] resuming from input line {start}", file=sys.stderr)
+
+    # stdout может быть выходом — логи загрузки уводим в stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        # индекс — до fork(), модель — после: она нужна только родителю
+        print("=== Загрузка оффлайн-индекса ===")
+        pipeline = make_pipeline(
+            None, args.index, mmap=args.workers > 0,
+            bm25_weight=args.bm25_weight, semantic_cache=args.semantic_cache,
+        )
+        runner = BatchRunner(pipeline, BatchConfig(
+            batch_size=args.batch_size,
+            workers=args.workers,
+            max_context_tokens=args.max_context_tokens,
+            projection=args.projection,
+        ))
+        runner.start_pool()
+
+        print("=== Инициализация embedding-модели ===")
+        pipeline.model = EmbeddingModel(device="cpu")
+
+    def progress(summary):
+        print(f"\r[batch] {summary['queries']} queries, {summary['qps']:.1f} q/s",
+              end="", file=sys.stderr, flush=True)
+
+    inp = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "ab" if start else "wb")
+    try:
+        summary = runner.run(inp, out, start=start, progress=progress)
+    finally:
+        runner.close()
+        if inp is not sys.stdin:
+            inp.close()
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(file=sys.stderr)
+    print_summary(summary)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="OntologyRAG CLI (интерактивный или пакетный режим)")
+    p.add_argument("--index", default=INDEX_DIR)
+    p.add_argument("--batch", action="store_true", help="пакетный режим: JSONL in → JSONL out")
+    p.add_argument("--input", default="-", help="файл с запросами (JSONL или строка на запрос), '-' — stdin")
+    p.add_argument("--output", default="-", help="файл результатов JSONL, '-' — stdout")
+    p.add_argument("--workers", type=int, default=0, help="процессы для CPU-стадий (0 — без пула)")
+    p.add_argument("--batch-size", type=int, default=64, help="запросов на один вызов модели")
+    p.add_argument("--projection", choices=PROJECTIONS, default="sections_only")
+    p.add_argument("--resume", action="store_true", help="продолжить по уже записанному --output")
+    p.add_argument("--start", type=int, default=0, help="начать с этой строки входа")
+    add_pipeline_args(p)
+    args = p.parse_args()
+    check_pipeline_args(p, args)
+    return args
+
+
+def run():
+    args = parse_args()
+    if args.batch:
+        run_batch(args)
+        return
+
+    print("=== Инициализация embedding-модели ===")
+    model = EmbeddingModel(device="cpu")
+
+    print("=== Загрузка оффлайн-индекса ===")
+    pipeline = make_pipeline(
+        model, args.index, bm25_weight=args.bm25_weight, semantic_cache=args.semantic_cache,
     )
 
     while True:
@@ -30,21 +151,27 @@ def run():
             break
 
         # Запускаем RAG-пайплайн
-        result = pipeline.run_query(query)
+        # text_nodes / graph_context здесь не нужны — и не вычисляются
+        result = pipeline.run_query(
+            query,
+            max_context_tokens=args.max_context_tokens,
+            projection="sections_only",
+        )
 
         # Ожидаем, что pipeline.run_query возвращает структуру вида:
         # {
         #   "query": str,
         #   "section_candidates": [ { section_id, title, text, score, node_ids }, ... ],
-        #   "text_nodes": [ ... ],
-        #   "graph_context": { "nodes": [...], "edges": [...] },
-        #   (опционально) "flat_text": ...
+        #   "context_budget": { ... },
+        #   (projection="full") "text_nodes": [ ... ],
+        #   (projection="full") "graph_context": { "nodes": [...], "edges": [...] },
         # }
 
         # Готовим "LLM-ready" формат — то, что дальше пойдёт в OntologyRAG Retriever Agent
         llm_input = {
             "query": result["query"],
             "section_candidates": result["section_candidates"],
+            "context_budget": result.get("context_budget"),
             # если хочешь, можно прокинуть и это:
             # "text_nodes": result["text_nodes"],
             # "graph_context": result["graph_context"],
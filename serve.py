@@ -0,0 +1,94 @@
+# serve.py
+
+import argparse
+import asyncio
+
+from src.index.embeddings import EmbeddingModel
+from src.serve.http_server import RAGServer, ServerConfig
+from src.serve.prefork import PreforkServer, PreforkConfig
+from src.rag.pipeline import PROJECTIONS
+from main import make_pipeline, add_pipeline_args, check_pipeline_args, INDEX_DIR
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="OntologyRAG HTTP/JSON server")
+    p.add_argument("--index", default=INDEX_DIR)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--batch-window-ms", type=float, default=5.0)
+    p.add_argument("--max-batch-size", type=int, default=32)
+    p.add_argument("--max-queue", type=int, default=256)
+    p.add_argument("--cpu-workers", type=int, default=4)
+    p.add_argument("--projection", choices=PROJECTIONS, default="full",
+                   help="проекция результата по умолчанию (в запросе можно переопределить)")
+    p.add_argument("--deadline-ms", type=float, default=None,
+                   help="бюджет времени запроса по умолчанию, с деградацией стадий (в запросе можно переопределить)")
+    # pre-fork: несколько процессов над одним memory-mapped индексом
+    p.add_argument("--workers", type=int, default=0,
+                   help="число процессов-воркеров (0 — один процесс)")
+    p.add_argument("--max-requests", type=int, default=10_000,
+                   help="перезапуск воркера после N запросов (0 — никогда)")
+    p.add_argument("--max-rss-mb", type=float, default=None,
+                   help="перезапуск воркера при превышении RSS")
+    add_pipeline_args(p)
+    args = p.parse_args()
+    check_pipeline_args(p, args)
+    return args
+
+
+def run():
+    args = parse_args()
+
+    config = ServerConfig(
+        host=args.host,
+        port=args.port,
+        batch_window_ms=args.batch_window_ms,
+        max_batch_size=args.max_batch_size,
+        max_queue=args.max_queue,
+        cpu_workers=args.cpu_workers,
+        max_context_tokens=args.max_context_tokens,
+        projection=args.projection,
+        deadline_ms=args.deadline_ms,
+    )
+
+    if args.workers > 0:
+        run_prefork(args, config)
+        return
+
+    print("=== Инициализация embedding-модели ===")
+    model = EmbeddingModel(device="cpu")
+
+    print("=== Загрузка оффлайн-индекса ===")
+    pipeline = make_pipeline(
+        model, args.index, bm25_weight=args.bm25_weight, semantic_cache=args.semantic_cache,
+    )
+
+    asyncio.run(RAGServer(pipeline, config).serve_forever())
+
+
+def run_prefork(args, config: ServerConfig):
+    # Индекс грузится один раз в мастере (эмбеддинги — memmap),
+    # модель — в каждом воркере после fork.
+    print("=== Загрузка оффлайн-индекса (mmap) ===")
+    pipeline = make_pipeline(
+        None, args.index, mmap=True,
+        bm25_weight=args.bm25_weight, semantic_cache=args.semantic_cache,
+    )
+
+    def make_server(worker_no: int) -> RAGServer:
+        pipeline.model = EmbeddingModel(device="cpu")
+        return RAGServer(pipeline, config)
+
+    PreforkServer(
+        make_server,
+        config,
+        PreforkConfig(
+            workers=args.workers,
+            max_requests=args.max_requests,
+            max_rss_mb=args.max_rss_mb,
+        ),
+    ).run()
+
+
+if __name__ == "__main__":
+    run()
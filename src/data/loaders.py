@@ -1,7 +1,7 @@
 # src/data/loaders.py
 
 import json
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from .models import Section, TextNode, Edge
 
@@ -31,8 +31,9 @@ def load_nodes(path_nodes: str):
     sections: Dict[str, Section] = {}
     text_nodes: Dict[str, TextNode] = {}
     figures: Dict[str, dict] = {}
+    passthrough: Dict[str, dict] = {}   # ListItem / ReferenceTarget / Url — для compact_graph
 
-    for item in raw_nodes:
+    for pos, item in enumerate(raw_nodes):
         node_id = item["id"]
         raw_type = item["type"]
         attrs = item.get("attributes", {})
@@ -70,11 +71,14 @@ def load_nodes(path_nodes: str):
                 continue
 
             txt = item.get("text") or ""
+            order = attrs.get("order")
             text_nodes[node_id] = TextNode(
                 id=node_id,
                 section_id=None,
                 node_type="chunk",
                 text=txt,
+                page_start=attrs.get("page_start"),
+                order=int(order) if order is not None else pos,
             )
             continue
 
@@ -82,14 +86,16 @@ def load_nodes(path_nodes: str):
         # LIST ITEMS — skip as separate nodes
         # --------------------------------------------------------
         if raw_type == "ListItem":
+            passthrough[node_id] = item
             continue
 
         # --------------------------------------------------------
         # URL / ReferenceTarget — not added as text nodes
         # --------------------------------------------------------
+        passthrough[node_id] = item
         continue
 
-    return sections, text_nodes, figures
+    return sections, text_nodes, figures, passthrough
 
 
 # -------------------------------------------------------------
@@ -169,11 +175,133 @@ def build_graph(
     return sections, text_nodes, graph_adj
 
 
+# -------------------------------------------------------------
+# GRAPH COMPACTION: pass-through узлы → их владельцы
+# -------------------------------------------------------------
+def page_targets(sections: Dict[str, Section], text_nodes: Dict[str, TextNode]) -> Dict[int, str]:
+    """
+    Страница → узел, на который ведёт ссылка на неё:
+    секция, первый chunk которой лежит на этой странице, иначе
+    первый chunk страницы (по order).
+    """
+    first_chunk: Dict[int, TextNode] = {}
+    section_start: Dict[str, TextNode] = {}
+    for tn in text_nodes.values():
+        if tn.page_start is None:
+            continue
+        page = int(tn.page_start)
+        if page not in first_chunk or tn.order < first_chunk[page].order:
+            first_chunk[page] = tn
+        sid = tn.section_id
+        if sid is not None and (sid not in section_start or tn.order < section_start[sid].order):
+            section_start[sid] = tn
+
+    targets = {page: tn.id for page, tn in first_chunk.items()}
+    first_section: Dict[int, TextNode] = {}
+    for sid, tn in section_start.items():
+        page = int(tn.page_start)
+        if page not in first_section or tn.order < first_section[page].order:
+            first_section[page] = tn
+    for page, tn in first_section.items():
+        targets[page] = tn.section_id
+    return targets
+
+
+def compact_graph(
+    sections: Dict[str, Section],
+    text_nodes: Dict[str, TextNode],
+    figures: Dict[str, dict],
+    passthrough: Dict[str, dict],
+    graph_adj: Dict[str, List[Edge]],
+) -> Tuple[Dict[str, List[Edge]], dict]:
+    """
+    Убирает из graph_adj узлы, которых нет ни в sections, ни в text_nodes
+    (GraphExpander тратил на них бюджет max_nodes, NodeScorer их не видит):
+
+      - ReferenceTarget (ссылка на страницу) → секция / chunk этой страницы:
+        LINKS_TO chunk → ref_N становится LINKS_TO chunk → узел страницы
+      - ListItem → chunk-владелец (HAS_ITEM), Figure → chunk-подпись (CAPTIONS):
+        рёбра к ним переезжают на владельца, сами HAS_ITEM / CAPTIONS
+        становятся петлями и удаляются
+      - рёбра в никуда (Url, отброшенные chunk-и с номерами страниц,
+        неразрешённые ссылки), петли и повторы удаляются
+
+    Возвращает новый graph_adj и счётчики.
+    """
+    def known(nid: str) -> bool:
+        return nid in sections or nid in text_nodes
+
+    # pass-through узел → владелец
+    owner: Dict[str, str] = {}
+    for edges in graph_adj.values():
+        for e in edges:
+            if e.relation_type == "HAS_ITEM" and e.to_id in passthrough:
+                owner[e.to_id] = e.from_id
+            elif e.relation_type == "CAPTIONS" and e.to_id in figures:
+                owner[e.to_id] = e.from_id
+
+    pages = page_targets(sections, text_nodes)
+    for nid, item in passthrough.items():
+        if item.get("type") == "ReferenceTarget":
+            text = (item.get("text") or "").strip()
+            if text.isdigit() and int(text) in pages:
+                owner[nid] = pages[int(text)]
+
+    stats = {"edges_before": 0, "rewired": 0, "folded": 0, "dead_end": 0, "duplicate": 0}
+    compact: Dict[str, List[Edge]] = {}
+    seen = set()
+    for edges in graph_adj.values():
+        for e in edges:
+            stats["edges_before"] += 1
+            src = owner.get(e.from_id, e.from_id)
+            dst = owner.get(e.to_id, e.to_id)
+            if not (known(src) and known(dst)):
+                stats["dead_end"] += 1
+                continue
+            if src == dst:
+                stats["folded"] += 1
+                continue
+            key = (src, dst, e.relation_type)
+            if key in seen:
+                stats["duplicate"] += 1
+                continue
+            seen.add(key)
+            if (src, dst) != (e.from_id, e.to_id):
+                stats["rewired"] += 1
+                e = Edge(from_id=src, to_id=dst, relation_type=e.relation_type)
+            compact.setdefault(src, []).append(e)
+
+    stats["edges_after"] = len(seen)
+    stats["removed"] = stats["edges_before"] - stats["edges_after"]
+    return compact, stats
+
+
+# -------------------------------------------------------------
+# REVERSE ADJACENCY: to_id → входящие рёбра
+# -------------------------------------------------------------
+def build_reverse_adj(graph_adj: Dict[str, List[Edge]]) -> Dict[str, List[Edge]]:
+    """
+    Строит обратную смежность по graph_adj.
+    Рёбра те же объекты Edge, ключ — e.to_id.
+    Нужна, чтобы BFS мог подниматься к родителю / соседям
+    без линейного прохода по всем рёбрам.
+    """
+    graph_radj: Dict[str, List[Edge]] = {}
+    for edges in graph_adj.values():
+        for e in edges:
+            graph_radj.setdefault(e.to_id, []).append(e)
+    return graph_radj
+
+
 # -------------------------------------------------------------
 # COMPLETE PIPELINE
 # -------------------------------------------------------------
-def load_ontology(path_nodes: str, path_edges: str):
-    sections, text_nodes, figures = load_nodes(path_nodes)
+def load_ontology(path_nodes: str, path_edges: str, compact: bool = True):
+    """
+    compact — прогнать compact_graph (см. выше); False — graph_adj
+    со всеми рёбрами экспорта, как есть.
+    """
+    sections, text_nodes, figures, passthrough = load_nodes(path_nodes)
     edges = load_edges(path_edges)
 
     sections, text_nodes, graph_adj = build_graph(
@@ -183,4 +311,12 @@ def load_ontology(path_nodes: str, path_edges: str):
         edges
     )
 
+    if compact:
+        graph_adj, stats = compact_graph(sections, text_nodes, figures, passthrough, graph_adj)
+        print(
+            f"[Loader] graph compaction: {stats['edges_before']} → {stats['edges_after']} edges "
+            f"(rewired {stats['rewired']}, folded {stats['folded']}, "
+            f"dead-end {stats['dead_end']}, duplicate {stats['duplicate']})"
+        )
+
     return sections, text_nodes, graph_adj
@@ -10,6 +10,7 @@ class Edge:
     from_id: str
     to_id: str
     relation_type: str
+    weight: Optional[float] = None       # SIMILAR_TO: косинус (index/knn.py), у структурных рёбер нет
 
 
 @dataclass
@@ -33,3 +34,7 @@ class TextNode:
     node_type: str                       # "section_title" | "chunk" | "list_item" | "caption"
     text: str
     embedding: Optional[np.ndarray] = None
+    n_tokens: Optional[int] = None       # токены локального токенизатора (build_index.py)
+    page_start: Optional[float] = None   # страница начала (attributes.page_start)
+    order: Optional[int] = None          # attributes.order, иначе позиция в graphrag_nodes.json
+    cluster_id: Optional[str] = None     # представитель кластера почти-дубликатов (index/dedup.py)
@@ -0,0 +1,245 @@
+# src/index/accounting.py
+#
+# Учёт памяти загруженного индекса: байты по компонентам,
+# счётчики по типам узлов и связей, распределение степеней.
+# CLI — inspect_index.py в корне репозитория.
+
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..data.models import Edge, Section, TextNode
+
+
+def _obj_bytes(obj) -> int:
+    """Экземпляр dataclass: сам объект + его __dict__ (без значений полей)."""
+    size = sys.getsizeof(obj)
+    d = getattr(obj, "__dict__", None)
+    if d is not None:
+        size += sys.getsizeof(d)
+    return size
+
+
+def _str_bytes(s: Optional[str]) -> int:
+    return sys.getsizeof(s) if s is not None else 0
+
+
+def _array_bytes(arrays: Iterable[Optional[np.ndarray]]) -> dict:
+    """
+    Данные и заголовки массивов.
+
+    data_bytes   — в куче процесса (собственные буферы и копии)
+    mapped_bytes — строки np.memmap: страницы файла, общие между процессами
+    """
+    n = data = mapped = header = 0
+    for a in arrays:
+        if a is None:
+            continue
+        n += 1
+        if isinstance(a, np.memmap):
+            mapped += a.nbytes
+        else:
+            data += a.nbytes
+        header += sys.getsizeof(a) - (a.nbytes if a.flags.owndata else 0)
+    return {"count": n, "data_bytes": data, "mapped_bytes": mapped, "header_bytes": header}
+
+
+def _text_bytes(texts: Iterable[str]) -> dict:
+    """Python-строки (getsizeof) и тот же текст в UTF-8."""
+    py = utf8 = n = 0
+    for t in texts:
+        n += 1
+        py += _str_bytes(t)
+        utf8 += len(t.encode("utf-8")) if t else 0
+    return {"count": n, "py_bytes": py, "utf8_bytes": utf8}
+
+
+def _adj_bytes(adj: Optional[Dict[str, List[Edge]]], seen_edges: set) -> dict:
+    """
+    dict + списки + Edge. Рёбра, уже учтённые в другой смежности
+    (build_reverse_adj переиспользует объекты Edge), не считаются повторно.
+    """
+    if adj is None:
+        return None
+    containers = sys.getsizeof(adj) + sum(_str_bytes(k) + sys.getsizeof(v) for k, v in adj.items())
+    edges = 0
+    n_edges = 0
+    for lst in adj.values():
+        for e in lst:
+            n_edges += 1
+            if id(e) in seen_edges:
+                continue
+            seen_edges.add(id(e))
+            edges += _obj_bytes(e) + _str_bytes(e.relation_type)
+    return {"keys": len(adj), "edges": n_edges, "container_bytes": containers, "edge_bytes": edges}
+
+
+def percentiles(values: List[int]) -> dict:
+    if not values:
+        return {}
+    a = np.asarray(values)
+    return {
+        "min": int(a.min()),
+        "p50": float(np.percentile(a, 50)),
+        "p90": float(np.percentile(a, 90)),
+        "p99": float(np.percentile(a, 99)),
+        "max": int(a.max()),
+        "mean": float(a.mean()),
+    }
+
+
+def degree_histogram(values: List[int]) -> Dict[str, int]:
+    """Корзины степеней: 0, 1, 2-3, 4-7, 8-15, ..."""
+    hist = Counter()
+    for v in values:
+        if v == 0:
+            hist["0"] += 1
+            continue
+        lo = 1 << (int(v).bit_length() - 1)
+        hist[str(lo) if lo == 1 else f"{lo}-{2 * lo - 1}"] += 1
+    return dict(sorted(hist.items(), key=lambda kv: int(kv[0].split("-")[0])))
+
+
+def node_kind(node_id: str) -> str:
+    """Тип узла графа по префиксу id: section_…, chunk_…, figure_…, url_…"""
+    return node_id.split("_", 1)[0] if "_" in node_id else node_id
+
+
+# -------------------------------------------------------------
+# Отчёт
+# -------------------------------------------------------------
+def index_report(
+    sections: Dict[str, Section],
+    text_nodes: Dict[str, TextNode],
+    graph_adj: Dict[str, List[Edge]],
+    graph_radj: Optional[Dict[str, List[Edge]]] = None,
+    lexical: Optional[dict] = None,
+    section_chunks: Optional[Dict[str, List[str]]] = None,
+    dir_path: Optional[str] = None,
+) -> dict:
+    """
+    Байты по компонентам загруженного индекса и его структура.
+
+    bytes — оценка через sys.getsizeof / ndarray.nbytes (без общих
+    интернированных строк и аллокатора); "mapped_bytes" эмбеддингов —
+    страницы .npy, отображённые в память, а не куча процесса.
+    """
+
+    # ---------------- эмбеддинги ----------------
+    embeddings = {
+        "text": _array_bytes(tn.embedding for tn in text_nodes.values()),
+        "section_local": _array_bytes(s.E_local for s in sections.values()),
+        "section_subtree": _array_bytes(s.E_subtree for s in sections.values()),
+    }
+
+    # ---------------- тексты ----------------
+    local = _text_bytes(s.local_text for s in sections.values())
+    subtree = _text_bytes(s.subtree_text for s in sections.values())
+    texts = {
+        "text_nodes": _text_bytes(tn.text for tn in text_nodes.values()),
+        "section_local": local,
+        "section_subtree": subtree,
+        # subtree_text повторяет local_text потомков: во сколько раз больше
+        "subtree_over_local": subtree["utf8_bytes"] / local["utf8_bytes"] if local["utf8_bytes"] else None,
+        "subtree_duplicate_bytes": max(0, subtree["py_bytes"] - local["py_bytes"]),
+    }
+
+    # ---------------- граф ----------------
+    seen_edges: set = set()
+    adjacency = {
+        "graph_adj": _adj_bytes(graph_adj, seen_edges),
+        "graph_radj": _adj_bytes(graph_radj, seen_edges),
+    }
+
+    # ---------------- объекты ----------------
+    objects = {
+        "sections": sum(_obj_bytes(s) + sys.getsizeof(s.children_ids) for s in sections.values())
+        + sys.getsizeof(sections),
+        "text_nodes": sum(_obj_bytes(tn) for tn in text_nodes.values()) + sys.getsizeof(text_nodes),
+        "ids": sum(_str_bytes(k) for k in sections) + sum(_str_bytes(k) for k in text_nodes),
+    }
+    if section_chunks is not None:
+        objects["section_chunks"] = sys.getsizeof(section_chunks) + sum(
+            sys.getsizeof(v) for v in section_chunks.values()
+        )
+
+    lex = {}
+    for kind, idx in (lexical or {}).items():
+        arrays = sum(
+            a.nbytes for a in (idx.offsets, idx.post_docs, idx.post_tf, idx.doc_len, idx.idf)
+        )
+        vocab = sys.getsizeof(idx.vocab) + sum(_str_bytes(t) for t in idx.vocab)
+        lex[kind] = {"docs": len(idx.doc_ids), "terms": len(idx.vocab),
+                     "array_bytes": arrays, "vocab_bytes": vocab}
+
+    components = {
+        "embeddings": sum(e["data_bytes"] + e["header_bytes"] for e in embeddings.values()),
+        "embeddings_mapped": sum(e["mapped_bytes"] for e in embeddings.values()),
+        "text_nodes_text": texts["text_nodes"]["py_bytes"],
+        "section_local_text": local["py_bytes"],
+        "section_subtree_text": subtree["py_bytes"],
+        "adjacency": sum(
+            a["container_bytes"] + a["edge_bytes"] for a in adjacency.values() if a is not None
+        ),
+        "objects": sum(objects.values()),
+        "lexical": sum(x["array_bytes"] + x["vocab_bytes"] for x in lex.values()),
+    }
+
+    # ---------------- счётчики ----------------
+    relations = Counter(e.relation_type for lst in graph_adj.values() for e in lst)
+    out_deg = Counter()
+    in_deg = Counter()
+    graph_nodes = set()
+    for src, lst in graph_adj.items():
+        graph_nodes.add(src)
+        for e in lst:
+            out_deg[src] += 1
+            in_deg[e.to_id] += 1
+            graph_nodes.add(e.to_id)
+    graph_nodes.update(sections)
+    graph_nodes.update(text_nodes)
+    out_values = [out_deg.get(n, 0) for n in graph_nodes]
+    in_values = [in_deg.get(n, 0) for n in graph_nodes]
+
+    counts = {
+        "sections": len(sections),
+        "sections_by_level": dict(sorted(Counter(s.level for s in sections.values()).items(),
+                                         key=lambda kv: (kv[0] is None, kv[0] or 0))),
+        "text_nodes_by_type": dict(Counter(tn.node_type for tn in text_nodes.values()).most_common()),
+        "graph_nodes_by_kind": dict(Counter(node_kind(n) for n in graph_nodes).most_common()),
+        "relations": dict(relations.most_common()),
+        "sections_missing_E_local": sorted(s.id for s in sections.values() if s.E_local is None),
+        "sections_missing_E_subtree": sorted(s.id for s in sections.values() if s.E_subtree is None),
+        "text_nodes_missing_embedding": sum(tn.embedding is None for tn in text_nodes.values()),
+        "text_nodes_without_section": sum(tn.section_id is None for tn in text_nodes.values()),
+    }
+
+    degrees = {
+        "out": percentiles(out_values),
+        "in": percentiles(in_values),
+        "out_histogram": degree_histogram(out_values),
+        "in_histogram": degree_histogram(in_values),
+        "top_out": [[n, d] for n, d in out_deg.most_common(10)],
+        "top_in": [[n, d] for n, d in in_deg.most_common(10)],
+    }
+
+    report = {
+        "total_bytes": sum(v for k, v in components.items() if k != "embeddings_mapped"),
+        "components": components,
+        "embeddings": embeddings,
+        "texts": texts,
+        "adjacency": adjacency,
+        "objects": objects,
+        "lexical": lex,
+        "counts": counts,
+        "degrees": degrees,
+    }
+
+    if dir_path is not None:
+        files = {p.name: p.stat().st_size for p in sorted(Path(dir_path).iterdir()) if p.is_file()}
+        report["files"] = {"total_bytes": sum(files.values()), "by_file": files}
+
+    return report
@@ -3,11 +3,12 @@
 import pickle
 from pathlib import Path
 
-from src.data.loaders import load_ontology
-from src.ontology.hierarchy import build_hierarchy
+from src.data.loaders import load_ontology, build_reverse_adj
+from src.ontology.hierarchy import build_hierarchy, build_section_chunks
 from src.index.embeddings import EmbeddingModel
 from src.index.section_index import SectionIndex
 from src.index.text_index import TextIndex
+from src.index.lexical_index import build_lexical_indexes
 
 
 def build_full_index(
@@ -32,12 +33,19 @@ def build_full_index(
     print("=== 5. Compute text embeddings ===")
     txt_idx = TextIndex(model)
     text_nodes = txt_idx.compute_textnode_embeddings(text_nodes)
+    text_nodes = txt_idx.compute_token_counts(text_nodes)
 
-    print("=== 6. Save index ===")
+    print("=== 6. Build lexical (BM25) index ===")
+    lexical = build_lexical_indexes(sections, text_nodes)
+
+    print("=== 7. Save index ===")
     data = {
         "sections": sections,
         "text_nodes": text_nodes,
         "graph_adj": graph_adj,
+        "graph_radj": build_reverse_adj(graph_adj),
+        "lexical": lexical,
+        "section_chunks": build_section_chunks(sections, text_nodes),
     }
     with open(output_file, "wb") as f:
         pickle.dump(data, f)
@@ -0,0 +1,156 @@
+# src/index/dedup.py
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..data.models import TextNode
+from .textutil import PRIME, char_codes, ngram_hashes
+
+
+class DedupConfig:
+    """
+    Поиск почти-дубликатов chunk-ов (MinHash + LSH).
+
+    num_perm  — длина MinHash-подписи
+    bands     — число полос LSH (num_perm делится на bands); кандидаты —
+                тексты, совпавшие хотя бы в одной полосе
+    threshold — минимальная оценка Jaccard по шинглам для склейки
+    shingle   — длина символьного шингла
+    min_chars — тексты короче (после нормализации) не склеиваются:
+                у них и так работает точный кэш эмбеддингов
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 32,
+        threshold: float = 0.8,
+        shingle: int = 5,
+        min_chars: int = 30,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle = shingle
+        self.min_chars = min_chars
+        self.seed = seed
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class MinHasher:
+    """MinHash-подписи символьных шинглов; хеши детерминированы между запусками."""
+
+    def __init__(self, cfg: DedupConfig):
+        self.cfg = cfg
+        rng = np.random.default_rng(cfg.seed)
+        self.a = rng.integers(1, 1 << 31, size=cfg.num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=cfg.num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """Полиномиальные хеши всех окон по shingle символов (uint32, уникальные)."""
+        codes = char_codes(text)
+        if len(codes) < self.cfg.shingle:
+            return np.unique(codes)
+        return np.unique(ngram_hashes(codes, self.cfg.shingle))
+
+    def signature(self, text: str) -> np.ndarray:
+        h = self.shingles(text)
+        return ((np.outer(self.a, h) + self.b[:, None]) % PRIME).min(axis=1)
+
+
+def find_near_duplicates(
+    text_nodes: Dict[str, TextNode],
+    cfg: DedupConfig = DedupConfig(),
+) -> Tuple[Dict[str, str], dict]:
+    """
+    Кластеры почти одинаковых текстов.
+
+    Возвращает:
+        cluster_of: node_id → id представителя (первого узла кластера
+                    в порядке text_nodes); только для кластеров из 2+ узлов,
+                    представитель указывает сам на себя
+        stats:      кластеры, дубликаты, сэкономленные эмбеддинги и байты текста
+    """
+    hasher = MinHasher(cfg)
+    rows = cfg.num_perm // cfg.bands
+
+    ids: List[str] = []
+    sigs: List[np.ndarray] = []
+    for nid, tn in text_nodes.items():
+        text = normalize(tn.text or "")
+        if len(text) < cfg.min_chars:
+            continue
+        ids.append(nid)
+        sigs.append(hasher.signature(text))
+
+    parent = list(range(len(ids)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # LSH: в каждой полосе сравниваем текст с первым текстом корзины
+    candidates = 0
+    for band in range(cfg.bands):
+        buckets: Dict[bytes, int] = {}
+        lo, hi = band * rows, (band + 1) * rows
+        for i, sig in enumerate(sigs):
+            key = sig[lo:hi].tobytes()
+            anchor = buckets.setdefault(key, i)
+            if anchor == i:
+                continue
+            ri, ra = find(i), find(anchor)
+            if ri == ra:
+                continue
+            candidates += 1
+            if np.mean(sig == sigs[anchor]) >= cfg.threshold:
+                # корень — меньший индекс, т.е. первый узел в порядке документа
+                parent[max(ri, ra)] = min(ri, ra)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(ids)):
+        clusters.setdefault(find(i), []).append(i)
+
+    cluster_of: Dict[str, str] = {}
+    saved_texts = saved_chars = dup_bytes = 0
+    n_clusters = 0
+    for root, members in clusters.items():
+        if len(members) < 2:
+            continue
+        n_clusters += 1
+        rep = ids[root]
+        texts = {text_nodes[rep].text}
+        for i in members:
+            cluster_of[ids[i]] = rep
+            if i == root:
+                continue
+            text = text_nodes[ids[i]].text
+            dup_bytes += len(text.encode("utf-8"))
+            # точные повторы и без того берутся из кэша эмбеддингов
+            if text not in texts:
+                texts.add(text)
+                saved_texts += 1
+                saved_chars += len(text)
+
+    stats = {
+        "texts": len(text_nodes),
+        "checked": len(ids),
+        "lsh_candidates": candidates,
+        "clusters": n_clusters,
+        "duplicates": len(cluster_of) - n_clusters,
+        # различные тексты, вместо которых берётся вектор представителя
+        "embeddings_saved": saved_texts,
+        "embed_chars_saved": saved_chars,
+        # столько текста дубликаты могли бы занять в выдаче text_nodes
+        "duplicate_text_bytes": dup_bytes,
+    }
+    return cluster_of, stats
@@ -1,24 +1,218 @@
 # src/index/embeddings.py
 
+import os
+import zlib
+from abc import ABC, abstractmethod
 import numpy as np
 from typing import List, Optional, Union
-from sentence_transformers import SentenceTransformer
+
+from .textutil import PRIME, char_codes, ngram_hashes, tokenize
+
+
+DEFAULT_MODEL = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+
+# имя модели, при котором вместо SentenceTransformer берётся HashingBackend
+HASH_MODEL = "hash"
+
+# переменная окружения: принудительный бэкенд для всех EmbeddingModel
+# (CI / песочницы без весов): ONTOLOGYRAG_EMBEDDING_BACKEND=hash
+BACKEND_ENV = "ONTOLOGYRAG_EMBEDDING_BACKEND"
+
+# -------------------------------------------------------------
+# Интерфейс бэкенда
+# -------------------------------------------------------------
+class EmbeddingBackend(ABC):
+    """
+    Источник «сырых» векторов для EmbeddingModel.
+
+        dim                 — размерность
+        encode(texts)       — float32 [N, dim], L2-нормированные
+        count_tokens(texts) — длины в токенах (бюджет контекста)
+
+    Пустые строки EmbeddingModel заменяет на " " до вызова encode().
+    """
+
+    name = "base"
+    dim = 0
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        ...
+
+    @abstractmethod
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        ...
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """SentenceTransformer (multilingual MPNet); импорт — только при создании."""
+
+    name = "sentence_transformers"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, device: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer
+
+        # Автодетект устройства
+        if device is None:
+            try:
+                import torch
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+            except Exception:
+                device = "cpu"
+
+        self.device = device
+
+        print(f"[EmbeddingModel] Loading model {model_name} on {device}...")
+        self.model = SentenceTransformer(model_name, device=device)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            convert_to_numpy=True,
+            normalize_embeddings=True,  # сразу cosine-ready
+            show_progress_bar=False
+        )
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Число токенов (без спецтокенов и без усечения до max_seq_length) —
+        для бюджета контекста на стороне LLM.
+        """
+        enc = self.model.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            truncation=False,
+        )
+        return [len(ids) for ids in enc["input_ids"]]
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Детерминированные эмбеддинги без модели и сети:
+    хешированные символьные n-граммы + слова → разреженная случайная
+    проекция (каждый признак даёт ±1 в `hashes` координат) → L2.
+
+    Похожие по написанию тексты близки по косинусу, так что drill,
+    кэши и бенчмарки ведут себя осмысленно; семантики нет.
+    Размерность по умолчанию — как у MPNet (768).
+
+    cos_offset — общая для всех векторов компонента: косинус становится
+                 (1 - cos_offset) * cos + cos_offset. Сдвигает шкалу
+                 в диапазон MPNet, под который подобраны пороги
+                 DrillConfig (tau_local / tau_child).
+    """
+
+    name = "hash"
+
+    def __init__(
+        self,
+        dim: int = 768,
+        ngrams=(3, 4, 5),
+        hashes: int = 4,
+        cos_offset: float = 0.4,
+        seed: int = 0,
+    ):
+        self.dim = dim
+        self.ngrams = tuple(ngrams)
+        self.hashes = hashes
+        self.cos_offset = cos_offset
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, size=hashes, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=hashes, dtype=np.uint64)
+        # общее направление для cos_offset
+        common = rng.standard_normal(dim)
+        self.common = (common / np.linalg.norm(common)).astype(np.float64)
+
+    # -------------------------------------------------------------
+    # Признаки пачки: (строка, хеш признака < 2^32), с повторами
+    # -------------------------------------------------------------
+    def features(self, texts: List[str]):
+        norms = [" " + " ".join(t.lower().replace("ё", "е").split()) + " " for t in texts]
+        lens = np.array([len(t) for t in norms], dtype=np.int64)
+        ends = np.cumsum(lens)
+        codes = char_codes("".join(norms))
+        row_of_pos = np.repeat(np.arange(len(texts), dtype=np.int64), lens)
+
+        rows, feats = [], []
+        for n in self.ngrams:
+            m = len(codes) - n + 1
+            if m <= 0:
+                continue
+            h = ngram_hashes(codes, n, seed=n)  # n в затравке: разные n не смешиваются
+            # окна, не пересекающие границу текстов
+            ok = np.arange(m) + n <= ends[row_of_pos[:m]]
+            rows.append(row_of_pos[:m][ok])
+            feats.append(h[ok])
+
+        words = [(r, zlib.crc32(w.encode("utf-8"))) for r, t in enumerate(norms) for w in tokenize(t)]
+        if words:
+            w_rows, w_feats = zip(*words)
+            rows.append(np.asarray(w_rows, dtype=np.int64))
+            feats.append(np.asarray(w_feats, dtype=np.uint64))
+
+        # пустой текст — фиксированный признак 0: единичный вектор, как у модели для " "
+        rows.append(np.arange(len(texts), dtype=np.int64)[lens < min(self.ngrams)])
+        feats.append(np.zeros(int((lens < min(self.ngrams)).sum()), dtype=np.uint64))
+        return np.concatenate(rows), np.concatenate(feats)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        rows, feats = self.features(texts)
+        keys, counts = np.unique((rows.astype(np.uint64) << np.uint64(32)) | feats, return_counts=True)
+        rows = (keys >> np.uint64(32)).astype(np.int64)
+        feats = keys & np.uint64(0xFFFFFFFF)
+        w = 1.0 + np.log(counts)
+
+        vecs = np.zeros(len(texts) * self.dim, dtype=np.float64)
+        for a, b in zip(self.a, self.b):
+            m = (a * feats + b) % PRIME
+            sign = ((m // np.uint64(self.dim)) & np.uint64(1)).astype(np.float64) * 2 - 1
+            idx = rows * self.dim + (m % np.uint64(self.dim)).astype(np.int64)
+            vecs += np.bincount(idx, weights=w * sign, minlength=len(vecs))
+
+        vecs = vecs.reshape(len(texts), self.dim)
+        vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        if self.cos_offset:
+            # убираем проекцию на общую компоненту, чтобы сдвиг косинуса был точным
+            vecs -= np.outer(vecs @ self.common, self.common)
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+            vecs = np.sqrt(1 - self.cos_offset) * vecs + np.sqrt(self.cos_offset) * self.common
+        vecs = vecs.astype(np.float32)
+        return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        return [len(tokenize(t)) for t in texts]
+
+
+def resolve_model_name(model_name: str) -> str:
+    """Имя модели с учётом ONTOLOGYRAG_EMBEDDING_BACKEND=hash (переопределяет любое)."""
+    return HASH_MODEL if os.environ.get(BACKEND_ENV, "") == HASH_MODEL else model_name
+
+
+def make_backend(model_name: str = DEFAULT_MODEL, device: Optional[str] = None) -> EmbeddingBackend:
+    """Бэкенд по имени модели: "hash" → HashingBackend, иначе SentenceTransformer."""
+    if resolve_model_name(model_name) == HASH_MODEL:
+        return HashingBackend()
+    return SentenceTransformerBackend(model_name, device)
 
 
 class EmbeddingModel:
     """
-    Обёртка над SentenceTransformer (multilingual MPNet):
+    Обёртка над бэкендом эмбеддингов (по умолчанию — multilingual MPNet):
       - автодетект CPU/GPU
       - возврат numpy-векторов
       - L2-нормализация
       - устойчивость к пустым строкам
       - совместимость с API.encode()
+
+    backend — готовый EmbeddingBackend (тогда model_name/device не нужны).
     """
 
     def __init__(
         self,
-        model_name: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
+        model_name: str = DEFAULT_MODEL,
         device: Optional[str] = None,
+        backend: Optional[EmbeddingBackend] = None,
     ):
         """
         device:
@@ -26,19 +220,8 @@ class EmbeddingModel:
             "cpu"  -> force CPU
             "cuda" -> force GPU
         """
-
-        # Автодетект устройства
-        if device is None:
-            try:
-                import torch
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-            except Exception:
-                device = "cpu"
-
-        self.device = device
-
-        print(f"[EmbeddingModel] Loading model {model_name} on {device}...")
-        self.model = SentenceTransformer(model_name, device=device)
+        self.backend = backend or make_backend(model_name, device)
+        self.dim = self.backend.dim
 
     # -------------------------------------------------------------
     # embed(): основной метод → numpy-вектора
@@ -62,12 +245,7 @@ class EmbeddingModel:
             for t in texts
         ]
 
-        vecs = self.model.encode(
-            safe_texts,
-            convert_to_numpy=True,
-            normalize_embeddings=True,  # сразу cosine-ready
-            show_progress_bar=False
-        )
+        vecs = self.backend.encode(safe_texts)
 
         return vecs[0] if single_input else vecs
 
@@ -76,3 +254,15 @@ class EmbeddingModel:
     # -------------------------------------------------------------
     def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
         return self.embed(texts)
+
+    # -------------------------------------------------------------
+    # count_tokens(): длина текстов в токенах локального токенизатора
+    # -------------------------------------------------------------
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Число токенов (без спецтокенов и без усечения до max_seq_length) —
+        для бюджета контекста на стороне LLM.
+        """
+        if not texts:
+            return []
+        return self.backend.count_tokens(list(texts))
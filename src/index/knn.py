@@ -0,0 +1,155 @@
+# src/index/knn.py
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..data.models import Edge
+from .progress import Progress
+
+
+SIMILAR_TO = "SIMILAR_TO"
+
+
+class KnnConfig:
+    """
+    Семантические соседи chunk-ов (рёбра SIMILAR_TO).
+
+    top_m      — соседей на chunk
+    min_sim    — ниже этого косинуса ребро не создаётся
+    max_sim    — выше — тоже (почти-дубликаты, их склеивает dedup)
+    block_rows — строк-запросов в одном блоке
+    block_cols — строк-кандидатов в одном блоке: память на блок —
+                 block_bytes() (~13 байт на пару строк), от размера
+                 корпуса не зависит
+    skip_same_section — не соединять chunk-и одной секции: они и так
+                 рядом по HAS_CHUNK
+    """
+
+    def __init__(
+        self,
+        top_m: int = 8,
+        min_sim: float = 0.5,
+        max_sim: float = 0.98,
+        block_rows: int = 1024,
+        block_cols: int = 8192,
+        skip_same_section: bool = True,
+    ):
+        self.top_m = top_m
+        self.min_sim = min_sim
+        self.max_sim = max_sim
+        self.block_rows = block_rows
+        self.block_cols = block_cols
+        self.skip_same_section = skip_same_section
+
+    def block_bytes(self) -> int:
+        """
+        Пиковая память на блок: сходства float32, маска секций bool,
+        индексы argpartition int64; плюс буферы top-M строк блока.
+        """
+        pairs = self.block_rows * self.block_cols
+        return pairs * (4 + 1 + 8) + self.block_rows * 2 * self.top_m * (4 + 8) * 2
+
+
+def knn_blocked(
+    emb: np.ndarray,
+    cfg: KnnConfig = KnnConfig(),
+    groups: Optional[np.ndarray] = None,
+    rows: Optional[Tuple[int, int]] = None,
+    progress: bool = True,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-M соседей каждой строки emb по скалярному произведению
+    (для L2-нормированных векторов — косинус).
+
+    Счёт блоками: emb[rows_block] @ emb[cols_block].T — float32 matmul
+    (многопоточный BLAS numpy), из блока сразу берётся top-M и сливается
+    с текущим top-M строки. emb может быть np.memmap: в памяти держатся
+    только два блока строк.
+
+    groups — код группы строки (секция): соседи из той же группы
+             пропускаются; None — пропускается только сама строка
+    rows   — (start, stop): считать только эти строки-запросы
+             (бенчмарк на выборке, шардирование)
+
+    Возвращает:
+        nbr — int32 [R, M], индексы соседей по убыванию сходства (-1 — нет)
+        sim — float32 [R, M]
+    """
+    n = emb.shape[0]
+    start, stop = rows if rows is not None else (0, n)
+    m = cfg.top_m
+    nbr = np.full((stop - start, m), -1, dtype=np.int32)
+    sim = np.full((stop - start, m), -np.inf, dtype=np.float32)
+
+    bar = Progress("knn", stop - start, unit="rows") if progress else None
+    for r0 in range(start, stop, cfg.block_rows):
+        r1 = min(r0 + cfg.block_rows, stop)
+        q = np.ascontiguousarray(emb[r0:r1], dtype=np.float32)
+        best_i = np.full((r1 - r0, m), -1, dtype=np.int64)
+        best_s = np.full((r1 - r0, m), -np.inf, dtype=np.float32)
+        row_ids = np.arange(r0, r1)
+
+        for c0 in range(0, n, cfg.block_cols):
+            c1 = min(c0 + cfg.block_cols, n)
+            s = q @ np.asarray(emb[c0:c1], dtype=np.float32).T
+
+            # себя, слишком близких и соседей по секции — вон
+            s[s > cfg.max_sim] = -np.inf
+            if groups is not None:
+                s[groups[r0:r1, None] == groups[None, c0:c1]] = -np.inf
+            diag = row_ids[(row_ids >= c0) & (row_ids < c1)]
+            s[diag - r0, diag - c0] = -np.inf
+
+            # -s на месте: argpartition ищет минимумы, копия блока не нужна
+            np.negative(s, out=s)
+            k = min(m, c1 - c0)
+            if k < c1 - c0:
+                part = np.argpartition(s, k - 1, axis=1)[:, :k]
+            else:
+                part = np.broadcast_to(np.arange(c1 - c0), (r1 - r0, c1 - c0))
+            cand_i = np.concatenate([best_i, part + c0], axis=1)
+            cand_s = np.concatenate([best_s, -np.take_along_axis(s, part, axis=1)], axis=1)
+            del s, part
+            keep = np.argpartition(-cand_s, m - 1, axis=1)[:, :m]
+            best_i = np.take_along_axis(cand_i, keep, axis=1)
+            best_s = np.take_along_axis(cand_s, keep, axis=1)
+
+        order = np.argsort(-best_s, axis=1, kind="stable")
+        best_i = np.take_along_axis(best_i, order, axis=1)
+        best_s = np.take_along_axis(best_s, order, axis=1)
+        best_i[~np.isfinite(best_s) | (best_s < cfg.min_sim)] = -1
+        nbr[r0 - start:r1 - start] = best_i
+        sim[r0 - start:r1 - start] = best_s
+        if bar is not None:
+            bar.update(r1 - r0)
+    if bar is not None:
+        bar.close()
+
+    sim[nbr < 0] = 0.0
+    return nbr, sim
+
+
+def knn_edges(ids: List[str], nbr: np.ndarray, sim: np.ndarray) -> Dict[str, List[Edge]]:
+    """Строки kNN → рёбра SIMILAR_TO (weight — косинус), id строк — ids."""
+    adj: Dict[str, List[Edge]] = {}
+    for i, (row_n, row_s) in enumerate(zip(nbr, sim)):
+        edges = [
+            Edge(from_id=ids[i], to_id=ids[j], relation_type=SIMILAR_TO, weight=float(s))
+            for j, s in zip(row_n, row_s)
+            if j >= 0
+        ]
+        if edges:
+            adj[ids[i]] = edges
+    return adj
+
+
+def add_similar_edges(graph_adj: Dict[str, List[Edge]], similar: Dict[str, List[Edge]]) -> int:
+    """Дописывает рёбра SIMILAR_TO в graph_adj (старые SIMILAR_TO заменяются)."""
+    added = 0
+    for src in list(graph_adj):
+        graph_adj[src] = [e for e in graph_adj[src] if e.relation_type != SIMILAR_TO]
+    for src, edges in similar.items():
+        graph_adj.setdefault(src, []).extend(edges)
+        added += len(edges)
+    return added
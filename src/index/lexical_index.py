@@ -0,0 +1,402 @@
+# src/index/lexical_index.py
+
+import functools
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..data.models import Section, TextNode
+from .textutil import tokenize
+
+
+# -------------------------------------------------------------
+# TOKENIZATION (tokenize — общий с HashingBackend, см. textutil.py)
+# -------------------------------------------------------------
+_STOPWORDS = {
+    "и", "в", "во", "не", "что", "он", "на", "я", "с", "со", "как", "а",
+    "то", "все", "она", "так", "его", "но", "ты", "к", "у", "же", "вы",
+    "за", "бы", "по", "ее", "мне", "есть", "от", "о", "из", "ли", "если",
+    "или", "для", "это", "при", "до", "их", "мы", "они", "этот", "эта",
+    "эти", "также", "только", "может", "можно", "будет", "был", "была",
+}
+
+
+# -------------------------------------------------------------
+# RUSSIAN STEMMER (Snowball/Porter, локальная реализация)
+# -------------------------------------------------------------
+_VOWELS = set("аеиоуыэюя")
+
+_PERFECTIVE_GERUND_1 = ("вшись", "вши", "в")                 # после а/я
+_PERFECTIVE_GERUND_2 = ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв")
+_REFLEXIVE = ("ся", "сь")
+_ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому",
+    "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+_PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")                # после а/я
+_PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+_VERB_1 = (                                                  # после а/я
+    "ете", "йте", "ешь", "нно",
+    "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть", "й", "л", "н",
+)
+_VERB_2 = (
+    "ейте", "уйте",
+    "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует",
+    "уют", "ены", "ить", "ыть", "ишь",
+    "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю",
+)
+_NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях",
+    "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам",
+    "ом", "ах", "ях", "ию", "ью", "ия", "ья",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я",
+)
+_SUPERLATIVE = ("ейше", "ейш")
+_DERIVATIONAL = ("ость", "ост")
+
+# _strip_ending() проверяет окончания от длинных к коротким:
+# сортируем один раз здесь, а не на каждое слово
+(
+    _PERFECTIVE_GERUND_1, _PERFECTIVE_GERUND_2, _REFLEXIVE, _ADJECTIVE,
+    _PARTICIPLE_1, _PARTICIPLE_2, _VERB_1, _VERB_2, _NOUN, _SUPERLATIVE,
+) = (
+    tuple(sorted(endings, key=len, reverse=True))
+    for endings in (
+        _PERFECTIVE_GERUND_1, _PERFECTIVE_GERUND_2, _REFLEXIVE, _ADJECTIVE,
+        _PARTICIPLE_1, _PARTICIPLE_2, _VERB_1, _VERB_2, _NOUN, _SUPERLATIVE,
+    )
+)
+
+
+def _strip_ending(rv: str, endings, after_a_ya: bool = False) -> Optional[str]:
+    """
+    Убирает самое длинное подходящее окончание; None — если не нашлось.
+    endings отсортированы по убыванию длины.
+    """
+    for e in endings:
+        if not rv.endswith(e):
+            continue
+        rest = rv[: len(rv) - len(e)]
+        if after_a_ya and not (rest and rest[-1] in "ая"):
+            continue
+        return rest
+    return None
+
+
+def _strip_grouped(rv: str, group_1, group_2) -> Optional[str]:
+    """Группа 1 — только после а/я, группа 2 — без условий; берём более длинное."""
+    a = _strip_ending(rv, group_1, after_a_ya=True)
+    b = _strip_ending(rv, group_2)
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if len(a) < len(b) else b
+
+
+def _regions(word: str):
+    """Начала областей RV и R2 (индексы в word)."""
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in _VOWELS:
+            rv = i + 1
+            break
+
+    def r_after(start: int) -> int:
+        for i in range(max(start, 1), len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = r_after(0)
+    r2 = r_after(r1)
+    return rv, r2
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def stem_ru(word: str) -> str:
+    """Стемминг русского слова (алгоритм Snowball russian), с LRU-кэшем по слову."""
+    if len(word) < 3:
+        return word
+
+    rv_start, r2_start = _regions(word)
+    head, rv = word[:rv_start], word[rv_start:]
+
+    # Step 1
+    r = _strip_grouped(rv, _PERFECTIVE_GERUND_1, _PERFECTIVE_GERUND_2)
+    if r is None:
+        r = _strip_ending(rv, _REFLEXIVE)
+        if r is not None:
+            rv = r
+
+        r = _strip_ending(rv, _ADJECTIVE)
+        if r is not None:
+            p = _strip_grouped(r, _PARTICIPLE_1, _PARTICIPLE_2)
+            if p is not None:
+                r = p
+        else:
+            r = _strip_grouped(rv, _VERB_1, _VERB_2)
+            if r is None:
+                r = _strip_ending(rv, _NOUN)
+    if r is not None:
+        rv = r
+
+    # Step 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Step 3 — словообразовательные суффиксы только в R2
+    for e in _DERIVATIONAL:
+        if rv.endswith(e) and len(head) + len(rv) - len(e) >= r2_start:
+            rv = rv[: -len(e)]
+            break
+
+    # Step 4
+    r = _strip_ending(rv, _SUPERLATIVE)
+    if r is not None:
+        rv = r
+        if rv.endswith("нн"):
+            rv = rv[:-1]
+    elif rv.endswith("нн"):
+        rv = rv[:-1]
+    elif rv.endswith("ь"):
+        rv = rv[:-1]
+
+    return head + rv
+
+
+def analyze(text: str) -> List[str]:
+    """Токены → без стоп-слов → стемминг кириллицы (латиница и числа как есть)."""
+    terms = []
+    for tok in tokenize(text):
+        if tok in _STOPWORDS:
+            continue
+        if "а" <= tok[0] <= "я":
+            tok = stem_ru(tok)
+        terms.append(tok)
+    return terms
+
+
+# -------------------------------------------------------------
+# VARINT (postings на диске: дельты + varint)
+# -------------------------------------------------------------
+def varint_encode(values: np.ndarray) -> bytes:
+    v = np.asarray(values, dtype=np.uint64)
+    nb = np.ones(len(v), dtype=np.int64)
+    for j in range(1, 10):
+        nb += v >= (np.uint64(1) << np.uint64(7 * j))
+
+    starts = np.cumsum(nb) - nb
+    out = np.empty(int(nb.sum()), dtype=np.uint8)
+    for j in range(int(nb.max(initial=0))):
+        m = nb > j
+        b = ((v[m] >> np.uint64(7 * j)) & np.uint64(0x7F)).astype(np.uint8)
+        b[nb[m] - 1 > j] |= 0x80
+        out[starts[m] + j] = b
+    return out.tobytes()
+
+
+def varint_decode(buf: bytes) -> np.ndarray:
+    b = np.frombuffer(buf, dtype=np.uint8)
+    if len(b) == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = ((np.arange(len(b)) - starts[group]) * 7).astype(np.uint64)
+    parts = (b & 0x7F).astype(np.uint64) << shift
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+# -------------------------------------------------------------
+# INVERTED INDEX + BM25
+# -------------------------------------------------------------
+class LexicalIndex:
+    """
+    Инвертированный индекс с BM25 поверх набора документов.
+
+    В памяти postings лежат плоскими массивами:
+        post_docs[offsets[t]:offsets[t+1]] — отсортированные номера документов
+        post_tf[...]                        — частоты терма
+    На диске (pickle) — дельты номеров документов и tf в varint.
+
+    Запрос считает BM25 только для заданных строк (кандидатов):
+    по каждому терму — searchsorted кандидатов в его postings,
+    поэтому стоимость не зависит от размера корпуса.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        self.doc_ids: List[str] = []
+        self.row_of: Dict[str, int] = {}
+        self.vocab: Dict[str, int] = {}
+
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.uint32)
+        self.post_tf = np.zeros(0, dtype=np.uint16)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.avgdl = 1.0
+        self.idf = np.zeros(0, dtype=np.float32)
+
+    # -------------------------------------------------------------
+    # build()
+    # -------------------------------------------------------------
+    @classmethod
+    def build(cls, doc_ids: List[str], texts: List[str], k1: float = 1.2, b: float = 0.75):
+        idx = cls(k1=k1, b=b)
+        idx.doc_ids = list(doc_ids)
+        idx.row_of = {d: i for i, d in enumerate(idx.doc_ids)}
+
+        postings: Dict[str, List[tuple]] = {}
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            terms = analyze(text or "")
+            doc_len[row] = len(terms)
+            tf: Dict[str, int] = {}
+            for t in terms:
+                tf[t] = tf.get(t, 0) + 1
+            for t, c in tf.items():
+                postings.setdefault(t, []).append((row, c))
+
+        vocab = sorted(postings)
+        idx.vocab = {t: i for i, t in enumerate(vocab)}
+
+        lengths = np.array([len(postings[t]) for t in vocab], dtype=np.int64)
+        idx.offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=idx.offsets[1:])
+
+        idx.post_docs = np.fromiter(
+            (r for t in vocab for r, _ in postings[t]),
+            dtype=np.uint32, count=int(idx.offsets[-1]),
+        )
+        idx.post_tf = np.fromiter(
+            (min(c, 65535) for t in vocab for _, c in postings[t]),
+            dtype=np.uint16, count=int(idx.offsets[-1]),
+        )
+
+        idx.doc_len = doc_len
+        idx._finalize()
+        return idx
+
+    def _finalize(self):
+        n_docs = len(self.doc_ids)
+        self.avgdl = float(self.doc_len.mean()) if n_docs and self.doc_len.sum() > 0 else 1.0
+        df = np.diff(self.offsets).astype(np.float64)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    # -------------------------------------------------------------
+    # Сжатие postings при сохранении
+    # -------------------------------------------------------------
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        deltas = self.post_docs.astype(np.int64)
+        if len(deltas):
+            deltas[1:] -= self.post_docs[:-1].astype(np.int64)
+            # первый элемент каждого терма хранится как есть
+            firsts = self.offsets[:-1][np.diff(self.offsets) > 0]
+            deltas[firsts] = self.post_docs[firsts]
+
+        state["post_docs"] = varint_encode(deltas)
+        state["post_tf"] = varint_encode(self.post_tf)
+        del state["idf"]
+        del state["row_of"]
+        return state
+
+    def __setstate__(self, state):
+        deltas = varint_decode(state["post_docs"])
+        csum = np.cumsum(deltas, dtype=np.uint64)
+        lengths = np.diff(state["offsets"])
+        base = np.concatenate(([0], csum))[state["offsets"][:-1]]
+        state["post_docs"] = (csum - np.repeat(base, lengths)).astype(np.uint32)
+        state["post_tf"] = varint_decode(state["post_tf"]).astype(np.uint16)
+
+        self.__dict__.update(state)
+        self.row_of = {d: i for i, d in enumerate(self.doc_ids)}
+        self._finalize()
+
+    # -------------------------------------------------------------
+    # Запрос
+    # -------------------------------------------------------------
+    def query_terms(self, query: str) -> List[int]:
+        """Уникальные term_id запроса, присутствующие в словаре."""
+        seen = []
+        for t in analyze(query):
+            tid = self.vocab.get(t)
+            if tid is not None and tid not in seen:
+                seen.append(tid)
+        return seen
+
+    def _term_scores(self, tid: int, docs: np.ndarray, tf: np.ndarray) -> np.ndarray:
+        tf = tf.astype(np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+        return self.idf[tid] * tf * (self.k1 + 1.0) / (tf + norm)
+
+    def score_rows(self, term_ids: List[int], rows: np.ndarray) -> np.ndarray:
+        """BM25 для заданных строк (номеров документов), в их порядке."""
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.zeros(len(rows), dtype=np.float32)
+        if not len(rows) or not term_ids:
+            return out
+
+        order = np.argsort(rows, kind="stable")
+        # тот же dtype, что у postings: иначе searchsorted копирует весь список
+        srows = rows[order].astype(self.post_docs.dtype)
+
+        for tid in term_ids:
+            lo, hi = self.offsets[tid], self.offsets[tid + 1]
+            docs = self.post_docs[lo:hi]
+            pos = np.searchsorted(docs, srows)
+            pos[pos >= len(docs)] = len(docs) - 1
+            hit = docs[pos] == srows
+            if not hit.any():
+                continue
+            p = pos[hit]
+            out[order[hit]] += self._term_scores(tid, docs[p], self.post_tf[lo:hi][p])
+
+        return out
+
+    def score_dense(self, term_ids: List[int]) -> np.ndarray:
+        """BM25 для всех документов (для небольших индексов, например секций)."""
+        out = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for tid in term_ids:
+            lo, hi = self.offsets[tid], self.offsets[tid + 1]
+            docs = self.post_docs[lo:hi]
+            out[docs] += self._term_scores(tid, docs, self.post_tf[lo:hi])
+        return out
+
+
+# -------------------------------------------------------------
+# Индексы для пайплайна: chunks + local/subtree текст секций
+# -------------------------------------------------------------
+def build_lexical_indexes(
+    sections: Dict[str, Section],
+    text_nodes: Dict[str, TextNode],
+) -> Dict[str, LexicalIndex]:
+    print("[LexicalIndex] Building inverted indexes...")
+
+    lexical = {
+        "chunks": LexicalIndex.build(
+            list(text_nodes.keys()),
+            [tn.text for tn in text_nodes.values()],
+        ),
+        "section_local": LexicalIndex.build(
+            list(sections.keys()),
+            [s.local_text for s in sections.values()],
+        ),
+        "section_subtree": LexicalIndex.build(
+            list(sections.keys()),
+            [s.subtree_text for s in sections.values()],
+        ),
+    }
+
+    print(f"[LexicalIndex] DONE. Terms in chunk index: {len(lexical['chunks'].vocab)}")
+    return lexical
@@ -3,6 +3,7 @@
 from typing import Dict
 import numpy as np
 from .embeddings import EmbeddingModel
+from .progress import Progress
 from ..data.models import Section
 
 
@@ -36,7 +37,7 @@ class SectionIndex:
 
         print("[SectionIndex] Computing embeddings for sections...")
 
-        counter = 0
+        progress = Progress("SectionIndex", len(sections), unit="sections")
         for sid, sec in sections.items():
             # local text embedding
             sec.E_local = get_emb(sec.local_text)
@@ -44,9 +45,8 @@ class SectionIndex:
             # subtree embedding
             sec.E_subtree = get_emb(sec.subtree_text)
 
-            counter += 1
-            if counter % 20 == 0:
-                print(f"  processed {counter}/{len(sections)} sections")
+            progress.update()
+        progress.close()
 
         print(f"[SectionIndex] DONE. Total sections: {len(sections)}")
         return sections
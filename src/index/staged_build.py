@@ -0,0 +1,520 @@
+# src/index/staged_build.py
+#
+# Сборка индекса по стадиям с контрольными точками:
+#
+#   load → hierarchy → dedup → section_embeddings → text_embeddings → knn → graph → lexical → save
+#
+# Каждая стадия пишет результат в <out_dir>/.build/ вместе с ключом —
+# sha256 её входов (ключи стадий-зависимостей + параметры; у load —
+# содержимое JSON-файлов). Повторный запуск пропускает стадии с тем же
+# ключом, а стадии эмбеддингов продолжаются с последней сброшенной пачки.
+
+import hashlib
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from ..data.loaders import load_ontology, build_reverse_adj
+from ..ontology.hierarchy import build_hierarchy, build_section_chunks
+from .dedup import DedupConfig, find_near_duplicates
+from .embeddings import DEFAULT_MODEL
+from .knn import KnnConfig, knn_blocked, knn_edges, add_similar_edges
+from .lexical_index import build_lexical_indexes
+from .progress import Progress
+from .store import save_index, save_lexical, save_embedding_ids, save_embedding_dim, write_embedding_matrix
+
+
+STAGES = (
+    "load",
+    "hierarchy",
+    "dedup",
+    "section_embeddings",
+    "text_embeddings",
+    "knn",
+    "graph",
+    "lexical",
+    "save",
+)
+
+# стадия → стадии, от результата которых она зависит
+DEPENDS = {
+    "load": (),
+    "hierarchy": ("load",),
+    "dedup": ("hierarchy",),
+    "section_embeddings": ("hierarchy",),
+    "text_embeddings": ("hierarchy", "dedup"),
+    "knn": ("hierarchy", "dedup", "text_embeddings"),
+    "graph": ("hierarchy",),
+    "lexical": ("hierarchy",),
+    "save": ("hierarchy", "dedup", "section_embeddings", "text_embeddings", "knn", "graph", "lexical"),
+}
+
+
+class BuildConfig:
+    """
+    Параметры поэтапной сборки.
+
+    nodes_path / edges_path — graphrag_nodes.json / graphrag_edges.json
+    out_dir     — каталог индекса; промежуточные результаты — out_dir/.build
+    model_name  — модель эмбеддингов (входит в ключ стадий эмбеддингов)
+    batch_size  — текстов на один вызов model.encode()
+    flush_every — через сколько пачек сбрасывать эмбеддинги на диск
+                  (столько работы теряется при падении)
+    dedup       — поиск почти-дубликатов chunk-ов (None — выключен):
+                  эмбеддится один текст на кластер
+    knn         — рёбра SIMILAR_TO к top-M похожим chunk-ам (index/knn.py);
+                  None — не строить (O(N²) по числу chunk-ов)
+    memmap_embeddings — эмбеддинги не попадают в объекты Section / TextNode:
+                  матрицы индекса собираются из матриц стадий кусками
+                  через memmap, pickle узлов без векторов, load_index()
+                  подключает .npy сам. Это только вывод эмбеддингов через
+                  memmap: узлы, тексты, граф, dedup и BM25 сборка держит
+                  в памяти целиком, и память растёт с размером корпуса
+    """
+
+    def __init__(
+        self,
+        nodes_path: str = "graphrag_nodes.json",
+        edges_path: str = "graphrag_edges.json",
+        out_dir: str = "index",
+        model_name: str = DEFAULT_MODEL,
+        batch_size: int = 64,
+        flush_every: int = 8,
+        work_dir: Optional[str] = None,
+        dedup: Optional[DedupConfig] = DedupConfig(),
+        knn: Optional[KnnConfig] = None,
+        memmap_embeddings: bool = False,
+    ):
+        self.nodes_path = nodes_path
+        self.edges_path = edges_path
+        self.out_dir = out_dir
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.flush_every = flush_every
+        self.work_dir = work_dir or str(Path(out_dir) / ".build")
+        self.dedup = dedup
+        self.knn = knn
+        self.memmap_embeddings = memmap_embeddings
+
+
+# -------------------------------------------------------------
+# Файлы
+# -------------------------------------------------------------
+def file_sha256(path: str, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(block)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+
+def _atomic_write(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _write_json(path: Path, obj):
+    _atomic_write(path, json.dumps(obj, indent=2).encode("utf-8"))
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_pickle(path: Path, obj):
+    _atomic_write(path, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _read_pickle(path: Path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+# -------------------------------------------------------------
+# Тексты для эмбеддингов (те же правила, что у SectionIndex / TextIndex)
+# -------------------------------------------------------------
+def section_texts(sections) -> List[str]:
+    """Уникальные непустые local_text / subtree_text (после strip) в порядке секций."""
+    seen = {}
+    for sec in sections.values():
+        for t in (sec.local_text.strip(), sec.subtree_text.strip()):
+            if t:
+                seen.setdefault(t, None)
+    return list(seen)
+
+
+def node_texts(text_nodes, cluster_of: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    Уникальные непустые тексты text_nodes в порядке узлов.
+    Узлы-дубликаты (cluster_of[id] — другой узел) не входят:
+    им достаётся эмбеддинг представителя.
+    """
+    cluster_of = cluster_of or {}
+    seen = {}
+    for tn in text_nodes.values():
+        if cluster_of.get(tn.id, tn.id) != tn.id:
+            continue
+        if tn.text and tn.text.strip():
+            seen.setdefault(tn.text, None)
+    return list(seen)
+
+
+class StagedBuild:
+    """
+    Поэтапная возобновляемая сборка индекса (build_index.py).
+
+    model_factory(model_name) создаёт модель эмбеддингов — только если
+    какой-то стадии эмбеддингов действительно есть что считать.
+    run(force=...) — пересобрать заданные стадии (и всё, что от них зависит:
+    у зависимых меняется ключ только при изменении входов, поэтому
+    force распространяется явно).
+    """
+
+    def __init__(self, config: BuildConfig, model_factory: Callable[[str], object]):
+        self.cfg = config
+        self.model_factory = model_factory
+        self.work = Path(config.work_dir)
+        self.work.mkdir(parents=True, exist_ok=True)
+
+        self._model = None
+        self.keys: Dict[str, str] = {}
+        # стадия → "cached" | "built" | "resumed"
+        self.status: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+
+        # результаты стадий в памяти
+        self.sections = None
+        self.text_nodes = None
+        self.graph_adj = None
+        self.cluster_of: Dict[str, str] = {}
+
+    @property
+    def model(self):
+        if self._model is None:
+            print(f"[StagedBuild] Loading embedding model {self.cfg.model_name}")
+            self._model = self.model_factory(self.cfg.model_name)
+        return self._model
+
+    # -------------------------------------------------------------
+    # Ключи стадий
+    # -------------------------------------------------------------
+    def stage_params(self, name: str) -> dict:
+        cfg = self.cfg
+        if name == "load":
+            return {
+                "nodes": file_sha256(cfg.nodes_path),
+                "edges": file_sha256(cfg.edges_path),
+                "compact_graph": True,
+            }
+        if name in ("section_embeddings", "text_embeddings"):
+            return {"model": cfg.model_name}
+        if name == "dedup":
+            return {"dedup": vars(cfg.dedup) if cfg.dedup is not None else None}
+        if name == "knn":
+            return {"knn": vars(cfg.knn) if cfg.knn is not None else None}
+        if name == "save":
+            return {"out_dir": str(Path(cfg.out_dir).resolve()), "memmap_embeddings": cfg.memmap_embeddings}
+        return {}
+
+    def stage_key(self, name: str) -> str:
+        payload = {
+            "stage": name,
+            "params": self.stage_params(name),
+            "deps": [self.keys[d] for d in DEPENDS[name]],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def is_done(self, name: str, key: str) -> bool:
+        manifest = _read_json(self.work / f"{name}.json")
+        return manifest is not None and manifest.get("key") == key
+
+    def mark_done(self, name: str, key: str, **info):
+        _write_json(self.work / f"{name}.json", {"key": key, "finished": time.time(), **info})
+
+    # -------------------------------------------------------------
+    # Запуск
+    # -------------------------------------------------------------
+    def run(self, force: Optional[List[str]] = None) -> Dict[str, str]:
+        force = set(force or ())
+        for name in force:
+            if name not in STAGES:
+                raise ValueError(f"unknown stage {name!r}, expected one of {STAGES}")
+
+        forced = set()
+        for i, name in enumerate(STAGES, 1):
+            key = self.stage_key(name)
+            self.keys[name] = key
+            if name in force or any(d in forced for d in DEPENDS[name]):
+                forced.add(name)
+                (self.work / f"{name}.json").unlink(missing_ok=True)
+                (self.work / f"{name}.progress.json").unlink(missing_ok=True)
+
+            t0 = time.perf_counter()
+            cached = self.is_done(name, key)
+            print(f"=== {i}. {name}{' (cached)' if cached else ''} ===")
+            getattr(self, f"stage_{name}")(key, cached)
+            self.timings[name] = time.perf_counter() - t0
+            self.status.setdefault(name, "cached" if cached else "built")
+
+        print(f"\n=== DONE. Index saved to {self.cfg.out_dir} ===")
+        return self.status
+
+    # -------------------------------------------------------------
+    # Стадии
+    # -------------------------------------------------------------
+    def stage_load(self, key: str, cached: bool):
+        path = self.work / "load.pkl"
+        if cached:
+            return
+        sections, text_nodes, graph_adj = load_ontology(self.cfg.nodes_path, self.cfg.edges_path)
+        _write_pickle(path, (sections, text_nodes, graph_adj))
+        self.mark_done("load", key, sections=len(sections), text_nodes=len(text_nodes))
+
+    def stage_hierarchy(self, key: str, cached: bool):
+        path = self.work / "hierarchy.pkl"
+        if cached:
+            self.sections, self.text_nodes, self.graph_adj = _read_pickle(path)
+            return
+        sections, text_nodes, graph_adj = _read_pickle(self.work / "load.pkl")
+        build_hierarchy(sections, text_nodes)
+        self.sections, self.text_nodes, self.graph_adj = sections, text_nodes, graph_adj
+        _write_pickle(path, (sections, text_nodes, graph_adj))
+        self.mark_done("hierarchy", key)
+
+    def stage_dedup(self, key: str, cached: bool):
+        path = self.work / "dedup.pkl"
+        if cached:
+            self.cluster_of = _read_pickle(path)
+            return
+        stats = {}
+        if self.cfg.dedup is not None:
+            self.cluster_of, stats = find_near_duplicates(self.text_nodes, self.cfg.dedup)
+            print(
+                f"[StagedBuild] dedup: {stats['clusters']} clusters, {stats['duplicates']} duplicates; "
+                f"embeddings saved {stats['embeddings_saved']} ({stats['embed_chars_saved']} chars), "
+                f"duplicate text {stats['duplicate_text_bytes']} bytes"
+            )
+        _write_pickle(path, self.cluster_of)
+        self.mark_done("dedup", key, **stats)
+
+    def stage_section_embeddings(self, key: str, cached: bool):
+        self._embed_stage("section_embeddings", key, cached, section_texts(self.sections), "texts")
+
+    def stage_text_embeddings(self, key: str, cached: bool):
+        texts = node_texts(self.text_nodes, self.cluster_of)
+        self._embed_stage("text_embeddings", key, cached, texts, "texts")
+
+        # токены — по всем узлам (в т.ч. пустым), как TextIndex.compute_token_counts
+        tokens_path = self.work / "text_tokens.npy"
+        if cached and tokens_path.exists():
+            return
+        nodes = list(self.text_nodes.values())
+        counts = np.zeros(len(nodes), dtype=np.int64)
+        bs = max(self.cfg.batch_size, 256)
+        for start in range(0, len(nodes), bs):
+            batch = nodes[start:start + bs]
+            counts[start:start + len(batch)] = self.model.count_tokens([tn.text for tn in batch])
+        with open(tokens_path.with_name("text_tokens.tmp.npy"), "wb") as f:
+            np.save(f, counts)
+        os.replace(tokens_path.with_name("text_tokens.tmp.npy"), tokens_path)
+        self.mark_done("text_embeddings", key, rows=len(texts), tokens=int(counts.sum()))
+
+    def _embed_stage(self, name: str, key: str, cached: bool, texts: List[str], label: str):
+        """
+        Эмбеддинги уникальных текстов в <name>.npy (строка i — texts[i]).
+
+        Матрица создаётся на диске (open_memmap) после первой пачки и
+        заполняется по мере счёта; каждые flush_every пачек — flush()
+        и <name>.progress.json с числом готовых строк. После падения
+        счёт продолжается с этой строки, если ключ стадии тот же.
+        """
+        mat_path = self.work / f"{name}.npy"
+        progress_path = self.work / f"{name}.progress.json"
+        if cached:
+            return
+
+        n = len(texts)
+        state = _read_json(progress_path)
+        done = 0
+        mat = None
+        if state is not None and state.get("key") == key and state.get("rows") == n and mat_path.exists():
+            done = state["done"]
+            mat = np.lib.format.open_memmap(mat_path, mode="r+")
+            if done:
+                self.status[name] = "resumed"
+                print(f"[StagedBuild] {name}: resuming at {done}/{n}")
+
+        bs = self.cfg.batch_size
+        progress = Progress(name, n, unit=label, done=done)
+        batches = 0
+        for start in range(done, n, bs):
+            batch = texts[start:start + bs]
+            vecs = np.asarray(self.model.encode(batch), dtype=np.float32)
+            if mat is None:
+                mat = np.lib.format.open_memmap(mat_path, mode="w+", dtype=np.float32, shape=(n, vecs.shape[1]))
+            mat[start:start + len(batch)] = vecs
+            done = start + len(batch)
+            progress.update(len(batch))
+
+            batches += 1
+            if batches % self.cfg.flush_every == 0:
+                mat.flush()
+                _write_json(progress_path, {"key": key, "rows": n, "done": done})
+        progress.close()
+
+        if mat is None:  # нет ни одного текста
+            np.save(mat_path, np.zeros((0, 0), dtype=np.float32))
+        else:
+            mat.flush()
+            del mat
+        _write_json(progress_path, {"key": key, "rows": n, "done": n})
+        if name == "section_embeddings":
+            self.mark_done(name, key, rows=n)
+
+    def knn_rows(self) -> List[str]:
+        """id узла для каждой строки text_embeddings.npy (первый узел с этим текстом)."""
+        first = {}
+        for tn in self.text_nodes.values():
+            if self.cluster_of.get(tn.id, tn.id) == tn.id and tn.text and tn.text.strip():
+                first.setdefault(tn.text, tn.id)
+        return [first[t] for t in node_texts(self.text_nodes, self.cluster_of)]
+
+    def stage_knn(self, key: str, cached: bool):
+        path = self.work / "knn.pkl"
+        if cached:
+            return
+        cfg = self.cfg.knn
+        if cfg is None:
+            _write_pickle(path, None)
+            self.mark_done("knn", key)
+            return
+
+        ids = self.knn_rows()
+        emb = np.load(self.work / "text_embeddings.npy", mmap_mode="r")
+        groups = None
+        if cfg.skip_same_section:
+            codes = {}
+            groups = np.array(
+                [codes.setdefault(self.text_nodes[nid].section_id, len(codes)) for nid in ids],
+                dtype=np.int64,
+            )
+        t0 = time.perf_counter()
+        nbr, sim = knn_blocked(emb, cfg, groups=groups)
+        elapsed = time.perf_counter() - t0
+        _write_pickle(path, (ids, nbr, sim))
+
+        edges = int((nbr >= 0).sum())
+        print(
+            f"[StagedBuild] knn: {len(ids)} chunks, {edges} SIMILAR_TO edges in {elapsed:.1f} s, "
+            f"block {cfg.block_bytes() / 2**20:.0f} MB"
+        )
+        self.mark_done("knn", key, rows=len(ids), edges=edges, seconds=round(elapsed, 3),
+                       block_bytes=cfg.block_bytes())
+
+    def stage_graph(self, key: str, cached: bool):
+        path = self.work / "graph.pkl"
+        if cached:
+            return
+        graph_radj = build_reverse_adj(self.graph_adj)
+        section_chunks = build_section_chunks(self.sections, self.text_nodes)
+        _write_pickle(path, (graph_radj, section_chunks))
+        self.mark_done("graph", key)
+
+    def stage_lexical(self, key: str, cached: bool):
+        path = self.work / "lexical.pkl"
+        if cached:
+            return
+        _write_pickle(path, build_lexical_indexes(self.sections, self.text_nodes))
+        self.mark_done("lexical", key)
+
+    def stage_save(self, key: str, cached: bool):
+        out = Path(self.cfg.out_dir)
+        if cached and (out / "text_nodes.pkl").exists():
+            return
+        if self.cfg.memmap_embeddings:
+            self.write_embeddings(out)
+        else:
+            self.apply_embeddings()
+        graph_radj, section_chunks = _read_pickle(self.work / "graph.pkl")
+        knn = _read_pickle(self.work / "knn.pkl")
+        if knn is not None:
+            similar = knn_edges(*knn)
+            add_similar_edges(self.graph_adj, similar)
+            for edges in similar.values():
+                for e in edges:
+                    graph_radj.setdefault(e.to_id, []).append(e)
+        save_index(
+            str(out), self.sections, self.text_nodes, self.graph_adj, graph_radj, section_chunks,
+            embeddings=not self.cfg.memmap_embeddings,
+        )
+        save_lexical(str(out), _read_pickle(self.work / "lexical.pkl"))
+        self.mark_done("save", key)
+        self.status["save"] = "built"
+
+    def embedding_rows(self):
+        """
+        Номера строк матриц стадий для каждого узла (-1 — нет вектора):
+        sec_local, sec_subtree — в порядке sections, text — в порядке text_nodes.
+        Попутно проставляет TextNode.cluster_id и n_tokens.
+        """
+        sec_row = {t: i for i, t in enumerate(section_texts(self.sections))}
+        local = np.array([sec_row.get(s.local_text.strip(), -1) for s in self.sections.values()], dtype=np.int64)
+        subtree = np.array([sec_row.get(s.subtree_text.strip(), -1) for s in self.sections.values()], dtype=np.int64)
+
+        txt_row = {t: i for i, t in enumerate(node_texts(self.text_nodes, self.cluster_of))}
+        tokens = np.load(self.work / "text_tokens.npy", mmap_mode="r")
+        text = np.full(len(self.text_nodes), -1, dtype=np.int64)
+        for i, tn in enumerate(self.text_nodes.values()):
+            tn.cluster_id = self.cluster_of.get(tn.id)
+            tn.n_tokens = int(tokens[i])
+            # дубликат берёт вектор представителя кластера
+            t = self.text_nodes[tn.cluster_id].text if tn.cluster_id else tn.text
+            if t:
+                text[i] = txt_row.get(t, -1)
+        return local, subtree, text
+
+    def write_embeddings(self, out: Path):
+        """
+        memmap_embeddings: матрицы индекса напрямую из матриц стадий, без векторов
+        в узлах. Сами узлы (self.sections / self.text_nodes) остаются в памяти.
+        """
+        out.mkdir(parents=True, exist_ok=True)
+        local, subtree, text = self.embedding_rows()
+        sec_mat = np.load(self.work / "section_embeddings.npy", mmap_mode="r")
+        txt_mat = np.load(self.work / "text_embeddings.npy", mmap_mode="r")
+        write_embedding_matrix(out, "sec_local", sec_mat, local)
+        write_embedding_matrix(out, "sec_subtree", sec_mat, subtree)
+        write_embedding_matrix(out, "text_emb", txt_mat, text)
+        save_embedding_ids(out, self.sections, self.text_nodes)
+        save_embedding_dim(out, int(sec_mat.shape[1]), external=True)
+        for sec in self.sections.values():
+            sec.E_local = sec.E_subtree = None
+        for tn in self.text_nodes.values():
+            tn.embedding = None
+
+    def apply_embeddings(self):
+        """Раскладывает матрицы стадий эмбеддингов по Section / TextNode."""
+        local, subtree, text = self.embedding_rows()
+        sec_mat = np.load(self.work / "section_embeddings.npy")
+        for sec, rl, rs in zip(self.sections.values(), local, subtree):
+            sec.E_local = sec_mat[rl] if rl >= 0 else None
+            sec.E_subtree = sec_mat[rs] if rs >= 0 else None
+
+        txt_mat = np.load(self.work / "text_embeddings.npy")
+        for tn, r in zip(self.text_nodes.values(), text):
+            tn.embedding = txt_mat[r] if r >= 0 else None
@@ -5,6 +5,8 @@ import json
 import pickle
 from pathlib import Path
 
+import numpy as np
+
 def save_pickle(path, obj):
     with open(path, "wb") as f:
         pickle.dump(obj, f)
@@ -14,13 +16,27 @@ def load_pickle(path):
         return pickle.load(f)
 
 
-def save_index(dir_path: str, sections, text_nodes, graph_adj):
+def save_index(
+    dir_path: str,
+    sections,
+    text_nodes,
+    graph_adj,
+    graph_radj=None,
+    section_chunks=None,
+    embeddings: bool = True,
+):
     """
     Сохраняет:
     - sections (dict)
     - text_nodes (dict)
     - graph_adj (dict)
+    - graph_radj (dict, опционально — обратная смежность)
+    - section_chunks (dict, опционально — section_id → chunk-и по порядку)
     + размерность эмбеддингов (берём из любого узла)
+
+    embeddings=False — эмбеддингов в узлах нет, матрицы .npy пишет
+    вызывающий (write_embedding_matrix, save_embedding_ids, save_embedding_dim):
+    см. StagedBuild с memmap_embeddings=True.
     """
     dir_path = Path(dir_path)
     dir_path.mkdir(parents=True, exist_ok=True)
@@ -30,6 +46,14 @@ def save_index(dir_path: str, sections, text_nodes, graph_adj):
     save_pickle(dir_path / "sections.pkl", sections)
     save_pickle(dir_path / "text_nodes.pkl", text_nodes)
     save_pickle(dir_path / "graph_adj.pkl", graph_adj)
+    if graph_radj is not None:
+        save_pickle(dir_path / "graph_radj.pkl", graph_radj)
+    if section_chunks is not None:
+        save_pickle(dir_path / "section_chunks.pkl", section_chunks)
+
+    if not embeddings:
+        print("[save_index] Done (embeddings in .npy).")
+        return
 
     # определяем размерность эмбеддингов
     emb_dim = None
@@ -41,19 +65,153 @@ def save_index(dir_path: str, sections, text_nodes, graph_adj):
     if emb_dim is None:
         raise RuntimeError("Cannot determine embedding dimension — no embeddings found.")
 
-    with open(dir_path / "dim.json", "w", encoding="utf-8") as f:
-        json.dump({"dim": emb_dim}, f)
+    save_embedding_matrices(dir_path, sections, text_nodes, emb_dim)
+    save_embedding_dim(dir_path, emb_dim, external=False)
 
     print("[save_index] Done.")
 
 
-def load_index(dir_path: str):
+# -------------------------------------------------------------
+# Матрицы эмбеддингов (.npy) — для np.load(mmap_mode="r")
+# -------------------------------------------------------------
+def _stack(vectors, dim: int):
+    mat = np.zeros((len(vectors), dim), dtype=np.float32)
+    mask = np.zeros(len(vectors), dtype=bool)
+    for i, v in enumerate(vectors):
+        if v is not None:
+            mat[i] = v
+            mask[i] = True
+    return mat, mask
+
+
+def save_embedding_matrices(dir_path, sections, text_nodes, dim: int):
+    """
+    Пишет эмбеддинги плотными матрицами рядом с pickle:
+        text_emb.npy / text_emb_mask.npy       — строки в порядке text_nodes
+        sec_local.npy, sec_subtree.npy (+mask) — строки в порядке sections
+        emb_ids.pkl                            — порядок строк
+    Такие матрицы можно отобразить в память и делить между процессами.
+    """
+    dir_path = Path(dir_path)
+
+    mats = {
+        "text_emb": _stack([tn.embedding for tn in text_nodes.values()], dim),
+        "sec_local": _stack([s.E_local for s in sections.values()], dim),
+        "sec_subtree": _stack([s.E_subtree for s in sections.values()], dim),
+    }
+    for name, (mat, mask) in mats.items():
+        np.save(dir_path / f"{name}.npy", mat)
+        np.save(dir_path / f"{name}_mask.npy", mask)
+
+    save_embedding_ids(dir_path, sections, text_nodes)
+
+
+def save_embedding_ids(dir_path, sections, text_nodes):
+    """emb_ids.pkl — порядок строк матриц (id секций и text-узлов)."""
+    save_pickle(Path(dir_path) / "emb_ids.pkl", {
+        "text": list(text_nodes.keys()),
+        "sections": list(sections.keys()),
+    })
+
+
+def save_embedding_dim(dir_path, dim: int, external: bool):
+    """
+    dim.json. external=True — эмбеддинги есть только в .npy (в pickle
+    узлов их нет), load_index() подключает матрицы сам.
+    """
+    with open(Path(dir_path) / "dim.json", "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "external": external}, f)
+
+
+def write_embedding_matrix(dir_path, name: str, src: np.ndarray, rows: np.ndarray, chunk_rows: int = 65536):
+    """
+    <name>.npy[i] = src[rows[i]] (rows[i] < 0 — нулевая строка, mask=False).
+
+    Матрица создаётся на диске (open_memmap) и заполняется кусками по
+    chunk_rows: src тоже может быть memmap, в памяти — один кусок.
+    """
+    dir_path = Path(dir_path)
+    rows = np.asarray(rows, dtype=np.int64)
+    mask = rows >= 0
+    out = np.lib.format.open_memmap(
+        dir_path / f"{name}.npy", mode="w+", dtype=np.float32, shape=(len(rows), src.shape[1])
+    )
+    for start in range(0, len(rows), chunk_rows):
+        r = rows[start:start + chunk_rows]
+        block = np.asarray(src[np.maximum(r, 0)], dtype=np.float32)
+        block[r < 0] = 0.0
+        out[start:start + len(r)] = block
+    out.flush()
+    del out
+    np.save(dir_path / f"{name}_mask.npy", mask)
+
+
+def embeddings_external(dir_path) -> bool:
+    """Эмбеддинги индекса лежат только в .npy (сборка с memmap_embeddings)."""
+    path = Path(dir_path) / "dim.json"
+    if not path.exists():
+        return False
+    with open(path, encoding="utf-8") as f:
+        return bool(json.load(f).get("external", False))
+
+
+def attach_embedding_matrices(dir_path: str, sections, text_nodes, mmap: bool = True):
+    """
+    Подменяет эмбеддинги в sections / text_nodes строками матриц .npy
+    (при mmap=True — read-only отображение файла: страницы общие
+    для всех процессов, которые его отобразили).
+
+    Возвращает матрицу text_emb (строки в порядке text_nodes)
+    или None, если матриц нет / порядок не совпадает.
+    """
+    dir_path = Path(dir_path)
+    if not (dir_path / "emb_ids.pkl").exists():
+        return None
+
+    ids = load_pickle(dir_path / "emb_ids.pkl")
+    if ids["text"] != list(text_nodes.keys()) or ids["sections"] != list(sections.keys()):
+        print("[attach_embedding_matrices] Row order mismatch — keeping pickled embeddings.")
+        return None
+
+    mode = "r" if mmap else None
+
+    def load(name):
+        return (
+            np.load(dir_path / f"{name}.npy", mmap_mode=mode),
+            np.load(dir_path / f"{name}_mask.npy"),
+        )
+
+    text_emb, text_mask = load("text_emb")
+    for i, tn in enumerate(text_nodes.values()):
+        tn.embedding = text_emb[i] if text_mask[i] else None
+
+    local, local_mask = load("sec_local")
+    subtree, subtree_mask = load("sec_subtree")
+    for i, sec in enumerate(sections.values()):
+        sec.E_local = local[i] if local_mask[i] else None
+        sec.E_subtree = subtree[i] if subtree_mask[i] else None
+
+    return text_emb
+
+
+def load_index(dir_path: str, mmap: bool = False):
     """
     Загружает:
     - sections
     - text_nodes
     - graph_adj
     и возвращает их как tuple
+
+    Если mmap=True или эмбеддинги лежат только в .npy (embeddings_external),
+    узлы получают строки read-only mmap этих матриц.
+    """
+    return load_index_with_matrix(dir_path, mmap=mmap)[:3]
+
+
+def load_index_with_matrix(dir_path: str, mmap: bool = False):
+    """
+    Как load_index(), плюс матрица text_emb, подключённая к узлам
+    (None, если матрицы не подключались). Матрицы подключаются один раз.
     """
     dir_path = Path(dir_path)
 
@@ -61,4 +219,51 @@ def load_index(dir_path: str):
     text_nodes = load_pickle(dir_path / "text_nodes.pkl")
     graph_adj = load_pickle(dir_path / "graph_adj.pkl")
 
-    return sections, text_nodes, graph_adj
+    text_emb = None
+    if mmap or embeddings_external(dir_path):
+        text_emb = attach_embedding_matrices(dir_path, sections, text_nodes, mmap=True)
+
+    return sections, text_nodes, graph_adj, text_emb
+
+
+def load_reverse_adj(dir_path: str):
+    """
+    Загружает обратную смежность graph_radj.
+    Для старых индексов (без graph_radj.pkl) возвращает None.
+    """
+    path = Path(dir_path) / "graph_radj.pkl"
+    if not path.exists():
+        return None
+    return load_pickle(path)
+
+
+def save_lexical(dir_path: str, lexical):
+    """
+    Сохраняет BM25-индексы (dict kind → LexicalIndex).
+    Postings сжимаются при pickle (дельты + varint).
+    """
+    dir_path = Path(dir_path)
+    dir_path.mkdir(parents=True, exist_ok=True)
+    save_pickle(dir_path / "lexical.pkl", lexical)
+
+
+def load_lexical(dir_path: str):
+    """
+    Загружает BM25-индексы.
+    Для старых индексов (без lexical.pkl) возвращает None.
+    """
+    path = Path(dir_path) / "lexical.pkl"
+    if not path.exists():
+        return None
+    return load_pickle(path)
+
+
+def load_section_chunks(dir_path: str):
+    """
+    Загружает таблицу section_id → chunk-и в порядке документа.
+    Для старых индексов (без section_chunks.pkl) возвращает None.
+    """
+    path = Path(dir_path) / "section_chunks.pkl"
+    if not path.exists():
+        return None
+    return load_pickle(path)
@@ -4,6 +4,7 @@ from typing import Dict
 import numpy as np
 from ..data.models import TextNode
 from .embeddings import EmbeddingModel
+from .progress import Progress
 
 
 class TextIndex:
@@ -40,13 +41,34 @@ class TextIndex:
         print("[TextIndex] Computing embeddings for text nodes...")
 
         total = len(text_nodes)
-        processed = 0
+        progress = Progress("TextIndex", total)
 
         for nid, tn in text_nodes.items():
             tn.embedding = get_emb(tn.text)
-            processed += 1
-            if processed % 200 == 0:
-                print(f"  processed {processed}/{total}")
+            progress.update()
+        progress.close()
 
         print(f"[TextIndex] DONE. Total text nodes: {total}")
         return text_nodes
+
+    # -------------------------------------------------------------
+    # Число токенов для бюджета контекста
+    # -------------------------------------------------------------
+    def compute_token_counts(
+        self,
+        text_nodes: Dict[str, TextNode],
+        batch_size: int = 256,
+    ) -> Dict[str, TextNode]:
+
+        print("[TextIndex] Counting tokens for text nodes...")
+
+        nodes = list(text_nodes.values())
+        for start in range(0, len(nodes), batch_size):
+            batch = nodes[start:start + batch_size]
+            counts = self.model.count_tokens([tn.text for tn in batch])
+            for tn, n in zip(batch, counts):
+                tn.n_tokens = n
+
+        total = sum(tn.n_tokens for tn in nodes)
+        print(f"[TextIndex] DONE. Total tokens: {total}")
+        return text_nodes
@@ -0,0 +1,52 @@
+# src/index/textutil.py
+#
+# Общая обработка текста для индексов: токенизатор (BM25, HashingBackend)
+# и полиномиальные хеши n-грамм (HashingBackend, MinHasher).
+
+import re
+from typing import List
+
+import numpy as np
+
+
+# -------------------------------------------------------------
+# Токенизация
+# -------------------------------------------------------------
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Нижний регистр, ё → е, слова из букв/цифр."""
+    return _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+
+
+# -------------------------------------------------------------
+# Хеширование
+# -------------------------------------------------------------
+
+# простое число > 2^32: (a*h + b) mod PRIME — универсальное хеширование
+# признаков (HashingBackend) и шинглов (MinHasher)
+PRIME = np.uint64(4294967311)
+
+_BASE = np.uint64(1000003)
+_MASK = np.uint64(0xFFFFFFFF)
+
+
+def char_codes(text: str) -> np.ndarray:
+    """Коды символов text (uint64, по одному на символ)."""
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+
+def ngram_hashes(codes: np.ndarray, n: int, seed: int = 0) -> np.ndarray:
+    """
+    Полиномиальные хеши (основание 1000003, mod 2^32) всех окон
+    по n кодов: элемент i — хеш codes[i:i + n]. seed — затравка хеша.
+    Окон нет (len(codes) < n) — пустой массив.
+    """
+    m = len(codes) - n + 1
+    if m <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    h = np.full(m, seed, dtype=np.uint64)
+    for j in range(n):
+        h = (h * _BASE + codes[j:j + m]) & _MASK
+    return h
@@ -54,6 +54,35 @@ def build_hierarchy(
     return sections, text_nodes
 
 
+# ---------------------------------------------------------
+# Section → chunk-и в порядке документа
+# ---------------------------------------------------------
+def chunk_sort_key(tn: TextNode):
+    """(page_start, order); узлы без атрибутов — в конец."""
+    page = tn.page_start if tn.page_start is not None else float("inf")
+    order = tn.order if tn.order is not None else float("inf")
+    return (page, order)
+
+
+def build_section_chunks(
+    sections: Dict[str, Section],
+    text_nodes: Dict[str, TextNode],
+) -> Dict[str, List[str]]:
+    """
+    Для каждой секции — id её text_nodes в порядке документа.
+    Один проход по text_nodes + сортировка внутри секций.
+    """
+    table: Dict[str, List[TextNode]] = {sid: [] for sid in sections}
+    for tn in text_nodes.values():
+        if tn.section_id in table:
+            table[tn.section_id].append(tn)
+
+    return {
+        sid: [tn.id for tn in sorted(nodes, key=chunk_sort_key)]
+        for sid, nodes in table.items()
+    }
+
+
 # ---------------------------------------------------------
 # Helper: получить корневые секции (level=1)
 # ---------------------------------------------------------
@@ -0,0 +1,156 @@
+# src/rag/cache.py
+
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Кэш результатов run_query() по эмбеддингу запроса.
+
+    Попадание — если среди записей с тем же fingerprint (конфиги,
+    лимиты, версия индекса, параметры запроса) есть запрос
+    с косинусной близостью >= threshold. Перефразированный запрос
+    получает готовый результат без drill / expand / score / сборки секций.
+
+    Записи лежат в маленькой таблице векторов (max_entries × dim,
+    нормированные строки): поиск — один mat-vec.
+    Вытеснение — LRU при переполнении, TTL при поиске.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 1024,
+        ttl_s: Optional[float] = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._vecs: Optional[np.ndarray] = None        # (max_entries, dim), создаётся по первому put
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._used = np.zeros(max_entries, dtype=np.float64)
+        self._fps = np.empty(max_entries, dtype=object)
+        self._results = [None] * max_entries           # (query, result, latency_ms)
+
+        self.stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "puts": 0,
+            "evictions": 0,
+            "expired": 0,
+            "saved_ms": 0.0,
+        }
+
+    # -------------------------------------------------------------
+    # Поиск
+    # -------------------------------------------------------------
+    @staticmethod
+    def _normalize(q_emb) -> Optional[np.ndarray]:
+        q = np.asarray(q_emb, dtype=np.float32).ravel()
+        n = float(np.linalg.norm(q))
+        return q / n if n > 0 else None
+
+    def lookup(self, q_emb, fingerprint: str) -> Optional[Tuple[str, dict, float, float]]:
+        """
+        Возвращает (исходный запрос, результат, близость, latency_ms исходного
+        расчёта) или None. Результат общий для всех попаданий — не изменять.
+        """
+        t0 = time.perf_counter()
+        q = self._normalize(q_emb)
+
+        with self._lock:
+            self.stats["lookups"] += 1
+            if q is None or self._vecs is None or q.shape[0] != self._vecs.shape[1]:
+                self.stats["misses"] += 1
+                return None
+
+            now = self.clock()
+            if self.ttl_s is not None:
+                expired = self._valid & (now - self._created > self.ttl_s)
+                if expired.any():
+                    self._drop(np.flatnonzero(expired))
+                    self.stats["expired"] += int(expired.sum())
+
+            mask = self._valid & (self._fps == fingerprint)
+            if not mask.any():
+                self.stats["misses"] += 1
+                return None
+
+            sims = self._vecs @ q
+            sims[~mask] = -np.inf
+            slot = int(np.argmax(sims))
+            sim = float(sims[slot])
+            if sim < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            self._used[slot] = now
+            query, result, latency_ms = self._results[slot]
+            self.stats["hits"] += 1
+            self.stats["saved_ms"] += max(
+                0.0, latency_ms - (time.perf_counter() - t0) * 1000
+            )
+            return query, result, sim, latency_ms
+
+    # -------------------------------------------------------------
+    # Запись
+    # -------------------------------------------------------------
+    def put(self, q_emb, fingerprint: str, query: str, result: dict, latency_ms: float):
+        q = self._normalize(q_emb)
+        if q is None:
+            return
+
+        with self._lock:
+            if self._vecs is None or q.shape[0] != self._vecs.shape[1]:
+                # другая размерность (сменили модель) — начинаем таблицу заново
+                self._vecs = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+                self._drop(np.flatnonzero(self._valid))
+
+            free = np.flatnonzero(~self._valid)
+            if free.size:
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._used))   # LRU
+                self.stats["evictions"] += 1
+
+            now = self.clock()
+            self._vecs[slot] = q
+            self._valid[slot] = True
+            self._created[slot] = now
+            self._used[slot] = now
+            self._fps[slot] = fingerprint
+            self._results[slot] = (query, result, latency_ms)
+            self.stats["puts"] += 1
+
+    def _drop(self, slots):
+        for slot in slots:
+            self._valid[slot] = False
+            self._fps[slot] = None
+            self._results[slot] = None
+
+    def clear(self):
+        with self._lock:
+            self._drop(np.flatnonzero(self._valid))
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+
+    # -------------------------------------------------------------
+    # Метрики
+    # -------------------------------------------------------------
+    def metrics(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+        out["entries"] = len(self)
+        out["hit_rate"] = out["hits"] / out["lookups"] if out["lookups"] else 0.0
+        return out
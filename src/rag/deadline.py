@@ -0,0 +1,135 @@
+# src/rag/deadline.py
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+# Деградации run_query(deadline_ms=...), в порядке возможного применения:
+#   flat_fallback         — время вышло ещё до drill, а плоский скоринг всех
+#                           chunk-ов (один mat-vec, O(N·dim)) по оценке дешевле
+#                           графового пути: без drill/expand
+#   drill_shrunk          — top_r и DrillConfig.top_k ужаты до минимума
+#   expand_cut            — урезаны max_depth / max_nodes обхода графа
+#   rerank_skipped        — cross-encoder не вызывался
+#   assembly_skipped      — секции без текста (поля как у ids_only)
+#   graph_context_skipped — graph_context не собирался
+DEGRADATIONS = (
+    "flat_fallback",
+    "drill_shrunk",
+    "expand_cut",
+    "rerank_skipped",
+    "assembly_skipped",
+    "graph_context_skipped",
+)
+
+
+class DeadlineConfig:
+    """
+    Политика деградации при нехватке времени.
+
+    min_top_r       — top_r при drill_shrunk
+    min_drill_top_k — DrillConfig.top_k при drill_shrunk
+    min_graph_nodes — нижняя граница max_nodes при expand_cut
+    ewma            — вес нового замера в оценке времени стадии
+
+    Решение перед стадией: хватает ли оставшегося времени на оценку
+    (EWMA по прошлым запросам с дедлайном) этой стадии и следующих.
+    Пока замеров нет, стадии идут целиком, а деградирует только то,
+    что начинается после истечения дедлайна.
+    """
+
+    def __init__(
+        self,
+        min_top_r: int = 1,
+        min_drill_top_k: int = 1,
+        min_graph_nodes: int = 20,
+        ewma: float = 0.2,
+    ):
+        self.min_top_r = min_top_r
+        self.min_drill_top_k = min_drill_top_k
+        self.min_graph_nodes = min_graph_nodes
+        self.ewma = ewma
+
+
+class StageCosts:
+    """
+    Оценки времени стадий, мс (EWMA). Замеры — только полных
+    (не деградировавших) стадий, иначе оценка поползёт вниз.
+    assemble — на одну секцию, score_row — на одного кандидата,
+    flat — весь плоский скоринг.
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._ms: Dict[str, float] = {}
+
+    def get(self, stage: str, default: float = 0.0) -> float:
+        return self._ms.get(stage, default)
+
+    def observe(self, stage: str, ms: float):
+        with self._lock:
+            cur = self._ms.get(stage)
+            self._ms[stage] = ms if cur is None else cur + self.alpha * (ms - cur)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._ms)
+
+
+class Deadline:
+    """
+    Дедлайн одного запроса: deadline_ms от t0 (time.perf_counter()).
+    degraded — применённые деградации в порядке применения.
+    """
+
+    __slots__ = ("deadline_ms", "t0", "degraded")
+
+    def __init__(self, deadline_ms: float, t0: Optional[float] = None):
+        self.deadline_ms = deadline_ms
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.degraded: List[str] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000
+
+    def remaining_ms(self) -> float:
+        return self.deadline_ms - self.elapsed_ms()
+
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0
+
+    def degrade(self, name: str):
+        if name not in self.degraded:
+            self.degraded.append(name)
+
+    def report(self) -> dict:
+        elapsed = self.elapsed_ms()
+        return {
+            "deadline_ms": self.deadline_ms,
+            "elapsed_ms": elapsed,
+            "met": elapsed <= self.deadline_ms,
+            "degraded": list(self.degraded),
+        }
+
+
+class DeadlineStats:
+    """Сколько запросов с дедлайном, сколько его пропустили, сколько раз какая деградация."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {"queries": 0, "missed": 0, "degraded_queries": 0}
+        self.degraded = {name: 0 for name in DEGRADATIONS}
+
+    def record(self, report: dict):
+        with self._lock:
+            self.stats["queries"] += 1
+            self.stats["missed"] += int(not report["met"])
+            self.stats["degraded_queries"] += int(bool(report["degraded"]))
+            for name in report["degraded"]:
+                self.degraded[name] = self.degraded.get(name, 0) + 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self.stats, degraded=dict(self.degraded))
@@ -4,6 +4,7 @@ from typing import Dict, List, Optional, Set
 import numpy as np
 
 from ..data.models import Section
+from ..index.lexical_index import LexicalIndex
 
 
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
@@ -25,6 +26,8 @@ class DrillConfig:
     tau_child  — порог релевантности дочерних subtree
     margin     — насколько local может быть хуже лучшего child
     top_k      — сколько лучших детей спускать
+    w_bm25     — вес BM25 (нормированного на максимум по секциям),
+                 добавляемого к косинусной близости local/subtree
     """
 
     def __init__(
@@ -33,21 +36,62 @@ class DrillConfig:
         tau_child: float = 0.45,
         margin: float = 0.05,
         top_k: int = 2,
+        w_bm25: float = 0.0,
     ):
         self.tau_local = tau_local
         self.tau_child = tau_child
         self.margin = margin
         self.top_k = top_k
+        self.w_bm25 = w_bm25
 
 
 class DrillSelector:
     """
     Основной класс, реализующий алгоритм выбора seed-секций.
+
+    lexical — словарь BM25-индексов ("section_local", "section_subtree"),
+    см. build_lexical_indexes(); нужен только при cfg.w_bm25 > 0.
     """
 
-    def __init__(self, sections: Dict[str, Section], config: DrillConfig):
+    def __init__(
+        self,
+        sections: Dict[str, Section],
+        config: DrillConfig,
+        lexical: Optional[Dict[str, LexicalIndex]] = None,
+    ):
         self.sections = sections
         self.cfg = config
+        self.lexical = lexical
+
+        # BM25-бонусы текущего запроса: section_id → w_bm25 * bm25_norm
+        self._boost_local: Dict[str, float] = {}
+        self._boost_subtree: Dict[str, float] = {}
+
+    # -------------------------------------------------------------
+    # Лексические бонусы запроса
+    # -------------------------------------------------------------
+    def _lexical_boost(self, kind: str, query_text: str) -> Dict[str, float]:
+        idx = self.lexical.get(kind) if self.lexical else None
+        if idx is None:
+            return {}
+        term_ids = idx.query_terms(query_text)
+        if not term_ids:
+            return {}
+        scores = idx.score_dense(term_ids)
+        mx = float(scores.max())
+        if mx <= 0:
+            return {}
+        w = self.cfg.w_bm25 / mx
+        return {
+            idx.doc_ids[i]: w * float(scores[i])
+            for i in np.flatnonzero(scores)
+        }
+
+    def sim_local(self, query_emb: np.ndarray, sec: Section) -> float:
+        return cosine_sim(query_emb, sec.E_local) + self._boost_local.get(sec.id, 0.0)
+
+    def sim_subtree(self, query_emb: np.ndarray, sec: Section) -> float:
+        return cosine_sim(query_emb, sec.E_subtree) + self._boost_subtree.get(sec.id, 0.0)
 
     # -------------------------------------------------------------
     # STEP 1 — Score only by subtree similarity
@@ -56,7 +100,7 @@ class DrillSelector:
         """Сортирует секции уровня 1 по sim(query, subtree)."""
         lvl1 = [s for s in self.sections.values() if s.level == 1]
         scored = [
-            (s, cosine_sim(query_emb, s.E_subtree))
+            (s, self.sim_subtree(query_emb, s))
             for s in lvl1
         ]
         scored.sort(key=lambda x: x[1], reverse=True)
@@ -74,8 +118,8 @@ class DrillSelector:
         cfg = self.cfg
         children = [self.sections[cid] for cid in sec.children_ids]
 
-        score_local = cosine_sim(query_emb, sec.E_local)
-        child_scores = [(c, cosine_sim(query_emb, c.E_subtree)) for c in children]
+        score_local = self.sim_local(query_emb, sec)
+        child_scores = [(c, self.sim_subtree(query_emb, c)) for c in children]
 
         score_best_child = max([sc for _, sc in child_scores], default=-1.0)
 
@@ -115,15 +159,28 @@ class DrillSelector:
     # -------------------------------------------------------------
     # TOP-LEVEL ENTRY
     # -------------------------------------------------------------
-    def select_seeds(self, query_emb: np.ndarray, top_r: int = 3) -> List[str]:
+    def select_seeds(
+        self,
+        query_emb: np.ndarray,
+        top_r: int = 3,
+        query_text: Optional[str] = None,
+    ) -> List[str]:
         """
         Полный алгоритм:
         1) ранжируем Level-1 секции
         2) берём top-R веток
         3) запускаем drill()
         4) возвращаем список seed_ids
+
+        С query_text и cfg.w_bm25 > 0 к близости секций добавляется BM25.
         """
 
+        self._boost_local = {}
+        self._boost_subtree = {}
+        if self.cfg.w_bm25 and query_text:
+            self._boost_local = self._lexical_boost("section_local", query_text)
+            self._boost_subtree = self._lexical_boost("section_subtree", query_text)
+
         lvl1_ranked = self.rank_l1_sections(query_emb)
         roots = lvl1_ranked[:top_r]
 
@@ -1,9 +1,17 @@
 # src/rag/expand.py
 
-from typing import Dict, Set, List
+from typing import Callable, Dict, Set, List, Optional, Iterator, Tuple
 import collections
+import copy
+import heapq
+import math
+import threading
+
+import numpy as np
 
 from ..data.models import Edge
+from ..data.loaders import build_reverse_adj
+from ..index.knn import SIMILAR_TO
 
 
 ALLOWED_RELATIONS = {
@@ -15,24 +23,255 @@ ALLOWED_RELATIONS = {
 }
 
 
+class DirectionPolicy:
+    """
+    Политика обхода для одного типа связи.
+
+    down — до какой глубины можно идти по ребру вперёд (from → to);
+           None → до max_depth экспандера
+    up   — до какой глубины можно идти по ребру назад (to → from);
+           0 → обратный ход запрещён
+    min_weight — рёбра с весом ниже не проходятся (SIMILAR_TO:
+           косинус соседей, см. index/knn.py); None — без отсечки
+
+    Переход из узла на глубине depth разрешён, если depth < лимита.
+    Например, up=1 — подняться можно только из самих seed-узлов.
+    """
+
+    def __init__(self, down: Optional[int] = None, up: int = 0, min_weight: Optional[float] = None):
+        self.down = down
+        self.up = up
+        self.min_weight = min_weight
+
+    def passes(self, e: Edge) -> bool:
+        return self.min_weight is None or (e.weight is not None and e.weight >= self.min_weight)
+
+
+def direction_policies(
+    down: Optional[int] = None,
+    up: Optional[Dict[str, int]] = None,
+    relations=ALLOWED_RELATIONS,
+    similar: Optional[DirectionPolicy] = None,
+) -> Dict[str, DirectionPolicy]:
+    """
+    Собирает политики для набора связей.
+
+    "up 1 via HAS_SUBSECTION, down 3":
+        direction_policies(down=3, up={"HAS_SUBSECTION": 1})
+
+    similar — политика для SIMILAR_TO (по умолчанию эти рёбра не проходятся):
+        direction_policies(down=3, similar=DirectionPolicy(down=1, min_weight=0.7))
+    """
+    up = up or {}
+    policies = {
+        rel: DirectionPolicy(down=down, up=up.get(rel, 0))
+        for rel in relations
+    }
+    if similar is not None:
+        policies[SIMILAR_TO] = similar
+    return policies
+
+
+# estimate(node_ids, dist) → (оценки score, маска «текстовый узел»);
+# nan — оценки нет (узел унаследует оценку родителя), см. NodeScorer.estimate()
+NodeEstimator = Callable[[List[str], int], Tuple[np.ndarray, np.ndarray]]
+
+
 class GraphExpander:
     """
     Ограниченный BFS по онтологическому графу
     от множества seed-узлов.
+
+    По умолчанию идём только по исходящим рёбрам (как раньше).
+    С policies и graph_radj можно подниматься по входящим рёбрам:
+    к родительской секции, соседям, chunk-ам со ссылкой на seed.
+
+    cache_size > 0 включает LRU-кэш окрестностей seed-узлов:
+    окрестность каждой секции считается один раз до max_depth,
+    а expand() сводится к слиянию кэшированных окрестностей.
+
+    expand_best_first() — обход по очереди с приоритетом (оценка
+    score узла для запроса) с ранней остановкой, см. его docstring.
     """
 
     def __init__(self,
                  graph_adj: Dict[str, List[Edge]],
                  max_depth: int = 4,
-                 max_nodes: int = 500):
+                 max_nodes: int = 500,
+                 graph_radj: Optional[Dict[str, List[Edge]]] = None,
+                 policies: Optional[Dict[str, DirectionPolicy]] = None,
+                 cache_size: int = 0):
         self.graph_adj = graph_adj
         self.max_depth = max_depth
         self.max_nodes = max_nodes
 
+        # (seed_id, max_depth) → (nodes, edges), см. neighbourhood()
+        self.cache_size = cache_size
+        self._nbhd_cache: "collections.OrderedDict" = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        if policies is None:
+            policies = direction_policies()
+        self.policies = policies
+
+        # Обратная смежность нужна только при up > 0.
+        # Строим один раз здесь, а не на каждый запрос.
+        needs_up = any(p.up > 0 for p in policies.values())
+        if needs_up and graph_radj is None:
+            graph_radj = build_reverse_adj(graph_adj)
+        self.graph_radj = graph_radj if needs_up else None
+
+    # -------------------------------------------------------------
+    # Соседи узла с учётом политик направления
+    # -------------------------------------------------------------
+    def neighbours(self, node: str, depth: int) -> Iterator[Tuple[Edge, str]]:
+        """
+        Отдаёт (edge, target) для всех разрешённых переходов
+        из node на глубине depth: сначала исходящие, потом входящие.
+        """
+
+        for e in self.graph_adj.get(node, []):
+            pol = self.policies.get(e.relation_type)
+            if pol is None:
+                continue
+            down = self.max_depth if pol.down is None else pol.down
+            if depth >= down or not pol.passes(e):
+                continue
+            yield e, e.to_id
+
+        if self.graph_radj is None:
+            return
+
+        for e in self.graph_radj.get(node, []):
+            pol = self.policies.get(e.relation_type)
+            if pol is None or depth >= pol.up or not pol.passes(e):
+                continue
+            yield e, e.from_id
+
     # -------------------------------------------------------------
     # Основной метод
     # -------------------------------------------------------------
     def expand(self, seed_ids: List[str]):
+        """
+        Расширение от seed_ids: через кэш окрестностей,
+        если он включён, иначе обычный BFS.
+
+        Возвращает:
+            all_nodes: Set[node_id]
+            all_edges: List[Edge]
+            dist_to_seed: Dict[node_id, int]
+        """
+        if self.cache_size > 0:
+            return self.expand_cached(seed_ids)
+        return self.expand_bfs(seed_ids)
+
+    def limited(self, max_depth: int, max_nodes: int) -> "GraphExpander":
+        """
+        Копия с другими лимитами на один запрос (деградация по дедлайну):
+        граф, политики и кэш окрестностей общие, сам экспандер не меняется.
+        """
+        other = copy.copy(self)
+        other.max_depth = max_depth
+        other.max_nodes = max_nodes
+        return other
+
+    # -------------------------------------------------------------
+    # Кэш окрестностей
+    # -------------------------------------------------------------
+    def clear_cache(self):
+        """Сбрасывает кэш окрестностей (например, после перезагрузки индекса)."""
+        with self._cache_lock:
+            self._nbhd_cache.clear()
+
+    def warm(self, seed_ids: List[str]):
+        """Заранее считает окрестности (обычно — для всех секций)."""
+        for sid in seed_ids:
+            self.neighbourhood(sid)
+
+    def neighbourhood(self, seed_id: str):
+        """
+        Окрестность одного seed-узла до max_depth, без ограничения max_nodes.
+
+        Возвращает:
+            nodes: List[(node_id, dist)] — в порядке обнаружения BFS
+            edges: List[Edge] — все пройденные рёбра
+        """
+        key = (seed_id, self.max_depth)
+        with self._cache_lock:
+            cached = self._nbhd_cache.get(key)
+            if cached is not None:
+                self._nbhd_cache.move_to_end(key)
+                return cached
+
+        nodes = [(seed_id, 0)]
+        edges = []
+        seen = {seed_id}
+        q = collections.deque([(seed_id, 0)])
+
+        while q:
+            node, depth = q.popleft()
+            if depth >= self.max_depth:
+                continue
+
+            for e, tgt in self.neighbours(node, depth):
+                edges.append(e)
+                if tgt not in seen:
+                    seen.add(tgt)
+                    nodes.append((tgt, depth + 1))
+                    q.append((tgt, depth + 1))
+
+        result = (nodes, edges)
+        with self._cache_lock:
+            self._nbhd_cache[key] = result
+            while len(self._nbhd_cache) > self.cache_size:
+                self._nbhd_cache.popitem(last=False)
+        return result
+
+    def expand_cached(self, seed_ids: List[str]):
+        """
+        Слияние кэшированных окрестностей по минимальному расстоянию.
+
+        Расстояния и состав слоёв совпадают с BFS от всех seed-ов сразу.
+        При обрезке по max_nodes узлы берутся послойно (как в BFS),
+        внутри слоя — по порядку seed-ов и порядку обнаружения.
+        """
+
+        # node → (dist, номер seed-а, позиция в его окрестности)
+        best: Dict[str, Tuple[int, int, int]] = {}
+        per_seed_edges = []
+
+        for si, sid in enumerate(seed_ids):
+            nodes, edges = self.neighbourhood(sid)
+            per_seed_edges.append(edges)
+            for pos, (nid, d) in enumerate(nodes):
+                key = (d, si, pos)
+                cur = best.get(nid)
+                if cur is None or key < cur:
+                    best[nid] = key
+
+        # seed-ы попадают в результат всегда, как и в BFS
+        limit = max(self.max_nodes, len(set(seed_ids)))
+        ordered = sorted(best, key=best.__getitem__)[:limit]
+
+        all_nodes: Set[str] = set(ordered)
+        dist_to_seed: Dict[str, int] = {nid: best[nid][0] for nid in ordered}
+
+        all_edges: List[Edge] = []
+        seen_edges: Set[int] = set()
+        for edges in per_seed_edges:
+            for e in edges:
+                if id(e) in seen_edges:
+                    continue
+                if e.from_id in all_nodes and e.to_id in all_nodes:
+                    seen_edges.add(id(e))
+                    all_edges.append(e)
+
+        return all_nodes, all_edges, dist_to_seed
+
+    # -------------------------------------------------------------
+    # Обычный BFS
+    # -------------------------------------------------------------
+    def expand_bfs(self, seed_ids: List[str]):
         """
         BFS от seed_ids.
 
@@ -61,12 +300,7 @@ class GraphExpander:
             if depth >= self.max_depth:
                 continue
 
-            for e in self.graph_adj.get(node, []):
-                if e.relation_type not in ALLOWED_RELATIONS:
-                    continue
-
-                tgt = e.to_id
-
+            for e, tgt in self.neighbours(node, depth):
                 # Добавляем вершину и ребро
                 all_edges.append(e)
 
@@ -83,3 +317,109 @@ class GraphExpander:
                     q.append((tgt, depth + 1))
 
         return all_nodes, all_edges, dist_to_seed
+
+    # -------------------------------------------------------------
+    # Best-first с ранней остановкой
+    # -------------------------------------------------------------
+    def expand_best_first(
+        self,
+        seed_ids: List[str],
+        estimate: NodeEstimator,
+        top_k: int,
+        w_dist: float = 0.0,
+        slack: float = 0.0,
+    ):
+        """
+        Обход по убыванию оценки score вместо слоёв BFS.
+
+        estimate(node_ids, dist) оценивает score узлов на расстоянии dist
+        (для текстовых узлов — тот же score, что у NodeScorer без BM25;
+        для секций — по E_subtree). Узел без оценки (nan) наследует оценку
+        родителя минус w_dist за лишний шаг.
+
+        Раскрывается узел с лучшей оценкой. Обход останавливается, когда
+        найдено top_k текстовых узлов и лучшая оценка на фронте + slack
+        ниже k-го лучшего score. Оценки — эвристика, не верхняя граница
+        (см. NodeScorer.estimate()): при малом slack часть узлов top-K
+        BFS может быть не найдена. slack >= NodeScorer.exact_slack() делает
+        остановку допустимой — тот же top-K, что у BFS, но и выигрыш по
+        числу узлов тогда невелик. Лимиты max_depth / max_nodes действуют
+        как в BFS.
+
+        Если к узлу позже найден более короткий путь, его расстояние
+        уточняется и он раскрывается повторно.
+
+        Возвращает то же, что expand():
+            all_nodes: Set[node_id]
+            all_edges: List[Edge]
+            dist_to_seed: Dict[node_id, int]
+        """
+
+        all_nodes: Set[str] = set()
+        all_edges: List[Edge] = []
+        dist_to_seed: Dict[str, int] = {}
+
+        heap: List[Tuple[float, int, str, int]] = []   # (-оценка, порядок, узел, глубина)
+        top: List[float] = []                          # min-heap из top_k оценок текстовых узлов
+        order = 0
+
+        def push(node_ids: List[str], depth: int, inherited: float):
+            nonlocal order
+            scores, is_text = estimate(node_ids, depth)
+            for nid, sc, txt in zip(node_ids, scores, is_text):
+                sc = float(sc)
+                if math.isnan(sc):
+                    sc = inherited - w_dist
+                elif txt:
+                    if len(top) < top_k:
+                        heapq.heappush(top, sc)
+                    elif sc > top[0]:
+                        heapq.heapreplace(top, sc)
+                heapq.heappush(heap, (-sc, order, nid, depth))
+                order += 1
+
+        seeds = list(dict.fromkeys(seed_ids))
+        for sid in seeds:
+            all_nodes.add(sid)
+            dist_to_seed[sid] = 0
+        push(seeds, 0, math.inf)
+
+        while heap and len(all_nodes) < self.max_nodes:
+            neg, _, node, depth = heapq.heappop(heap)
+            if depth > dist_to_seed[node]:
+                continue  # устаревшая запись: узел уже раскрыт с меньшей глубины
+
+            if len(top) >= top_k and -neg + slack < top[0]:
+                break
+
+            if depth >= self.max_depth:
+                continue
+
+            new = []
+            closer = []
+            for e, tgt in self.neighbours(node, depth):
+                all_edges.append(e)
+
+                if tgt not in all_nodes:
+                    all_nodes.add(tgt)
+                    dist_to_seed[tgt] = depth + 1
+                    new.append(tgt)
+                    if len(all_nodes) >= self.max_nodes:
+                        break
+                elif depth + 1 < dist_to_seed[tgt]:
+                    dist_to_seed[tgt] = depth + 1
+                    closer.append(tgt)
+
+            if new:
+                push(new, depth + 1, -neg)
+            if closer:
+                # повторно в очередь с лучшей оценкой; в top уже учтены
+                scores, _ = estimate(closer, depth + 1)
+                for nid, sc in zip(closer, scores):
+                    sc = float(sc)
+                    if math.isnan(sc):
+                        sc = -neg - w_dist
+                    heapq.heappush(heap, (-sc, order, nid, depth + 1))
+                    order += 1
+
+        return all_nodes, all_edges, dist_to_seed
@@ -0,0 +1,159 @@
+# src/rag/instrument.py
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+# hook(stage, trace): stage — имя стадии, trace — QueryTrace текущего запроса
+StageHook = Callable[[str, "QueryTrace"], None]
+
+
+class QueryTrace:
+    """
+    Тайминги и счётчики одного запроса.
+
+        timings  — stage → мс
+        counters — seeds, expanded_nodes, expanded_edges, candidates_scored,
+                   ranked_nodes, collapsed_duplicates, sections,
+                   text_bytes, degraded_<деградация> (run_query с
+                   deadline_ms, см. deadline.py), ...
+    """
+
+    __slots__ = ("inst", "query", "timings", "counters", "_stage", "_t")
+
+    def __init__(self, inst: "Instrumentation", query: str):
+        self.inst = inst
+        self.query = query
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self._stage: Optional[str] = None
+        self._t = 0.0
+
+    def begin(self, stage: str):
+        for hook in self.inst.before_hooks:
+            hook(stage, self)
+        self._stage = stage
+        self._t = time.perf_counter()
+
+    def end(self, **counters):
+        stage = self._stage
+        self.add_time(stage, (time.perf_counter() - self._t) * 1000)
+        self.counters.update(counters)
+        self._stage = None
+        for hook in self.inst.after_hooks:
+            hook(stage, self)
+
+    def add_time(self, stage: str, ms: float):
+        self.timings[stage] = self.timings.get(stage, 0.0) + ms
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+
+class Instrumentation:
+    """
+    Инструментирование OntologyRAGPipeline (выключено по умолчанию).
+
+    timings       — возвращать в результате "timings" (мс по стадиям)
+                    и "counters"; суммы копятся в summary()
+    before/after  — хуки стадий: add_hook(before=..., after=...)
+    profile_every — cProfile для каждого N-го запроса (0 — никогда);
+                    статистика суммируется, см. profile_report()
+
+    Стадии: embed, cache, drill, expand, score, rerank, text_nodes,
+    pack, assemble, graph_context.
+
+    Пока ничего не включено, пайплайн не создаёт QueryTrace вовсе:
+    цена выключенного инструментирования — одна проверка на стадию.
+    """
+
+    def __init__(self, timings: bool = False, profile_every: int = 0):
+        self.timings = timings
+        self.profile_every = profile_every
+        self.before_hooks: List[StageHook] = []
+        self.after_hooks: List[StageHook] = []
+
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._seen = 0
+        self._totals: Dict[str, float] = {}
+        self._counter_totals: Dict[str, int] = {}
+        self._profiled = 0
+        self._stats: Optional[pstats.Stats] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.timings or self.before_hooks or self.after_hooks or self.profile_every)
+
+    def add_hook(self, before: Optional[StageHook] = None, after: Optional[StageHook] = None):
+        if before is not None:
+            self.before_hooks.append(before)
+        if after is not None:
+            self.after_hooks.append(after)
+
+    # -------------------------------------------------------------
+    # Жизненный цикл запроса
+    # -------------------------------------------------------------
+    def start(self, query: str) -> QueryTrace:
+        return QueryTrace(self, query)
+
+    def finish(self, trace: QueryTrace):
+        with self._lock:
+            self._queries += 1
+            for k, v in trace.timings.items():
+                self._totals[k] = self._totals.get(k, 0.0) + v
+            for k, v in trace.counters.items():
+                self._counter_totals[k] = self._counter_totals.get(k, 0) + v
+
+    def summary(self) -> dict:
+        """Средние тайминги и счётчики по всем запросам с трассировкой."""
+        with self._lock:
+            n = self._queries
+            return {
+                "queries": n,
+                "mean_ms": {k: v / n for k, v in self._totals.items()} if n else {},
+                "mean_counters": {k: v / n for k, v in self._counter_totals.items()} if n else {},
+                "profiled": self._profiled,
+            }
+
+    # -------------------------------------------------------------
+    # Сэмплирующий профайлер
+    # -------------------------------------------------------------
+    def maybe_profiler(self) -> Optional[cProfile.Profile]:
+        """Профайлер для каждого profile_every-го запроса, иначе None."""
+        if not self.profile_every:
+            return None
+        with self._lock:
+            self._seen += 1
+            if self._seen % self.profile_every:
+                return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # уже работает другой профайлер (например, в соседнем потоке на 3.12+)
+            return None
+        return prof
+
+    def collect_profile(self, prof: cProfile.Profile):
+        prof.disable()
+        with self._lock:
+            self._profiled += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(prof)
+            else:
+                self._stats.add(prof)
+
+    def profile_report(self, top: int = 30, sort: str = "cumulative") -> str:
+        """Суммарный профиль сэмплированных запросов (как pstats.print_stats)."""
+        with self._lock:
+            if self._stats is None:
+                return ""
+            buf = io.StringIO()
+            self._stats.stream = buf
+            self._stats.sort_stats(sort).print_stats(top)
+            return buf.getvalue()
@@ -1,13 +1,46 @@
 # src/rag/pipeline.py
 
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+import copy
+import functools
+import threading
+import time
 import numpy as np
 
 from ..data.models import TextNode, Section, Edge
+from ..data.loaders import build_reverse_adj
+from ..ontology.hierarchy import build_section_chunks
 from ..index.embeddings import EmbeddingModel
+from ..index.lexical_index import LexicalIndex, analyze
+from ..index.store import (
+    load_index_with_matrix,
+    load_reverse_adj,
+    load_lexical,
+    load_section_chunks,
+)
 from .drill import DrillSelector, DrillConfig
-from .expand import GraphExpander
+from .expand import GraphExpander, DirectionPolicy
 from .score import NodeScorer, ScoreConfig
+from .rerank import CrossEncoderReranker
+from .cache import SemanticCache
+from .instrument import Instrumentation, QueryTrace
+from .deadline import Deadline, DeadlineConfig, DeadlineStats, StageCosts
+
+
+# Проекции результата run_query():
+#   full          — всё, как раньше: секции с текстом, text_nodes, graph_context
+#   sections_only — только section_candidates (+ context_budget): то, что идёт в LLM
+#   ids_only      — без текстов: id и score секций и узлов
+#   debug         — full + расстояния до seed-ов и сводка по стадиям
+PROJECTIONS = ("full", "sections_only", "ids_only", "debug")
+
+# "bfs" — слоями (через кэш окрестностей), "best_first" — по оценке score
+# с ранней остановкой, см. GraphExpander.expand_best_first()
+EXPAND_MODES = ("bfs", "best_first")
+
+# поля плана секции, которые отдаются в ids_only
+PLAN_ID_FIELDS = ("section_id", "score", "rerank_score", "node_ids", "packing", "n_tokens")
 
 
 class OntologyRAGPipeline:
@@ -27,38 +60,161 @@ class OntologyRAGPipeline:
         max_graph_depth: int = 3,
         max_graph_nodes: int = 200,
         top_k_text: int = 20,
+        top_r: int = 3,
+        graph_radj: Optional[Dict[str, List[Edge]]] = None,
+        expand_policies: Optional[Dict[str, DirectionPolicy]] = None,
+        expand_cache_size: int = 512,
+        expand_mode: str = "bfs",
+        expand_slack: float = 0.0,
+        lexical: Optional[Dict[str, LexicalIndex]] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+        section_chunks: Optional[Dict[str, List[str]]] = None,
+        section_text_cache_size: int = 256,
+        text_emb_matrix: Optional[np.ndarray] = None,
+        result_cache: Optional[SemanticCache] = None,
+        instrument: Optional[Instrumentation] = None,
+        deadline_cfg: DeadlineConfig = DeadlineConfig(),
     ):
-        self.sections = sections
-        self.text_nodes = text_nodes
-        self.graph_adj = graph_adj
         self.model = embedding_model
+        self.reranker = reranker
+        self.result_cache = result_cache
+        self.instrument = instrument
+        self.index_version = 0
+        self.section_text_cache_size = section_text_cache_size
 
         self.drill_cfg = drill_cfg
         self.score_cfg = score_cfg
         self.max_graph_depth = max_graph_depth
         self.max_graph_nodes = max_graph_nodes
         self.top_k_text = top_k_text
+        self.top_r = top_r
+        self.expand_policies = expand_policies
+        self.expand_cache_size = expand_cache_size
+        self.expand_mode = expand_mode
+        self.expand_slack = expand_slack
+
+        # run_query(deadline_ms=...): политика, оценки времени стадий, счётчики
+        self.deadline_cfg = deadline_cfg
+        self.stage_costs = StageCosts(deadline_cfg.ewma)
+        self.deadline_stats = DeadlineStats()
+
+        self.reload_index(
+            sections, text_nodes, graph_adj, graph_radj, lexical, section_chunks,
+            text_emb_matrix,
+        )
+
+    @classmethod
+    def from_index(
+        cls,
+        dir_path: str,
+        embedding_model: Optional[EmbeddingModel],
+        mmap: bool = False,
+        **kwargs,
+    ):
+        """
+        Пайплайн поверх оффлайн-индекса из dir_path
+        (опциональные артефакты старых индексов достраиваются при загрузке).
+
+        mmap=True — эмбеддинги берутся из .npy через np.load(mmap_mode="r"):
+        после fork() воркеры читают одни и те же страницы page cache.
+        embedding_model можно передать None и выставить pipeline.model позже
+        (в pre-fork режиме модель грузится в каждом воркере).
+        """
+        # индекс memmap_embeddings: эмбеддинги только в .npy, матрицу отдаём скореру как есть
+        sections, text_nodes, graph_adj, text_emb = load_index_with_matrix(dir_path, mmap=mmap)
+        return cls(
+            sections=sections,
+            text_nodes=text_nodes,
+            graph_adj=graph_adj,
+            embedding_model=embedding_model,
+            graph_radj=load_reverse_adj(dir_path),
+            lexical=load_lexical(dir_path),
+            section_chunks=load_section_chunks(dir_path),
+            text_emb_matrix=text_emb,
+            **kwargs,
+        )
 
     # =============================================================
-    # FULL SECTION MODE (LLM-ready)
+    # INDEX (RE)LOAD
     # =============================================================
-    def build_full_sections(self, ranked_nodes: List[dict]) -> List[dict]:
+    def reload_index(
+        self,
+        sections: Dict[str, Section],
+        text_nodes: Dict[str, TextNode],
+        graph_adj: Dict[str, List[Edge]],
+        graph_radj: Optional[Dict[str, List[Edge]]] = None,
+        lexical: Optional[Dict[str, LexicalIndex]] = None,
+        section_chunks: Optional[Dict[str, List[str]]] = None,
+        text_emb_matrix: Optional[np.ndarray] = None,
+    ):
         """
-        Превращает ranked text-nodes в список секций-кандидатов для LLM.
+        Подменяет индекс и сбрасывает всё, что от него зависит
+        (кэш окрестностей GraphExpander, кэш текстов секций, кэш результатов,
+        кэш пар reranker-а).
+        """
+        self.index_version += 1
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        if self.reranker is not None:
+            self.reranker.clear_cache()
 
-        - Группирует text_nodes по section_id.
-        - Для каждой секции собирает полный текст (как раньше).
-        - Считает агрегированный score (max по узлам секции).
-        - Сохраняет node_ids, которые подсветили секцию.
+        self.sections = sections
+        self.text_nodes = text_nodes
+        self.graph_adj = graph_adj
+        self.lexical = lexical
 
-        Формат элемента результата:
+        # Обратная смежность: для старых индексов строим один раз здесь
+        if graph_radj is None:
+            graph_radj = build_reverse_adj(graph_adj)
+        self.graph_radj = graph_radj
+
+        # section_id → chunk-и в порядке документа (старые индексы — строим здесь)
+        if section_chunks is None:
+            section_chunks = build_section_chunks(sections, text_nodes)
+        self.section_chunks = section_chunks
+        self.chunk_pos: Dict[str, int] = {
+            nid: i for ids in section_chunks.values() for i, nid in enumerate(ids)
+        }
+        self._section_text_cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._section_text_lock = threading.Lock()
+
+        self.expander = GraphExpander(
+            self.graph_adj,
+            max_depth=self.max_graph_depth,
+            max_nodes=self.max_graph_nodes,
+            graph_radj=self.graph_radj,
+            policies=self.expand_policies,
+            cache_size=self.expand_cache_size,
+        )
+        self.scorer = NodeScorer(
+            self.sections,
+            self.text_nodes,
+            self.score_cfg,
+            lexical=(lexical or {}).get("chunks"),
+            emb_matrix=text_emb_matrix,
+        )
+
+    # =============================================================
+    # FULL SECTION MODE (LLM-ready)
+    # =============================================================
+    def rank_sections(self, ranked_nodes: List[dict]) -> List[dict]:
+        """
+        Группирует ranked text-nodes по section_id и сортирует секции,
+        не собирая текст.
+
+        Формат элемента:
         {
             "section_id": str,
-            "title": str,
-            "text": str,
-            "score": float,
-            "node_ids": List[str],
+            "score": float,                # max по узлам секции
+            "rerank_score": float?,        # max rerank_score по узлам секции
+            "node_ids": List[str],         # узлы, подсветившие секцию
+            "node_scores": List[float],
         }
+
+        Секции с узлами, прошедшими rerank, идут первыми по rerank_score
+        (как и сами узлы в text_nodes), остальные — по линейному score.
+        pack_sections() при бюджете токенов выбирает единицы по линейному
+        score на токен, но порядок секций в выдаче сохраняет.
         """
 
         # 1. Группируем узлы по секции
@@ -69,119 +225,780 @@ class OntologyRAGPipeline:
                 continue
             section_to_nodes.setdefault(sid, []).append(item)
 
-        output = []
-
-        # 2. Для каждой секции формируем полный текст и агрегированный score
+        # 2. Агрегированный score: берём максимум по узлам секции
+        plans = []
         for sid, nodes in section_to_nodes.items():
-            sec = self.sections[sid]
-
-            # Заголовок секции
-            title = ""
-            if sec.local_text:
-                title = sec.local_text.split("\n")[0].strip()
-
-            # Собрать все chunk-и этой секции
-            chunks = []
-            for nid, tn in self.text_nodes.items():
-                if tn.section_id == sid:
-                    chunks.append((nid, tn.text))
-
-            # Сортировка по реальному порядку chunk_chXXXX
-            def sort_key(x):
-                nid = x[0]
-                try:
-                    return int(nid.split("ch")[1])
-                except Exception:
-                    return 999_999
-
-            chunks_sorted = sorted(chunks, key=sort_key)
-            full_text = "\n".join(t for _, t in chunks_sorted).strip()
-
-            # Агрегированный score: берём максимум по узлам секции
-            section_score = float(
-                max(node["score"] for node in nodes)
-            )
-
-            node_ids = [node["node_id"] for node in nodes]
-
-            output.append({
+            plan = {
                 "section_id": sid,
-                "title": title,
-                "text": full_text,
-                "score": section_score,
-                "node_ids": node_ids,
-            })
+                "score": float(max(node["score"] for node in nodes)),
+                "node_ids": [node["node_id"] for node in nodes],
+                "node_scores": [float(node["score"]) for node in nodes],
+            }
+            reranked = [node["rerank_score"] for node in nodes if "rerank_score" in node]
+            if reranked:
+                plan["rerank_score"] = float(max(reranked))
+            plans.append(plan)
 
         # 3. Сортируем секции для стабильности:
-        #    сначала по убыванию score, потом по номеру секции
+        #    сначала прошедшие rerank по убыванию rerank_score,
+        #    затем по убыванию score, потом по номеру секции
         def section_sort_key(item: dict):
             sid = item["section_id"]
             try:
                 order = int(sid.split("ch")[1])
             except Exception:
                 order = 999_999
-            return (-item["score"], order)
+            rr = item.get("rerank_score")
+            return (rr is None, -(rr or 0.0), -item["score"], order)
+
+        return sorted(plans, key=section_sort_key)
+
+    def section_chunk_ids(self, sid: str) -> List[str]:
+        """Chunk-и секции в порядке документа (из таблицы section_chunks)."""
+        return self.section_chunks.get(sid, [])
+
+    def section_title(self, sid: str) -> str:
+        sec = self.sections[sid]
+        return sec.local_text.partition("\n")[0].strip() if sec.local_text else ""
+
+    def section_title_and_text(self, sid: str) -> Tuple[str, str]:
+        """Заголовок и полный текст секции через ограниченный LRU-кэш."""
+        with self._section_text_lock:
+            cached = self._section_text_cache.get(sid)
+            if cached is not None:
+                self._section_text_cache.move_to_end(sid)
+                return cached
+
+        title = self.section_title(sid)
+        text = "\n".join(self.text_nodes[nid].text for nid in self.section_chunk_ids(sid)).strip()
+
+        with self._section_text_lock:
+            self._section_text_cache[sid] = (title, text)
+            while len(self._section_text_cache) > self.section_text_cache_size:
+                self._section_text_cache.popitem(last=False)
+        return title, text
+
+    def node_tokens(self, nid: str) -> int:
+        """
+        Число токенов chunk-а (посчитано при построении индекса).
+        Для старых индексов — грубая оценка ~4 символа на токен.
+        """
+        tn = self.text_nodes[nid]
+        if tn.n_tokens is not None:
+            return tn.n_tokens
+        return max(1, len(tn.text) // 4)
+
+    def assemble_section(self, plan: dict) -> dict:
+        """
+        Собирает текст секции-кандидата.
+        Без plan["chunk_ids"] — полный текст секции (как раньше),
+        иначе только выбранные chunk-и; разрывы помечаются "…".
+        """
+        sid = plan["section_id"]
+        chunk_ids = plan.get("chunk_ids")
+
+        if chunk_ids is None:
+            title, text = self.section_title_and_text(sid)
+        else:
+            title = self.section_title(sid)
+            # chunk_ids уже в порядке документа; разрыв — если позиции не подряд
+            parts = []
+            prev = None
+            for nid in chunk_ids:
+                pos = self.chunk_pos[nid]
+                if prev is not None and pos != prev + 1:
+                    parts.append("…")
+                parts.append(self.text_nodes[nid].text)
+                prev = pos
+            text = "\n".join(parts).strip()
+
+        out = {
+            "section_id": sid,
+            "title": title,
+            "text": text,
+            "score": plan["score"],
+            "node_ids": plan["node_ids"],
+        }
+        if "rerank_score" in plan:
+            out["rerank_score"] = plan["rerank_score"]
+        if chunk_ids is not None:
+            out["packing"] = plan["packing"]
+            out["n_tokens"] = plan["n_tokens"]
+        return out
+
+    def build_full_sections(self, ranked_nodes: List[dict]) -> List[dict]:
+        """
+        Превращает ranked text-nodes в список секций-кандидатов для LLM.
+
+        - Группирует text_nodes по section_id.
+        - Для каждой секции собирает полный текст (как раньше).
+        - Считает агрегированный score (max по узлам секции).
+        - Сохраняет node_ids, которые подсветили секцию.
 
-        return sorted(output, key=section_sort_key)
+        Формат элемента результата:
+        {
+            "section_id": str,
+            "title": str,
+            "text": str,
+            "score": float,
+            "node_ids": List[str],
+        }
+        """
+        return [self.assemble_section(p) for p in self.rank_sections(ranked_nodes)]
+
+    # =============================================================
+    # TOKEN-BUDGETED PACKING
+    # =============================================================
+    def pack_sections(
+        self,
+        plans: List[dict],
+        max_tokens: int,
+        window: int = 1,
+    ):
+        """
+        Жадно упаковывает контекст в бюджет max_tokens.
+
+        Единицы упаковки:
+          - секция целиком (score секции);
+          - окно ±window chunk-ов вокруг каждого подсвеченного узла (score узла).
+        Берём по убыванию score на токен; окна внутри уже взятой секции
+        стоят 0 токенов. Score сдвигаются так, чтобы быть > 0
+        (штраф за расстояние может делать их отрицательными).
+
+        Возвращает (plans с chunk_ids/packing/n_tokens, статистика бюджета).
+        """
+        units = []
+        section_ids = {}
+        for rank, plan in enumerate(plans):
+            sid = plan["section_id"]
+            ids = self.section_chunk_ids(sid)
+            section_ids[sid] = ids
+            units.append((plan["score"], rank, ids))
+
+            pos = {nid: i for i, nid in enumerate(ids)}
+            for nid, nscore in zip(plan["node_ids"], plan["node_scores"]):
+                i = pos.get(nid)
+                if i is None:
+                    continue
+                units.append((nscore, rank, ids[max(0, i - window): i + window + 1]))
+
+        if not units:
+            return [], {"max_tokens": max_tokens, "used_tokens": 0, "sections": 0}
+
+        shift = 1e-3 - min(u[0] for u in units)
+
+        def utility(u):
+            cost = sum(self.node_tokens(nid) for nid in u[2])
+            return (u[0] + shift) / max(cost, 1)
+
+        units.sort(key=utility, reverse=True)
+
+        chosen: Dict[int, set] = {}
+        used = 0
+        for _, rank, ids in units:
+            have = chosen.setdefault(rank, set())
+            new = [nid for nid in ids if nid not in have]
+            cost = sum(self.node_tokens(nid) for nid in new)
+            if used + cost > max_tokens:
+                continue
+            have.update(new)
+            used += cost
+
+        packed = []
+        for rank, plan in enumerate(plans):
+            have = chosen.get(rank)
+            if not have:
+                continue
+            full = len(have) == len(section_ids[plan["section_id"]])
+            packed.append(dict(
+                plan,
+                chunk_ids=[nid for nid in section_ids[plan["section_id"]] if nid in have],
+                packing="full" if full else "window",
+                n_tokens=sum(self.node_tokens(nid) for nid in have),
+            ))
+
+        budget = {
+            "max_tokens": max_tokens,
+            "used_tokens": used,
+            "used_ratio": used / max_tokens if max_tokens else 0.0,
+            "sections": len(packed),
+            "sections_dropped": len(plans) - len(packed),
+        }
+        return packed, budget
 
     # =============================================================
     # MAIN PIPELINE METHOD
     # =============================================================
-    def run_query(self, query: str) -> Dict:
+    def run_query(
+        self,
+        query: str,
+        max_context_tokens: Optional[int] = None,
+        context_window: int = 1,
+        projection: str = "full",
+        deadline_ms: Optional[float] = None,
+    ) -> Dict:
+        """
+        max_context_tokens — бюджет токенов на section_candidates:
+        секции и окна chunk-ов вокруг найденных узлов упаковываются
+        жадно по score на токен (см. pack_sections), в результате
+        появляется "context_budget".
+
+        projection — какие части результата нужны (см. PROJECTIONS);
+        ненужные части не вычисляются.
+
+        С instrument(timings=True) в результате есть "timings" (мс по стадиям)
+        и "counters".
+
+        deadline_ms — бюджет времени на весь запрос (включая эмбеддинг).
+        Перед каждой стадией оставшееся время сравнивается с оценкой её
+        стоимости, и стадия при нехватке деградирует (см. DEGRADATIONS
+        в deadline.py): ужатый drill, урезанный обход графа, без rerank /
+        сборки текста секций / graph_context, а если время вышло ещё до
+        drill — плоский скоринг всех chunk-ов. Результат всегда валиден,
+        в "deadline" — бюджет, затраченное время, met и список деградаций;
+        сводка по запросам — deadline_stats.metrics().
+        """
+        t0 = time.perf_counter()
+        trace = self._trace(query)
+
         # 1. Embed query
+        if trace is not None:
+            trace.begin("embed")
         q_emb = self.model.encode(query)
+        if trace is not None:
+            trace.end()
 
-        # 2. Drill: choose seed sections
-        selector = DrillSelector(self.sections, self.drill_cfg)
-        seed_ids = selector.select_seeds(q_emb, top_r=3)
+        return self.run_embedded(
+            query,
+            q_emb,
+            max_context_tokens=max_context_tokens,
+            context_window=context_window,
+            projection=projection,
+            trace=trace,
+            deadline_ms=deadline_ms,
+            t0=t0,
+        )
 
-        # 3. Expand graph (BFS)
-        expander = GraphExpander(
-            self.graph_adj,
-            max_depth=self.max_graph_depth,
-            max_nodes=self.max_graph_nodes,
+    def run_batch(
+        self,
+        queries: List[str],
+        q_embs: Optional[np.ndarray] = None,
+        batch_size: int = 64,
+        **opts,
+    ) -> List[Dict]:
+        """
+        Пакетный режим: эмбеддинги запросов — одним вызовом модели
+        на batch_size запросов (или готовые q_embs), затем run_embedded()
+        для каждого. opts — как у run_query().
+        """
+        results = []
+        for start in range(0, len(queries), batch_size):
+            chunk = queries[start:start + batch_size]
+            if q_embs is not None:
+                embs = q_embs[start:start + batch_size]
+            else:
+                embs = self.model.encode(list(chunk))
+            for query, q_emb in zip(chunk, embs):
+                results.append(self.run_embedded(query, q_emb, **opts))
+        return results
+
+    def _trace(self, query: str) -> Optional[QueryTrace]:
+        inst = self.instrument
+        if inst is None or not inst.active:
+            return None
+        return inst.start(query)
+
+    def run_embedded(
+        self,
+        query: str,
+        q_emb: np.ndarray,
+        max_context_tokens: Optional[int] = None,
+        context_window: int = 1,
+        projection: str = "full",
+        trace: Optional[QueryTrace] = None,
+        deadline_ms: Optional[float] = None,
+        t0: Optional[float] = None,
+    ) -> Dict:
+        """
+        Все стадии run_query() после эмбеддинга запроса.
+        Нужен, когда запросы эмбеддятся пачкой (сервер, batch-режим).
+        Потокобезопасен: общие кэши защищены блокировками.
+
+        С result_cache почти совпадающий запрос (по косинусу эмбеддингов,
+        при тех же конфигах и версии индекса) получает готовый результат
+        с пометкой "cache". Закэшированный результат общий — не изменять.
+
+        deadline_ms — как у run_query(); t0 — момент начала запроса
+        (time.perf_counter()), чтобы в бюджет входили эмбеддинг и очередь.
+        Деградировавшие результаты в кэш не кладутся.
+        """
+        if deadline_ms is not None and t0 is None:
+            t0 = time.perf_counter()
+        if trace is None:
+            trace = self._trace(query)
+        if trace is None:
+            return self._run_cached(
+                query, q_emb, max_context_tokens, context_window, projection,
+                deadline_ms=deadline_ms, t0=t0,
+            )
+
+        inst = self.instrument
+        prof = inst.maybe_profiler()
+        try:
+            result = self._run_cached(
+                query, q_emb, max_context_tokens, context_window, projection, trace,
+                deadline_ms=deadline_ms, t0=t0,
+            )
+        finally:
+            if prof is not None:
+                inst.collect_profile(prof)
+
+        inst.finish(trace)
+        if inst.timings:
+            result = dict(result)
+            result["timings"] = trace.timings
+            result["counters"] = trace.counters
+        return result
+
+    def _run_cached(
+        self,
+        query: str,
+        q_emb: np.ndarray,
+        max_context_tokens: Optional[int],
+        context_window: int,
+        projection: str,
+        trace: Optional[QueryTrace] = None,
+        deadline_ms: Optional[float] = None,
+        t0: Optional[float] = None,
+    ) -> Dict:
+        cache = self.result_cache
+        if cache is None:
+            return self._run_stages(
+                query, q_emb, max_context_tokens, context_window, projection, trace,
+                deadline_ms=deadline_ms, t0=t0,
+            )
+
+        t_cache = time.perf_counter()
+        if trace is not None:
+            trace.begin("cache")
+        fp = self.cache_fingerprint(max_context_tokens, context_window, projection, query)
+        hit = cache.lookup(q_emb, fp)
+        if trace is not None:
+            trace.end(cache_hit=int(hit is not None))
+        if hit is not None:
+            cached_query, cached, sim, _ = hit
+            result = dict(cached)
+            result["query"] = query
+            result["cache"] = {"hit": True, "similarity": sim, "cached_query": cached_query}
+            if deadline_ms is not None:
+                result["deadline"] = self._finish_deadline(Deadline(deadline_ms, t0))
+            return result
+
+        result = self._run_stages(
+            query, q_emb, max_context_tokens, context_window, projection, trace,
+            deadline_ms=deadline_ms, t0=t0,
+        )
+        # урезанный по времени результат не должен переживать запрос
+        if not result.get("deadline", {}).get("degraded"):
+            cache.put(q_emb, fp, query, result, (time.perf_counter() - t_cache) * 1000)
+        return result
+
+    def _finish_deadline(self, deadline: Deadline) -> dict:
+        report = deadline.report()
+        self.deadline_stats.record(report)
+        return report
+
+    def cache_fingerprint(
+        self,
+        max_context_tokens: Optional[int],
+        context_window: int,
+        projection: str = "full",
+        query: Optional[str] = None,
+    ) -> str:
+        """
+        Всё, от чего зависит результат, кроме эмбеддинга запроса.
+
+        С BM25 (w_bm25 > 0 у DrillConfig или ScoreConfig) результат зависит
+        и от точных слов запроса: в fingerprint входит множество его термов
+        (analyze), так что запросы с почти одинаковыми эмбеддингами, но
+        разными метками / текстами ошибок друг другу не попадают.
+        """
+        terms = None
+        if query is not None and self.lexical and (self.drill_cfg.w_bm25 or self.score_cfg.w_bm25):
+            terms = sorted(set(analyze(query)))
+        return repr((
+            self.index_version,
+            sorted(vars(self.drill_cfg).items()),
+            sorted(vars(self.score_cfg).items()),
+            self.max_graph_depth,
+            self.max_graph_nodes,
+            self.top_k_text,
+            self.top_r,
+            self.expand_mode,
+            self.expand_slack,
+            None if self.reranker is None else self.reranker.top_n,
+            max_context_tokens,
+            context_window,
+            projection,
+            terms,
+        ))
+
+    def _run_stages(
+        self,
+        query: str,
+        q_emb: np.ndarray,
+        max_context_tokens: Optional[int],
+        context_window: int,
+        projection: str = "full",
+        trace: Optional[QueryTrace] = None,
+        deadline_ms: Optional[float] = None,
+        t0: Optional[float] = None,
+    ) -> Dict:
+        result = {"query": query, "section_candidates": []}
+        extra = {}
+
+        events = self.stream_embedded(
+            query, q_emb, max_context_tokens, context_window,
+            t0=t0, projection=projection, trace=trace, deadline_ms=deadline_ms,
         )
-        all_nodes, all_edges, dist = expander.expand(seed_ids)
-
-        # 4. Score text nodes
-        scorer = NodeScorer(self.sections, self.text_nodes, self.score_cfg)
-        ranked = scorer.score_all(
-            query_emb=q_emb,
-            dist_to_seed=dist,
-            candidate_node_ids=list(all_nodes),
-            top_k=self.top_k_text,
+        for ev in events:
+            kind = ev["event"]
+            if kind == "text_nodes":
+                result["text_nodes"] = ev["text_nodes"]
+                if "rerank" in ev:
+                    extra["rerank"] = ev["rerank"]
+            elif kind == "plan" and "context_budget" in ev:
+                extra["context_budget"] = ev["context_budget"]
+            elif kind == "section":
+                result["section_candidates"].append(ev["section"])
+            elif kind == "graph_context":
+                result["graph_context"] = ev["graph_context"]
+            elif kind == "debug":
+                extra["debug"] = ev["debug"]
+            elif kind == "done" and "deadline" in ev:
+                extra["deadline"] = ev["deadline"]
+
+        # Итоговый формат, удобный для дальнейшего LLM-агента
+        result.update(extra)
+        return result
+
+    # =============================================================
+    # STREAMING
+    # =============================================================
+    def stream_query(
+        self,
+        query: str,
+        max_context_tokens: Optional[int] = None,
+        context_window: int = 1,
+        projection: str = "full",
+        deadline_ms: Optional[float] = None,
+    ) -> Iterator[Dict]:
+        """
+        Потоковый вариант run_query(): генератор событий
+
+            {"event": "seeds",         "seed_ids": [...]}
+            {"event": "text_nodes",    "text_nodes": [...], "rerank"?: {...}}
+            {"event": "plan",          "section_ids": [...], "context_budget"?: {...}}
+            {"event": "section",       "rank": i, "section": {...}}   — по одной
+            {"event": "graph_context", "graph_context": {...}}
+            {"event": "debug",         "debug": {...}}                — только projection="debug"
+            {"event": "done",          "first_section_ms": ..., "total_ms": ...,
+                                       "deadline"?: {...}}
+
+        У каждого события есть elapsed_ms от начала запроса (включая эмбеддинг).
+        Секции собираются лениво: LLM-агент может начинать с первой,
+        пока остальные ещё не собраны.
+        deadline_ms — как у run_query(), отчёт — в событии "done".
+        """
+        t0 = time.perf_counter()
+        trace = self._trace(query)
+
+        if trace is not None:
+            trace.begin("embed")
+        q_emb = self.model.encode(query)
+        if trace is not None:
+            trace.end()
+
+        yield from self.stream_embedded(
+            query, q_emb, max_context_tokens, context_window,
+            t0=t0, projection=projection, trace=trace, deadline_ms=deadline_ms,
         )
+        if trace is not None:
+            self.instrument.finish(trace)
+
+    def stream_embedded(
+        self,
+        query: str,
+        q_emb: np.ndarray,
+        max_context_tokens: Optional[int] = None,
+        context_window: int = 1,
+        t0: Optional[float] = None,
+        projection: str = "full",
+        trace: Optional[QueryTrace] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> Iterator[Dict]:
+        """
+        Стадии stream_query() после эмбеддинга запроса.
+        trace — тайминги и счётчики стадий (None — без инструментирования).
+        deadline_ms — отсчитывается от t0, см. run_query().
+        """
+        if projection not in PROJECTIONS:
+            raise ValueError(f"unknown projection {projection!r}, expected one of {PROJECTIONS}")
+        if self.expand_mode not in EXPAND_MODES:
+            raise ValueError(f"unknown expand_mode {self.expand_mode!r}, expected one of {EXPAND_MODES}")
+        if t0 is None:
+            t0 = time.perf_counter()
+
+        with_text = projection in ("full", "debug")
+        with_graph = projection in ("full", "debug")
+
+        def event(kind: str, **payload) -> Dict:
+            payload["event"] = kind
+            payload["elapsed_ms"] = (time.perf_counter() - t0) * 1000
+            return payload
+
+        # Дедлайн: перед стадией — хватит ли оставшегося времени на оценку
+        # стоимости её и следующих стадий; замеры — только полных стадий
+        dl = Deadline(deadline_ms, t0) if deadline_ms is not None else None
+        dcfg = self.deadline_cfg
+        costs = self.stage_costs
+
+        def degrade(name: str):
+            dl.degrade(name)
+            if trace is not None:
+                trace.count("degraded_" + name)
+
+        def observe(stage: str, since: float, n: int = 1):
+            if dl is not None and n:
+                costs.observe(stage, (time.perf_counter() - since) * 1000 / n)
+
+        # 2. Drill: choose seed sections
+        top_r, drill_cfg = self.top_r, self.drill_cfg
+        flat = False
+        if dl is not None:
+            graph_ms = costs.get("drill") + costs.get("expand") + costs.get("score")
+            # плоский скоринг — O(N): на большом корпусе он дороже ужатого графового пути
+            flat_ms = costs.get("flat", costs.get("score_row", np.inf) * len(self.scorer.node_ids))
+            if dl.expired() and flat_ms < graph_ms:
+                flat = True
+                degrade("flat_fallback")
+            elif dl.remaining_ms() < graph_ms:
+                top_r = min(top_r, dcfg.min_top_r)
+                if drill_cfg.top_k > dcfg.min_drill_top_k:
+                    drill_cfg = copy.copy(drill_cfg)
+                    drill_cfg.top_k = dcfg.min_drill_top_k
+                if top_r < self.top_r or drill_cfg is not self.drill_cfg:
+                    degrade("drill_shrunk")
+
+        seed_ids = []
+        if not flat:
+            ts = time.perf_counter()
+            if trace is not None:
+                trace.begin("drill")
+            selector = DrillSelector(self.sections, drill_cfg, lexical=self.lexical)
+            seed_ids = selector.select_seeds(q_emb, top_r=top_r, query_text=query)
+            if trace is not None:
+                trace.end(seeds=len(seed_ids))
+            if dl is not None and "drill_shrunk" not in dl.degraded:
+                observe("drill", ts)
+        yield event("seeds", seed_ids=list(seed_ids))
+
+        # 3. Expand graph (BFS / кэш окрестностей / best-first)
+        self.expander.max_depth = self.max_graph_depth
+        self.expander.max_nodes = self.max_graph_nodes
+        expander = self.expander
+        if dl is not None and not flat:
+            remaining = dl.remaining_ms()
+            need = costs.get("expand") + costs.get("score")
+            if remaining <= 0 or remaining < need:
+                # узлов — пропорционально оставшемуся времени, на слой меньше
+                ratio = max(remaining, 0.0) / need if need > 0 else 0.0
+                depth = max(1, self.max_graph_depth - 1) if remaining > 0 else 1
+                nodes = max(dcfg.min_graph_nodes, int(self.max_graph_nodes * ratio))
+                depth, nodes = min(depth, self.max_graph_depth), min(nodes, self.max_graph_nodes)
+                if (depth, nodes) != (self.max_graph_depth, self.max_graph_nodes):
+                    expander = self.expander.limited(depth, nodes)
+                    degrade("expand_cut")
+
+        if flat:
+            all_nodes, all_edges, dist = set(), [], {}
+        else:
+            ts = time.perf_counter()
+            if trace is not None:
+                trace.begin("expand")
+            if self.expand_mode == "best_first":
+                all_nodes, all_edges, dist = expander.expand_best_first(
+                    seed_ids,
+                    functools.partial(self.scorer.estimate, q_emb),
+                    top_k=self.top_k_text,
+                    w_dist=self.score_cfg.w_dist,
+                    slack=self.expand_slack,
+                )
+            else:
+                all_nodes, all_edges, dist = expander.expand(seed_ids)
+            if trace is not None:
+                trace.end(expanded_nodes=len(all_nodes), expanded_edges=len(all_edges))
+            if expander is self.expander:
+                observe("expand", ts)
+
+        # 4. Score text nodes (при flat_fallback — все chunk-и, без графа)
+        ts = time.perf_counter()
+        if trace is not None:
+            trace.begin("score")
+        score_stats = {}
+        if flat:
+            ranked = self.scorer.score_flat(
+                q_emb, top_k=self.top_k_text, query_text=query, stats=score_stats,
+            )
+            all_nodes = {nid for nid, _ in ranked}
+        else:
+            ranked = self.scorer.score_all(
+                query_emb=q_emb,
+                dist_to_seed=dist,
+                candidate_node_ids=list(all_nodes),
+                top_k=self.top_k_text,
+                query_text=query,
+                stats=score_stats,
+            )
+        if trace is not None:
+            trace.end(
+                candidates_scored=len(self.scorer.node_ids) if flat else len(all_nodes),
+                ranked_nodes=len(ranked),
+                collapsed_duplicates=score_stats.get("collapsed", 0),
+            )
+        if flat:
+            observe("flat", ts)
+        elif expander is self.expander:
+            observe("score_row", ts, len(all_nodes))
+            observe("score", ts)
+
+        # 4b. Опциональный rerank top-N cross-encoder-ом
+        rerank_scores, rerank_info = None, None
+        if self.reranker is not None and ranked and dl is not None \
+                and dl.remaining_ms() <= costs.get("rerank"):
+            degrade("rerank_skipped")
+        elif self.reranker is not None and ranked:
+            ts = time.perf_counter()
+            if trace is not None:
+                trace.begin("rerank")
+            rerank_scores, rerank_info = self.reranker.rerank(
+                query,
+                [(nid, self.text_nodes[nid].text) for nid, _ in ranked],
+            )
+            if rerank_scores:
+                head = [x for x in ranked if x[0] in rerank_scores]
+                tail = [x for x in ranked if x[0] not in rerank_scores]
+                head.sort(key=lambda x: rerank_scores[x[0]], reverse=True)
+                ranked = head + tail
+            if trace is not None:
+                trace.end(reranked=len(rerank_scores or ()))
+            observe("rerank", ts)
 
         # 5. Детализированный список текстовых узлов (для интерпретации / отладки)
+        if trace is not None:
+            trace.begin("text_nodes")
         text_context = []
         for nid, score in ranked:
             tn = self.text_nodes[nid]
-            text_context.append({
-                "node_id": nid,
-                "section_id": tn.section_id,
-                "type": tn.node_type,
-                "text": tn.text,
-                "score": float(score),
-            })
+            item = {"node_id": nid, "section_id": tn.section_id}
+            if with_text:
+                item["type"] = tn.node_type
+                item["text"] = tn.text
+            item["score"] = float(score)
+            if rerank_scores and nid in rerank_scores:
+                item["rerank_score"] = rerank_scores[nid]
+            if projection == "debug":
+                item["dist"] = dist.get(nid)
+            text_context.append(item)
+
+        if trace is not None:
+            trace.end()
+            if with_text:
+                trace.count("text_bytes", sum(len(x["text"].encode("utf-8")) for x in text_context))
+
+        if projection != "sections_only":
+            if rerank_info is not None:
+                yield event("text_nodes", text_nodes=text_context, rerank=rerank_info)
+            else:
+                yield event("text_nodes", text_nodes=text_context)
+
+        # 6. Секции-кандидаты для LLM-агента (LLM-ready), по одной
+        if trace is not None:
+            trace.begin("pack")
+        plans = self.rank_sections(text_context)
+        budget = None
+        if max_context_tokens is not None:
+            plans, budget = self.pack_sections(plans, max_context_tokens, context_window)
+        if trace is not None:
+            trace.end(sections=len(plans))
 
-        # 6. Секции-кандидаты для LLM-агента (LLM-ready)
-        section_candidates = self.build_full_sections(text_context)
+        section_ids = [p["section_id"] for p in plans]
+        if budget is not None:
+            yield event("plan", section_ids=section_ids, context_budget=budget)
+        else:
+            yield event("plan", section_ids=section_ids)
+
+        first_section_ms = None
+        assemble = projection != "ids_only"
+        for rank, plan in enumerate(plans):
+            if assemble and dl is not None and dl.remaining_ms() <= costs.get("assemble"):
+                # остальные секции — без текста, как в ids_only
+                assemble = False
+                degrade("assembly_skipped")
+            ts = time.perf_counter()
+            if trace is not None:
+                trace.begin("assemble")
+            if not assemble:
+                section = {k: plan[k] for k in PLAN_ID_FIELDS if k in plan}
+            else:
+                section = self.assemble_section(plan)
+                observe("assemble", ts)
+            if trace is not None:
+                trace.end()
+                if "text" in section:
+                    trace.count("text_bytes", len(section["text"].encode("utf-8")))
+            ev = event("section", rank=rank, section=section)
+            if first_section_ms is None:
+                first_section_ms = ev["elapsed_ms"]
+            yield ev
 
         # 7. Графовый контекст (для визуализации / глубокой логики)
-        graph_nodes = list(all_nodes)
-        graph_edges = [
-            {"from": e.from_id, "to": e.to_id, "type": e.relation_type}
-            for e in all_edges
-            if e.from_id in all_nodes and e.to_id in all_nodes
-        ]
-
-        # 8. Итоговый формат, удобный для дальнейшего LLM-агента
-        return {
-            "query": query,
-            "section_candidates": section_candidates,
-            "text_nodes": text_context,
-            "graph_context": {
+        if with_graph and dl is not None and dl.expired():
+            degrade("graph_context_skipped")
+            yield event("graph_context", graph_context={"nodes": [], "edges": []})
+        elif with_graph:
+            if trace is not None:
+                trace.begin("graph_context")
+            graph_nodes = list(all_nodes)
+            graph_edges = [
+                {"from": e.from_id, "to": e.to_id, "type": e.relation_type}
+                for e in all_edges
+                if e.from_id in all_nodes and e.to_id in all_nodes
+            ]
+            if trace is not None:
+                trace.end(graph_edges=len(graph_edges))
+            yield event("graph_context", graph_context={
                 "nodes": graph_nodes,
                 "edges": graph_edges,
-            },
-        }
+            })
+
+        if projection == "debug":
+            yield event("debug", debug={
+                "seed_ids": list(seed_ids),
+                "expanded_nodes": len(all_nodes),
+                "expanded_edges": len(all_edges),
+                "scored_nodes": len(ranked),
+                "fingerprint": self.cache_fingerprint(
+                    max_context_tokens, context_window, projection, query
+                ),
+            })
+
+        total = event("done")
+        total["first_section_ms"] = first_section_ms
+        total["total_ms"] = total["elapsed_ms"]
+        if dl is not None:
+            total["deadline"] = self._finish_deadline(dl)
+        if trace is not None and trace.inst.timings:
+            total["timings"] = trace.timings
+            total["counters"] = trace.counters
+        yield total
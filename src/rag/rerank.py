@@ -0,0 +1,196 @@
+# src/rag/rerank.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class CrossEncoderReranker:
+    """
+    Опциональный rerank top-N узлов после NodeScorer
+    локальным cross-encoder-ом (sentence-transformers CrossEncoder).
+
+      - все пары (query, text) без кэша считаются одним predict()
+      - оценки пар кэшируются в LRU по (query, хэш текста узла):
+        после смены индекса у того же node_id может быть другой текст
+      - есть бюджет времени на запрос: если по оценке (мс на пару × число
+        пар) бюджет будет превышен, считаются только первые budget / ms_per_pair
+        промахов (в порядке линейного score), плюс пары из кэша; стадия
+        пропускается целиком, лишь если не осталось ни одной пары
+      - каждый probe_every-й вызов подряд, упёршийся в бюджет, всё равно
+        считает хотя бы одну пару: оценка ms_per_pair обновляется, и одна
+        медленная (холодная) первая пачка не выключает rerank навсегда
+
+    model — любой объект с predict(pairs) → scores; если None,
+    загружается CrossEncoder(model_name).
+    """
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1",
+        device: Optional[str] = None,
+        top_n: int = 20,
+        budget_ms: float = 150.0,
+        cache_size: int = 10_000,
+        probe_every: int = 20,
+        model=None,
+    ):
+        if model is None:
+            from sentence_transformers import CrossEncoder
+
+            print(f"[CrossEncoderReranker] Loading model {model_name}...")
+            model = CrossEncoder(model_name, device=device)
+
+        self.model = model
+        self.top_n = top_n
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.probe_every = probe_every
+
+        # (query, blake2b(text)) → score, см. _cache_key()
+        self._cache: "OrderedDict[Tuple[str, bytes], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # сглаженная оценка стоимости одной пары (мс); None — ещё не мерили
+        self.ms_per_pair: Optional[float] = None
+        # вызовов подряд, урезанных бюджетом (для probe_every)
+        self._over_budget = 0
+
+        self.stats = {
+            "calls": 0,
+            "skipped": 0,
+            "truncated": 0,
+            "probes": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "total_ms": 0.0,
+        }
+
+    # -------------------------------------------------------------
+    # LRU-кэш пар
+    # -------------------------------------------------------------
+    @staticmethod
+    def _cache_key(query: str, text: str) -> Tuple[str, bytes]:
+        return query, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _cache_get(self, key):
+        with self._lock:
+            val = self._cache.get(key)
+            if val is not None:
+                self._cache.move_to_end(key)
+            return val
+
+    def _cache_put(self, key, val: float):
+        with self._lock:
+            self._cache[key] = val
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # -------------------------------------------------------------
+    # Бюджет
+    # -------------------------------------------------------------
+    def _allowed_pairs(self, n_misses: int, budget: Optional[float]) -> Tuple[int, bool]:
+        """
+        Сколько промахов посчитать в бюджете budget (мс): все, пока
+        стоимость не мерили; иначе budget / ms_per_pair, но не меньше
+        одной пары на каждый probe_every-й урезанный вызов подряд.
+        Второе значение — это проба: её замер заменяет оценку целиком.
+        """
+        with self._lock:
+            if self.ms_per_pair is None or budget is None or self.ms_per_pair * n_misses <= budget:
+                self._over_budget = 0
+                return n_misses, False
+
+            self.stats["truncated"] += 1
+            self._over_budget += 1
+            allowed = int(budget // self.ms_per_pair) if self.ms_per_pair > 0 else n_misses
+            if allowed == 0 and self.probe_every and self._over_budget % self.probe_every == 0:
+                self.stats["probes"] += 1
+                return 1, True
+            return min(allowed, n_misses), False
+
+    # -------------------------------------------------------------
+    # rerank()
+    # -------------------------------------------------------------
+    def rerank(
+        self,
+        query: str,
+        items: List[Tuple[str, str]],
+        budget_ms: Optional[float] = None,
+    ) -> Tuple[Optional[Dict[str, float]], dict]:
+        """
+        items — (node_id, text) в порядке линейного score; берутся первые top_n.
+
+        Возвращает:
+            scores: node_id → score cross-encoder-а (None, если стадия пропущена);
+                    при урезании бюджетом — только посчитанные узлы
+            info:   latency_ms, cache_hits, cache_misses, skipped;
+                    truncated и estimated_ms — если промахи урезаны бюджетом
+        """
+        t0 = time.perf_counter()
+        budget = self.budget_ms if budget_ms is None else budget_ms
+        items = items[: self.top_n]
+
+        scores: Dict[str, float] = {}
+        misses: List[Tuple[str, str]] = []
+        for nid, text in items:
+            cached = self._cache_get(self._cache_key(query, text))
+            if cached is None:
+                misses.append((nid, text))
+            else:
+                scores[nid] = cached
+
+        info = {
+            "latency_ms": 0.0,
+            "cache_hits": len(items) - len(misses),
+            "cache_misses": len(misses),
+            "skipped": False,
+        }
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["cache_hits"] += info["cache_hits"]
+            self.stats["cache_misses"] += info["cache_misses"]
+
+        probe = False
+        if misses:
+            allowed, probe = self._allowed_pairs(len(misses), budget)
+            if allowed < len(misses):
+                info["estimated_ms"] = self.ms_per_pair * len(misses)
+                info["truncated"] = len(misses) - allowed
+                misses = misses[:allowed]
+
+            if not misses and not scores:
+                with self._lock:
+                    self.stats["skipped"] += 1
+                info["skipped"] = True
+                info["latency_ms"] = (time.perf_counter() - t0) * 1000
+                return None, info
+
+        if misses:
+            t1 = time.perf_counter()
+            pairs = [(query, text) for _, text in misses]
+            preds = self.model.predict(pairs, batch_size=len(pairs))
+            spent = (time.perf_counter() - t1) * 1000
+
+            per_pair = spent / len(pairs)
+            with self._lock:
+                self.ms_per_pair = (
+                    per_pair if self.ms_per_pair is None or probe
+                    else 0.8 * self.ms_per_pair + 0.2 * per_pair
+                )
+
+            for (nid, text), sc in zip(misses, preds):
+                scores[nid] = float(sc)
+                self._cache_put(self._cache_key(query, text), float(sc))
+
+        info["latency_ms"] = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self.stats["total_ms"] += info["latency_ms"]
+        return scores, info
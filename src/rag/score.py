@@ -1,9 +1,10 @@
 # src/rag/score.py
 
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional
 import numpy as np
 
 from ..data.models import TextNode, Section
+from ..index.lexical_index import LexicalIndex
 
 
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
@@ -19,6 +20,11 @@ def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
 class ScoreConfig:
     """
     Конфигурация весов финального скоринга.
+
+    w_bm25 — вес лексического BM25 (нормированного на максимум
+             среди кандидатов запроса); 0 → чисто плотный скоринг.
+    collapse_duplicates — из кластера почти-дубликатов (TextNode.cluster_id)
+             в выдачу попадает только узел с лучшим score.
     """
 
     def __init__(
@@ -27,11 +33,15 @@ class ScoreConfig:
         w_type: float = 0.3,
         w_level: float = 0.15,
         w_dist: float = 0.2,
+        w_bm25: float = 0.0,
+        collapse_duplicates: bool = True,
     ):
         self.w_text = w_text
         self.w_type = w_type
         self.w_level = w_level
         self.w_dist = w_dist
+        self.w_bm25 = w_bm25
+        self.collapse_duplicates = collapse_duplicates
 
         # бонусы за тип
         self.type_bonus = {
@@ -53,6 +63,20 @@ class NodeScorer:
     """
     Рассчитывает итоговый score для каждого текстового узла
     в candidate_node_ids (узлы из BFS-графа).
+
+    При создании один раз собирает:
+      - матрицу эмбеддингов text_nodes и их нормы
+      - статические приоры w_type*type_bonus и w_level*level_bonus
+    так что score_all() — это gather строк, один mat-vec и argpartition.
+    Веса ScoreConfig читаются при создании: после их изменения
+    нужен новый NodeScorer.
+
+    lexical — BM25-индекс по тексту chunk-ов (см. lexical_index.py);
+    используется при cfg.w_bm25 > 0 и переданном query_text.
+
+    emb_matrix — готовая матрица эмбеддингов в порядке text_nodes
+    (например, np.memmap из attach_embedding_matrices): используется
+    как есть, без копии — в pre-fork режиме её страницы общие.
     """
 
     def __init__(
@@ -60,10 +84,190 @@ class NodeScorer:
         sections: Dict[str, Section],
         text_nodes: Dict[str, TextNode],
         config: ScoreConfig,
+        lexical: Optional[LexicalIndex] = None,
+        emb_matrix: Optional[np.ndarray] = None,
     ):
         self.sections = sections
         self.text_nodes = text_nodes
         self.cfg = config
+        self.lexical = lexical
+
+        self._precompute(emb_matrix)
+
+    # -------------------------------------------------------------
+    # Статические массивы по text_nodes
+    # -------------------------------------------------------------
+    def _precompute(self, emb_matrix: Optional[np.ndarray] = None):
+        cfg = self.cfg
+        self.node_ids: List[str] = list(self.text_nodes.keys())
+        self.row_of: Dict[str, int] = {nid: i for i, nid in enumerate(self.node_ids)}
+
+        n = len(self.node_ids)
+        dim = 0
+        for tn in self.text_nodes.values():
+            if tn.embedding is not None:
+                dim = len(tn.embedding)
+                break
+
+        shared = emb_matrix is not None and emb_matrix.shape == (n, dim)
+        emb = emb_matrix if shared else np.zeros((n, dim), dtype=np.float32)
+        # Два приора храним раздельно, чтобы порядок сложения был как
+        # в score_one(): ранжирование то же, score — в пределах погрешности
+        # float (косинус считается через mat-vec, а не по одной паре).
+        prior_type = np.zeros(n, dtype=np.float64)
+        prior_level = np.zeros(n, dtype=np.float64)
+
+        for i, tn in enumerate(self.text_nodes.values()):
+            if tn.embedding is not None and not shared:
+                emb[i] = tn.embedding
+
+            prior_type[i] = cfg.w_type * cfg.type_bonus.get(tn.node_type, 0.0)
+
+            sec = self.sections.get(tn.section_id)
+            lvl = sec.level if sec else 1
+            prior_level[i] = cfg.w_level * cfg.level_bonus.get(lvl, 0.0)
+
+        self.emb = emb
+        self.norms = np.linalg.norm(emb, axis=1) if dim else np.zeros(n, dtype=np.float32)
+        self.prior_type = prior_type
+        self.prior_level = prior_level
+        self.max_prior = float((prior_type + prior_level).max()) if n else 0.0
+        self.min_prior = float((prior_type + prior_level).min()) if n else 0.0
+
+        # строка → строка представителя кластера почти-дубликатов (или она сама)
+        cluster = np.arange(n, dtype=np.int64)
+        for i, tn in enumerate(self.text_nodes.values()):
+            if tn.cluster_id is not None:
+                cluster[i] = self.row_of.get(tn.cluster_id, i)
+        self.cluster = cluster
+        self.has_clusters = bool((cluster != np.arange(n)).any())
+
+        # строка скорера → строка лексического индекса (-1 — нет документа)
+        self.lex_rows = None
+        if self.lexical is not None:
+            self.lex_rows = np.array(
+                [self.lexical.row_of.get(nid, -1) for nid in self.node_ids],
+                dtype=np.int64,
+            )
+
+    # -------------------------------------------------------------
+    # BM25 для строк rows, нормированный на максимум (0..1)
+    # -------------------------------------------------------------
+    def bm25(self, query_text: str, rows: np.ndarray) -> np.ndarray:
+        out = np.zeros(len(rows), dtype=np.float64)
+        if self.lexical is None or not query_text:
+            return out
+
+        term_ids = self.lexical.query_terms(query_text)
+        if not term_ids:
+            return out
+
+        lr = self.lex_rows[rows]
+        ok = lr >= 0
+        out[ok] = self.lexical.score_rows(term_ids, lr[ok])
+
+        mx = out.max()
+        if mx > 0:
+            out /= mx
+        return out
+
+    # -------------------------------------------------------------
+    # Векторная косинусная близость для строк rows
+    # -------------------------------------------------------------
+    def sims(self, query_emb: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Как cosine_sim(), но сразу для набора строк; -1.0 там, где нет эмбеддинга.
+        rows=None — все строки (без копии матрицы, в т.ч. memmap).
+        """
+        n = len(self.node_ids) if rows is None else len(rows)
+        out = np.full(n, -1.0, dtype=np.float64)
+
+        if query_emb is None or self.emb.shape[1] != len(query_emb):
+            return out
+        nq = np.linalg.norm(query_emb)
+        if nq == 0:
+            return out
+
+        if rows is None:
+            dots = self.emb @ query_emb
+            denom = self.norms * nq
+        else:
+            dots = self.emb[rows] @ query_emb
+            denom = self.norms[rows] * nq
+        ok = denom != 0
+        out[ok] = dots[ok] / denom[ok]
+        return out
+
+    # -------------------------------------------------------------
+    # Оценка score для best-first обхода
+    # -------------------------------------------------------------
+    def estimate(
+        self,
+        query_emb: np.ndarray,
+        node_ids: List[str],
+        dist: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Оценки score узлов на расстоянии dist (см. GraphExpander.expand_best_first).
+
+        текстовый узел — score как в score_all() без BM25
+        секция         — w_text * cos(q, E_subtree) + лучший приор
+                         − w_dist * (dist + 1): оценка её chunk-ов
+        прочие         — nan (оценку наследуют от родителя)
+
+        Это эвристика, а не верхняя граница: chunk секции может быть
+        ближе к запросу, чем E_subtree, BM25 не учитывается, а по LINKS_TO
+        из узла достижимы chunk-и других секций. Насколько оценка может
+        занижать — см. exact_slack().
+
+        Возвращает (scores, is_text).
+        """
+        cfg = self.cfg
+        n = len(node_ids)
+        scores = np.full(n, np.nan, dtype=np.float64)
+        is_text = np.zeros(n, dtype=bool)
+
+        pos, rows = [], []
+        for i, nid in enumerate(node_ids):
+            r = self.row_of.get(nid)
+            if r is not None:
+                pos.append(i)
+                rows.append(r)
+                continue
+            sec = self.sections.get(nid)
+            if sec is not None:
+                emb = sec.E_subtree if sec.E_subtree is not None else sec.E_local
+                if emb is not None:
+                    scores[i] = (
+                        cfg.w_text * cosine_sim(query_emb, emb)
+                        + self.max_prior
+                        - cfg.w_dist * (dist + 1)
+                    )
+
+        if rows:
+            rows = np.asarray(rows, dtype=np.intp)
+            scores[pos] = (
+                cfg.w_text * self.sims(query_emb, rows)
+                + self.prior_type[rows]
+                + self.prior_level[rows]
+                - cfg.w_dist * dist
+            )
+            is_text[pos] = True
+        return scores, is_text
+
+    def exact_slack(self) -> float:
+        """
+        slack для expand_best_first(), при котором остановка допустима:
+        оценка estimate() любого узла плюс этот slack не ниже score
+        (с BM25) всего, что достижимо через него. С ним top-K score_all()
+        совпадает с BFS. При w_bm25 > 0 кандидаты в top-K тоже все найдены,
+        но BM25 нормируется на максимум по кандидатам, и score может
+        отличаться от BFS.
+
+        Оценка: cos ∈ [−1, 1] → 2 * w_text, приор → max − min, BM25 → w_bm25.
+        """
+        cfg = self.cfg
+        return 2 * cfg.w_text + (self.max_prior - self.min_prior) + cfg.w_bm25
 
     # -------------------------------------------------------------
     # score_one()
@@ -112,18 +316,98 @@ class NodeScorer:
         dist_to_seed: Dict[str, int],
         candidate_node_ids: List[str],
         top_k: int = 20,
+        query_text: Optional[str] = None,
+        stats: Optional[dict] = None,
     ) -> List[Tuple[str, float]]:
         """
         Возвращает top-K узлов по score.
+        Порядок тот же, что у сортировки score_one() по убыванию
+        (при равных score — порядок candidate_node_ids).
+        С query_text и cfg.w_bm25 > 0 добавляется w_bm25 * BM25.
+        При cfg.collapse_duplicates из каждого кластера почти-дубликатов
+        остаётся лучший узел; сколько отброшено — stats["collapsed"].
         """
 
-        scored = []
+        rows = []
+        dists = []
         for nid in candidate_node_ids:
-            if nid not in self.text_nodes:
+            r = self.row_of.get(nid)
+            if r is None:
                 continue  # не текстовый узел → не ранжируем
+            rows.append(r)
+            dists.append(dist_to_seed.get(nid, 999))
+
+        if not rows or top_k <= 0:
+            return []
 
-            s = self.score_one(nid, query_emb, dist_to_seed)
-            scored.append((nid, s))
+        rows = np.asarray(rows, dtype=np.intp)
+        dists = np.asarray(dists, dtype=np.float64)
+        return self._rank(rows, dists, self.sims(query_emb, rows), top_k, query_text, stats)
+
+    def score_flat(
+        self,
+        query_emb: np.ndarray,
+        top_k: int = 20,
+        query_text: Optional[str] = None,
+        stats: Optional[dict] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-K по всем text-узлам без графа (расстояние 0 у всех):
+        запасной путь, когда на drill/expand нет времени. Один mat-vec
+        по всей матрице — O(N·dim), зато без обхода графа.
+        """
+        n = len(self.node_ids)
+        if not n or top_k <= 0:
+            return []
+        rows = np.arange(n, dtype=np.intp)
+        return self._rank(rows, np.zeros(n), self.sims(query_emb), top_k, query_text, stats)
+
+    def _rank(self, rows, dists, sims, top_k, query_text, stats):
+        """Общая часть score_all() / score_flat(): score строк rows и top-K."""
+        scores = (
+            self.cfg.w_text * sims
+            + self.prior_type[rows]
+            + self.prior_level[rows]
+            - self.cfg.w_dist * dists
+        )
+        if self.cfg.w_bm25 and query_text:
+            scores += self.cfg.w_bm25 * self.bm25(query_text, rows)
+
+        if self.has_clusters and self.cfg.collapse_duplicates:
+            keep = self.best_per_cluster(rows, scores)
+            if stats is not None:
+                stats["collapsed"] = len(rows) - len(keep)
+            rows, scores = rows[keep], scores[keep]
+
+        top = top_k_stable(scores, top_k)
+        return [(self.node_ids[rows[i]], float(scores[i])) for i in top]
+
+    # -------------------------------------------------------------
+    # Кластеры почти-дубликатов
+    # -------------------------------------------------------------
+    def best_per_cluster(self, rows: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """
+        Позиции, которые остаются после схлопывания кластеров: в каждом —
+        узел с максимальным score (при равенстве — первый), порядок сохранён.
+        """
+        keys = self.cluster[rows]
+        order = np.lexsort((np.arange(len(rows)), -scores))
+        _, first = np.unique(keys[order], return_index=True)
+        return np.sort(order[first])
+
+
+def top_k_stable(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Индексы top-k по убыванию score, стабильно (как list.sort):
+    argpartition отбирает порог, затем сортируются только кандидаты.
+    """
+    n = len(scores)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+        threshold = scores[part].min()
+        cand = np.flatnonzero(scores >= threshold)
+    else:
+        cand = np.arange(n)
 
-        scored.sort(key=lambda x: x[1], reverse=True)
-        return scored[:top_k]
+    order = cand[np.lexsort((cand, -scores[cand]))]
+    return order[:k]
@@ -0,0 +1,240 @@
+# src/serve/batch.py
+
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import IO, Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..rag.pipeline import OntologyRAGPipeline
+from .encoding import dumps_compact
+
+
+class BatchConfig:
+    """
+    Параметры пакетного режима (main.py --batch).
+
+    batch_size         — сколько запросов эмбеддится одним вызовом модели;
+                         после каждой пачки выход сбрасывается на диск
+    workers            — процессы для drill/expand/score/assemble
+                         (0 — всё в текущем процессе)
+    max_context_tokens — бюджет токенов, как у run_query()
+    projection         — проекция результата (см. PROJECTIONS)
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 64,
+        workers: int = 0,
+        max_context_tokens: Optional[int] = None,
+        projection: str = "sections_only",
+    ):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_context_tokens = max_context_tokens
+        self.projection = projection
+
+
+# Пайплайн для воркеров пула: выставляется до fork(), дети получают
+# его через copy-on-write и не pickle-ят индекс.
+_PIPELINE: Optional[OntologyRAGPipeline] = None
+
+
+def _run_one(task: Tuple[int, dict, np.ndarray, dict]) -> Tuple[int, bytes, float, bool]:
+    """(номер строки, входной объект, эмбеддинг, опции) → (номер, JSON-строка, мс, ошибка?)"""
+    line_no, item, q_emb, opts = task
+    t0 = time.perf_counter()
+    out = {"line": line_no}
+    if "id" in item:
+        out["id"] = item["id"]
+    failed = False
+    try:
+        out.update(_PIPELINE.run_embedded(item["query"], q_emb, **opts))
+    except Exception as e:
+        out["query"] = item.get("query")
+        out["error"] = f"{type(e).__name__}: {e}"
+        failed = True
+    return line_no, dumps_compact(out) + b"\n", (time.perf_counter() - t0) * 1000, failed
+
+
+def _parse_line(line: str) -> dict:
+    """
+    Входная строка → {"query": ..., "id"?: ...} или {"error": ..., "id"?: ...},
+    если строка не разбирается: битый JSON, не объект, нет строки "query".
+    """
+    if not line.startswith("{"):
+        return {"query": line}
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    if not isinstance(item, dict):
+        return {"error": "ValueError: expected a JSON object"}
+    query = item.get("query")
+    if not isinstance(query, str) or not query.strip():
+        out = {"error": 'ValueError: expected a non-empty string "query"'}
+        if "id" in item:
+            out["id"] = item["id"]
+        return out
+    return item
+
+
+def read_queries(f: IO[str], start: int = 0) -> Iterator[Tuple[int, dict]]:
+    """
+    Строки JSONL ({"query": ..., "id": ...}) или просто текст запроса,
+    начиная со строки start (нумерация с 0, пустые строки тоже считаются).
+    Неразборчивая строка даёт элемент с "error" вместо "query" —
+    BatchRunner пишет его как ошибку этой строки и идёт дальше.
+    """
+    for line_no, line in enumerate(f):
+        if line_no < start:
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        yield line_no, _parse_line(line)
+
+
+def resume_offset(path: str) -> int:
+    """
+    Сколько входных строк уже обработано по выходному файлу.
+    Недописанная последняя строка (падение посреди записи) отрезается.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    last = data[:end].rstrip(b"\n").rsplit(b"\n", 1)[-1]
+    if not last:
+        return 0
+    return json.loads(last)["line"] + 1
+
+
+class BatchRunner:
+    """
+    JSONL запросов → JSONL результатов, по строке на запрос, в порядке входа.
+
+    Эмбеддинги считаются в текущем процессе пачками по batch_size,
+    CPU-стадии — в пуле процессов, созданном fork()-ом до загрузки модели
+    (индекс — общий, модель — только у родителя). Порядок строк сохраняется
+    (imap), каждая строка несёт "line" — номер входной строки, по нему
+    работает возобновление после падения (resume_offset()).
+    """
+
+    def __init__(self, pipeline: OntologyRAGPipeline, config: BatchConfig = BatchConfig()):
+        self.pipeline = pipeline
+        self.cfg = config
+        self.pool = None
+
+    def start_pool(self):
+        """Форкает воркеров; вызывать до загрузки модели."""
+        global _PIPELINE
+        _PIPELINE = self.pipeline
+        if self.cfg.workers <= 0 or self.pool is not None:
+            return
+        gc.collect()
+        gc.freeze()
+        self.pool = multiprocessing.get_context("fork").Pool(self.cfg.workers)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def run(
+        self,
+        inp: IO[str],
+        out: IO[bytes],
+        start: int = 0,
+        progress: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        """
+        Обрабатывает inp начиная со строки start, пишет в out (бинарный поток).
+        Возвращает сводку: запросы, ошибки, время, QPS, латентность на запрос.
+        Неразборчивые строки пишутся как {"line": n, "error": ...} на своём
+        месте и считаются в errors, остальная пачка обрабатывается.
+        """
+        self.start_pool()
+        cfg = self.cfg
+        opts = {"max_context_tokens": cfg.max_context_tokens, "projection": cfg.projection}
+
+        latencies: List[float] = []
+        n_err = 0
+        n_invalid = 0
+        embed_s = 0.0
+        t0 = time.perf_counter()
+
+        batch: List[Tuple[int, dict]] = []
+        items = read_queries(inp, start)
+        while True:
+            batch.clear()
+            for x in items:
+                batch.append(x)
+                if len(batch) >= cfg.batch_size:
+                    break
+            if not batch:
+                break
+
+            valid = [(no, item) for no, item in batch if "error" not in item]
+            results = iter(())
+            if valid:
+                te = time.perf_counter()
+                embs = self.pipeline.model.encode([item["query"] for _, item in valid])
+                embed_s += time.perf_counter() - te
+
+                tasks = [(no, item, emb, opts) for (no, item), emb in zip(valid, embs)]
+                if self.pool is not None:
+                    results = self.pool.imap(_run_one, tasks, chunksize=max(1, len(tasks) // (4 * cfg.workers)))
+                else:
+                    results = map(_run_one, tasks)
+
+            # порядок входа: ошибки разбора — на своих местах между результатами
+            for no, item in batch:
+                if "error" in item:
+                    out.write(dumps_compact(dict(line=no, **item)) + b"\n")
+                    n_invalid += 1
+                    continue
+                _, line, ms, failed = next(results)
+                out.write(line)
+                latencies.append(ms)
+                n_err += failed
+            out.flush()
+
+            if progress is not None:
+                progress(self._summary(latencies, n_err, embed_s, t0, n_invalid))
+
+        return self._summary(latencies, n_err, embed_s, t0, n_invalid)
+
+    @staticmethod
+    def _summary(latencies: List[float], n_err: int, embed_s: float, t0: float, n_invalid: int = 0) -> dict:
+        """n_invalid — неразборчивые входные строки: входят в queries и errors, не в латентность."""
+        elapsed = time.perf_counter() - t0
+        lat = np.asarray(latencies) if latencies else np.zeros(1)
+        n = len(latencies) + n_invalid
+        return {
+            "queries": n,
+            "errors": n_err + n_invalid,
+            "elapsed_s": elapsed,
+            "qps": n / elapsed if elapsed > 0 else 0.0,
+            "embed_s": embed_s,
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p95_ms": float(np.percentile(lat, 95)),
+        }
+
+
+def print_summary(summary: dict, file=sys.stderr):
+    print(
+        f"[BatchRunner] {summary['queries']} queries ({summary['errors']} errors) "
+        f"in {summary['elapsed_s']:.1f} s — {summary['qps']:.1f} q/s; "
+        f"embedding {summary['embed_s']:.1f} s; per query p50 {summary['p50_ms']:.1f} ms, "
+        f"p95 {summary['p95_ms']:.1f} ms",
+        file=file,
+    )
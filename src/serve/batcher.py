@@ -0,0 +1,121 @@
+# src/serve/batcher.py
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Динамический micro-batching эмбеддингов запросов.
+
+    Конкурентные запросы копятся до window_ms миллисекунд
+    (или до max_batch_size штук) и эмбеддятся одним вызовом
+    embed_fn(List[str]) → np.ndarray в отдельном executor-е,
+    чтобы не блокировать event loop.
+
+    Очередь ограничена max_queue: при переполнении submit()
+    бросает asyncio.QueueFull — сервер отвечает 503.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        window_ms: float = 5.0,
+        max_batch_size: int = 32,
+        max_queue: int = 256,
+        executor: Optional[Executor] = None,
+    ):
+        self.embed_fn = embed_fn
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.max_queue = max_queue
+        self.executor = executor
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "batches": 0,
+            "items": 0,
+            "max_batch": 0,
+            "errors": 0,
+        }
+
+    # -------------------------------------------------------------
+    # Жизненный цикл (внутри event loop)
+    # -------------------------------------------------------------
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def qsize(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    # -------------------------------------------------------------
+    # submit(): future с эмбеддингом запроса
+    # -------------------------------------------------------------
+    def submit(self, text: str) -> "asyncio.Future":
+        fut = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((text, fut))     # QueueFull → backpressure
+        return fut
+
+    # -------------------------------------------------------------
+    # Цикл сборки батчей
+    # -------------------------------------------------------------
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window_ms / 1000.0
+
+            while len(batch) < self.max_batch_size:
+                # сначала забираем всё, что уже лежит в очереди
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # отменённые клиентами запросы не эмбеддим
+            batch = [(t, f) for t, f in batch if not f.done()]
+            if not batch:
+                continue
+
+            texts = [t for t, _ in batch]
+            try:
+                vecs = await loop.run_in_executor(self.executor, self.embed_fn, texts)
+            except Exception as e:
+                self.stats["errors"] += 1
+                for _, f in batch:
+                    if not f.done():
+                        f.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+            for (_, f), v in zip(batch, vecs):
+                if not f.done():
+                    f.set_result(v)
@@ -0,0 +1,14 @@
+# src/serve/encoding.py
+
+import json
+from typing import Iterable
+
+
+def dumps_compact(obj) -> bytes:
+    """JSON без пробелов и \\u-экранирования кириллицы (в 2–6 раз меньше, чем indent=2)."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_jsonl(events: Iterable[dict]) -> bytes:
+    """JSON-lines: по компактной строке на событие stream_query()."""
+    return b"".join(dumps_compact(ev) + b"\n" for ev in events)
@@ -0,0 +1,379 @@
+# src/serve/http_server.py
+
+import asyncio
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, Tuple
+
+from ..rag.pipeline import OntologyRAGPipeline, PROJECTIONS
+from .batcher import MicroBatcher
+from .encoding import dumps_compact
+
+
+class ServerConfig:
+    """
+    Параметры HTTP-сервера.
+
+    batch_window_ms — сколько ждать попутчиков для батча эмбеддингов
+    max_batch_size  — максимальный размер батча эмбеддингов
+    max_queue       — лимит запросов в работе (эмбеддинг + CPU-стадии);
+                      сверх лимита — 503 (backpressure)
+    cpu_workers     — потоки для drill/expand/score/сборки секций
+    max_body_bytes  — лимит тела запроса
+    projection      — проекция результата по умолчанию (см. PROJECTIONS)
+    deadline_ms     — бюджет времени запроса по умолчанию (None — без
+                      дедлайна), отсчёт — с приёма запроса, включая
+                      очередь эмбеддингов; см. run_query(deadline_ms=...)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        batch_window_ms: float = 5.0,
+        max_batch_size: int = 32,
+        max_queue: int = 256,
+        cpu_workers: int = 4,
+        max_body_bytes: int = 1 << 20,
+        max_context_tokens: Optional[int] = None,
+        projection: str = "full",
+        deadline_ms: Optional[float] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self.max_queue = max_queue
+        self.cpu_workers = cpu_workers
+        self.max_body_bytes = max_body_bytes
+        self.max_context_tokens = max_context_tokens
+        self.projection = projection
+        self.deadline_ms = deadline_ms
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class RAGServer:
+    """
+    Asyncio HTTP/JSON сервер вокруг OntologyRAGPipeline.
+
+        POST /query         {"query": str, "max_context_tokens": int?, "projection": str?,
+                             "deadline_ms": float?}
+        POST /query/stream  то же, события stream_query() как NDJSON (chunked)
+        GET  /health        состояние очередей и счётчики батчинга
+
+    Эмбеддинги запросов собираются MicroBatcher-ом в один вызов
+    EmbeddingModel.embed(), CPU-стадии идут в ограниченный пул потоков
+    через OntologyRAGPipeline.run_embedded().
+    """
+
+    def __init__(self, pipeline: OntologyRAGPipeline, config: ServerConfig = ServerConfig()):
+        self.pipeline = pipeline
+        self.cfg = config
+
+        # один поток под модель: батчи эмбеддятся последовательно
+        self.embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self.cpu_executor = ThreadPoolExecutor(
+            max_workers=config.cpu_workers, thread_name_prefix="rag"
+        )
+        self.batcher = MicroBatcher(
+            pipeline.model.embed,
+            window_ms=config.batch_window_ms,
+            max_batch_size=config.max_batch_size,
+            max_queue=config.max_queue,
+            executor=self.embed_executor,
+        )
+
+        self.inflight = 0
+        self.stats = {"requests": 0, "rejected": 0, "errors": 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        # pre-fork режим: pid / rss / номер воркера для /health
+        self.worker_info: Optional[Callable[[], dict]] = None
+
+    # -------------------------------------------------------------
+    # Запуск
+    # -------------------------------------------------------------
+    async def start(self, sock: Optional[socket.socket] = None):
+        """sock — уже открытый слушающий сокет (pre-fork режим)."""
+        self.batcher.start()
+        if sock is not None:
+            self._server = await asyncio.start_server(self._handle, sock=sock)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, self.cfg.host, self.cfg.port
+            )
+        return self._server
+
+    async def serve_forever(self, sock: Optional[socket.socket] = None):
+        server = await self.start(sock)
+        addr = ", ".join(str(s.getsockname()) for s in server.sockets)
+        print(f"[RAGServer] Listening on {addr}")
+        async with server:
+            await server.serve_forever()
+
+    async def drain(self, timeout: float = 30.0):
+        """Перестаёт принимать соединения и ждёт завершения запросов в работе."""
+        if self._server is not None:
+            self._server.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.inflight > 0 and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+        self.embed_executor.shutdown(wait=False)
+        self.cpu_executor.shutdown(wait=False)
+
+    # -------------------------------------------------------------
+    # HTTP
+    # -------------------------------------------------------------
+    async def _read_request(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+
+        headers = {}
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = h.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "bad Content-Length")
+        if length > self.cfg.max_body_bytes:
+            raise HTTPError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+        return method, path.split("?", 1)[0], body, keep_alive
+
+    def _write_response(self, writer, status: int, payload, keep_alive: bool,
+                        extra_headers: Tuple[str, ...] = ()):
+        body = dumps_compact(payload)
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+            *extra_headers,
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def _write_stream(self, writer, events, keep_alive: bool):
+        """Chunked-ответ: по строке JSON на событие, с drain() после каждой."""
+        head = [
+            "HTTP/1.1 200 OK",
+            "Content-Type: application/x-ndjson; charset=utf-8",
+            "Transfer-Encoding: chunked",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        try:
+            try:
+                async for ev in events:
+                    data = dumps_compact(ev) + b"\n"
+                    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+                    await writer.drain()
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                # заголовки уже ушли — ошибку отдаём последним событием
+                self.stats["errors"] += 1
+                data = dumps_compact({"event": "error", "error": repr(e)}) + b"\n"
+                writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            writer.write(b"0\r\n\r\n")
+        finally:
+            await events.aclose()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    req = await self._read_request(reader)
+                except HTTPError as e:
+                    self._write_response(writer, e.status, {"error": e.message}, False)
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if req is None:
+                    break
+
+                method, path, body, keep_alive = req
+                extra = ()
+                try:
+                    status, payload = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                    if e.status == 503:
+                        extra = ("Retry-After: 1",)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    status, payload = 500, {"error": repr(e)}
+
+                if hasattr(payload, "__aiter__"):
+                    await self._write_stream(writer, payload, keep_alive)
+                else:
+                    self._write_response(writer, status, payload, keep_alive, extra)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except asyncio.CancelledError:
+            # остановка воркера: простаивающие keep-alive соединения просто закрываем
+            pass
+        finally:
+            writer.close()
+
+    # -------------------------------------------------------------
+    # Маршрутизация
+    # -------------------------------------------------------------
+    async def dispatch(self, method: str, path: str, body: bytes):
+        t0 = time.perf_counter()
+        if path == "/health":
+            return 200, self.health()
+
+        if path not in ("/query", "/query/stream"):
+            raise HTTPError(404, "not found")
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+
+        try:
+            req = json.loads(body or b"{}")
+            query = req["query"]
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, 'expected JSON body {"query": ...}')
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "query must be a non-empty string")
+
+        projection = req.get("projection", self.cfg.projection)
+        if projection not in PROJECTIONS:
+            raise HTTPError(400, f"projection must be one of {list(PROJECTIONS)}")
+
+        deadline_ms = req.get("deadline_ms", self.cfg.deadline_ms)
+        if deadline_ms is not None and (
+            isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or deadline_ms <= 0
+        ):
+            raise HTTPError(400, "deadline_ms must be a positive number")
+
+        max_context_tokens = req.get("max_context_tokens", self.cfg.max_context_tokens)
+        if max_context_tokens is not None and (
+            isinstance(max_context_tokens, bool) or not isinstance(max_context_tokens, int) or max_context_tokens <= 0
+        ):
+            raise HTTPError(400, "max_context_tokens must be a positive integer or null")
+
+        opts = {
+            "max_context_tokens": max_context_tokens,
+            "projection": projection,
+            "deadline_ms": deadline_ms,
+            "t0": t0,
+        }
+        if path == "/query/stream":
+            return 200, await self.query_stream(query, **opts)
+        return 200, await self.query(query, **opts)
+
+    def _admit(self):
+        if self.inflight >= self.cfg.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPError(503, "server overloaded")
+        self.inflight += 1
+        self.stats["requests"] += 1
+
+    async def _embed(self, query: str):
+        try:
+            fut = self.batcher.submit(query)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise HTTPError(503, "embedding queue full")
+        return await fut
+
+    async def query(self, query: str, **opts) -> dict:
+        self._admit()
+        try:
+            q_emb = await self._embed(query)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.cpu_executor,
+                partial(self.pipeline.run_embedded, query, q_emb, **opts),
+            )
+        finally:
+            self.inflight -= 1
+
+    async def query_stream(self, query: str, **opts):
+        """
+        Эмбеддинг — до ответа (чтобы 503 успел уйти статусом),
+        дальше async-итератор по событиям stream_embedded():
+        каждый шаг генератора выполняется в CPU-пуле.
+        """
+        self._admit()
+        try:
+            q_emb = await self._embed(query)
+        except BaseException:
+            self.inflight -= 1
+            raise
+        return self._stream_events(query, q_emb, **opts)
+
+    async def _stream_events(self, query: str, q_emb, **opts):
+        loop = asyncio.get_running_loop()
+        gen = self.pipeline.stream_embedded(query, q_emb, **opts)
+        try:
+            while True:
+                ev = await loop.run_in_executor(self.cpu_executor, next, gen, None)
+                if ev is None:
+                    break
+                yield ev
+        finally:
+            gen.close()
+            self.inflight -= 1
+
+    def health(self) -> dict:
+        out = {
+            "status": "ok",
+            "inflight": self.inflight,
+            "embed_queue": self.batcher.qsize(),
+            "batching": dict(self.batcher.stats),
+            "server": dict(self.stats),
+        }
+        cache = getattr(self.pipeline, "result_cache", None)
+        if cache is not None:
+            out["result_cache"] = cache.metrics()
+        deadlines = getattr(self.pipeline, "deadline_stats", None)
+        if deadlines is not None:
+            out["deadline"] = deadlines.metrics()
+        inst = getattr(self.pipeline, "instrument", None)
+        if inst is not None and inst.active:
+            out["instrument"] = inst.summary()
+        if self.worker_info is not None:
+            out["worker"] = self.worker_info()
+        return out
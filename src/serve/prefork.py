@@ -0,0 +1,242 @@
+# src/serve/prefork.py
+
+import asyncio
+import gc
+import os
+import random
+import resource
+import signal
+import socket
+import time
+import traceback
+from typing import Callable, Dict, Optional, Tuple
+
+from .http_server import RAGServer, ServerConfig
+
+
+# код выхода воркера, ушедшего на плановый перезапуск
+EXIT_RECYCLE = 3
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса (Linux: /proc/self/statm, иначе — пик из getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss на Linux — в килобайтах
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PreforkConfig:
+    """
+    Параметры pre-fork режима.
+
+    workers             — число процессов-воркеров
+    max_requests        — перезапуск воркера после стольких запросов (0 — никогда)
+    max_requests_jitter — случайная добавка к max_requests, чтобы воркеры
+                          не перезапускались все одновременно
+    max_rss_mb          — перезапуск воркера при превышении RSS (None — без лимита)
+    check_interval_s    — как часто воркер проверяет лимиты
+    drain_timeout_s     — сколько ждать запросов в работе при остановке воркера
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_requests: int = 10_000,
+        max_requests_jitter: int = 500,
+        max_rss_mb: Optional[float] = None,
+        check_interval_s: float = 1.0,
+        drain_timeout_s: float = 30.0,
+        backlog: int = 1024,
+    ):
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_rss_mb = max_rss_mb
+        self.check_interval_s = check_interval_s
+        self.drain_timeout_s = drain_timeout_s
+        self.backlog = backlog
+
+
+class PreforkServer:
+    """
+    Pre-fork мастер для RAGServer.
+
+    Мастер один раз загружает индекс (лучше — from_index(mmap=True)),
+    замораживает кучу (gc.freeze) и открывает слушающий сокет,
+    после чего форкает воркеров. Индекс воркерам достаётся через
+    copy-on-write. Общими гарантированно остаются только матрицы
+    эмбеддингов (страницы memmap, read-only). sections, text_nodes,
+    граф и лексический индекс — распикленные Python-объекты: gc.freeze
+    убирает лишь проходы сборщика, а каждое чтение объекта меняет его
+    счётчик ссылок и копирует страницу в воркер. Поэтому RSS воркера
+    со временем растёт до «модель + рабочая часть этих объектов», а не
+    остаётся на уровне размера модели; от этого — max_requests / max_rss_mb.
+
+    make_server(worker_no) вызывается уже в дочернем процессе
+    и должен вернуть RAGServer (здесь же грузится модель — она у каждого
+    воркера своя). Воркеры принимают соединения с общего сокета,
+    мастер только следит за ними и поднимает упавших/перезапущенных.
+    """
+
+    def __init__(
+        self,
+        make_server: Callable[[int], RAGServer],
+        server_cfg: ServerConfig = ServerConfig(),
+        config: PreforkConfig = PreforkConfig(),
+    ):
+        self.make_server = make_server
+        self.server_cfg = server_cfg
+        self.cfg = config
+
+        self.sock: Optional[socket.socket] = None
+        # pid → (номер воркера, время запуска)
+        self.children: Dict[int, Tuple[int, float]] = {}
+        self._stopping = False
+
+        self.stats = {"spawned": 0, "recycled": 0, "crashed": 0}
+
+    # -------------------------------------------------------------
+    # Мастер
+    # -------------------------------------------------------------
+    def bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.server_cfg.host, self.server_cfg.port))
+        sock.listen(self.cfg.backlog)
+        sock.setblocking(False)
+        return sock
+
+    def run(self, sock: Optional[socket.socket] = None):
+        self.sock = sock if sock is not None else self.bind()
+        print(f"[PreforkServer] Listening on {self.sock.getsockname()}, "
+              f"{self.cfg.workers} workers, master pid={os.getpid()}")
+
+        # Всё, что загружено до fork, — в постоянное поколение:
+        # сборщик мусора воркеров не обходит эти объекты и не пачкает их страницы.
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        for no in range(self.cfg.workers):
+            self._spawn(no)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            child = self.children.pop(pid, None)
+            if child is None:
+                continue
+            no, started = child
+
+            code = os.waitstatus_to_exitcode(status)
+            if code == EXIT_RECYCLE:
+                self.stats["recycled"] += 1
+            elif code != 0:
+                self.stats["crashed"] += 1
+                print(f"[PreforkServer] worker {no} pid={pid} exited with {code}")
+
+            if not self._stopping:
+                # не уходим в горячий цикл, если воркер падает сразу при старте
+                if time.monotonic() - started < 1.0:
+                    time.sleep(1.0)
+                self._spawn(no)
+
+        self.sock.close()
+        print(f"[PreforkServer] Stopped: {self.stats}")
+
+    def _on_stop(self, signum, frame):
+        if self._stopping:
+            return
+        self._stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _spawn(self, no: int):
+        # SIGTERM мог прийти, пока мастер ждал перед перезапуском
+        if self._stopping:
+            return
+
+        # Сигналы остановки блокируются на время fork: в мастере _on_stop
+        # должен увидеть pid нового воркера, а воркер — не выполнить
+        # унаследованный обработчик мастера до сброса своих.
+        stop_signals = {signal.SIGTERM, signal.SIGINT}
+        signal.pthread_sigmask(signal.SIG_BLOCK, stop_signals)
+        pid = os.fork()
+        if pid:
+            self.children[pid] = (no, time.monotonic())
+            self.stats["spawned"] += 1
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, stop_signals)
+            return
+
+        # --- дочерний процесс ---
+        code = 1
+        try:
+            # Ctrl+C приходит всей группе процессов — останавливает воркеров мастер
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, stop_signals)
+            code = asyncio.run(self._worker(no))
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+
+    # -------------------------------------------------------------
+    # Воркер
+    # -------------------------------------------------------------
+    async def _worker(self, no: int) -> int:
+        server = self.make_server(no)
+
+        max_requests = self.cfg.max_requests
+        if max_requests and self.cfg.max_requests_jitter:
+            max_requests += random.randint(0, self.cfg.max_requests_jitter)
+
+        server.worker_info = lambda: {
+            "worker": no,
+            "pid": os.getpid(),
+            "rss_mb": round(rss_bytes() / 2**20, 1),
+            "max_requests": max_requests,
+        }
+
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+        await server.start(sock=self.sock)
+        print(f"[PreforkServer] worker {no} pid={os.getpid()} ready "
+              f"(rss={rss_bytes() / 2**20:.0f} MB)")
+
+        reason = None
+        while reason is None:
+            try:
+                await asyncio.wait_for(stop.wait(), self.cfg.check_interval_s)
+                reason = "stop"
+            except asyncio.TimeoutError:
+                reason = self._recycle_reason(server, max_requests)
+
+        await server.drain(self.cfg.drain_timeout_s)
+        await server.close()
+
+        if reason == "stop":
+            return 0
+        print(f"[PreforkServer] worker {no} pid={os.getpid()} recycling: {reason}")
+        return EXIT_RECYCLE
+
+    def _recycle_reason(self, server: RAGServer, max_requests: int) -> Optional[str]:
+        if max_requests and server.stats["requests"] >= max_requests:
+            return f"served {server.stats['requests']} requests"
+        if self.cfg.max_rss_mb is not None:
+            rss_mb = rss_bytes() / 2**20
+            if rss_mb > self.cfg.max_rss_mb:
+                return f"rss {rss_mb:.0f} MB > {self.cfg.max_rss_mb:.0f} MB"
+        return None
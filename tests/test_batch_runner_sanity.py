@@ -0,0 +1,112 @@
+# test_batch_runner_sanity.py
+
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.pipeline import OntologyRAGPipeline
+from src.serve.batch import BatchRunner, BatchConfig, resume_offset
+from src.serve.encoding import dumps_compact
+
+
+class LookupModel:
+    """Запрос = id корневой секции, эмбеддинг — её E_local."""
+
+    def __init__(self, sections):
+        self.sections = sections
+
+    def encode(self, texts):
+        return np.stack([self.sections[t].E_local for t in texts])
+
+
+print("=== 1. Load ontology + random embeddings ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(32).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = rng.standard_normal(32).astype(np.float32)
+    sec.E_subtree = sec.E_local
+
+pipeline = OntologyRAGPipeline(sections, text_nodes, graph_adj, embedding_model=LookupModel(sections))
+
+roots = [s.id for s in sections.values() if s.level == 1]
+lines = []
+for i, sid in enumerate(roots * 3):
+    lines.append(json.dumps({"id": i, "query": sid}) if i % 2 else sid)
+lines.insert(5, "")  # пустая строка: пропускается, но номер строки занимает
+inp = "\n".join(lines) + "\n"
+n_queries = len(lines) - 1
+
+
+print("\n=== 2. In-process run: order, ids, compact lines ===")
+out = io.BytesIO()
+summary = BatchRunner(pipeline, BatchConfig(batch_size=8, max_context_tokens=2000)).run(io.StringIO(inp), out)
+print(summary)
+rows = [json.loads(l) for l in out.getvalue().splitlines()]
+assert summary["queries"] == len(rows) == n_queries and summary["errors"] == 0
+assert [r["line"] for r in rows] == [i for i in range(len(lines)) if lines[i]]
+assert all(("id" in r) == lines[r["line"]].startswith("{") for r in rows)
+assert all(r["section_candidates"] for r in rows), "Every root query must find sections!"
+assert out.getvalue() == b"".join(dumps_compact(r) + b"\n" for r in rows), "Lines must be compact!"
+
+
+print("\n=== 3. Process pool gives the same lines ===")
+runner = BatchRunner(pipeline, BatchConfig(batch_size=8, workers=2, max_context_tokens=2000))
+out2 = io.BytesIO()
+try:
+    runner.run(io.StringIO(inp), out2)
+finally:
+    runner.close()
+assert out2.getvalue() == out.getvalue(), "Pool output differs!"
+
+
+print("\n=== 4. Resume after a crash mid-line ===")
+with tempfile.TemporaryDirectory() as d:
+    path = os.path.join(d, "out.jsonl")
+    done = out.getvalue().splitlines(keepends=True)
+    with open(path, "wb") as f:
+        f.writelines(done[:10])
+        f.write(done[10][:15])  # недописанная строка
+    start = resume_offset(path)
+    print("Resume from line", start)
+    assert start == rows[9]["line"] + 1
+    with open(path, "ab") as f:
+        BatchRunner(pipeline, BatchConfig(batch_size=8, max_context_tokens=2000)).run(
+            io.StringIO(inp), f, start=start
+        )
+    with open(path, "rb") as f:
+        assert f.read() == out.getvalue(), "Resumed output differs!"
+
+
+print("\n=== 5. Malformed lines: per-line errors, the batch goes on ===")
+bad = list(lines)
+bad.insert(2, '{"query": "oops"')             # битый JSON
+bad.insert(7, json.dumps({"id": "no-query"}))  # нет "query"
+bad.insert(9, json.dumps({"query": 5}))        # query не строка
+out3 = io.BytesIO()
+summary = BatchRunner(pipeline, BatchConfig(batch_size=8, max_context_tokens=2000)).run(
+    io.StringIO("\n".join(bad) + "\n"), out3
+)
+print(summary)
+rows3 = [json.loads(l) for l in out3.getvalue().splitlines()]
+errors = [r for r in rows3 if "error" in r]
+assert [r["line"] for r in rows3] == [i for i in range(len(bad)) if bad[i]], "Every line, in input order!"
+assert [r["line"] for r in errors] == [2, 7, 9]
+assert errors[1]["id"] == "no-query"
+assert summary["errors"] == 3 and summary["queries"] == len(rows3) == n_queries + 3
+strip = lambda r: {k: v for k, v in r.items() if k != "line"}
+assert [strip(r) for r in rows3 if "error" not in r] == [strip(r) for r in rows], "Valid lines unaffected!"
+
+
+print("\n=== BATCH RUNNER TEST PASSED ===")
@@ -0,0 +1,49 @@
+# test_batcher_sanity.py
+
+from src.serve.batcher import MicroBatcher
+import asyncio
+import numpy as np
+
+
+calls = []
+
+
+def fake_embed(texts):
+    """Детерминированный «эмбеддинг»: длина текста. Запоминает размеры батчей."""
+    calls.append(len(texts))
+    return np.array([[len(t)] for t in texts], dtype=np.float32)
+
+
+async def main():
+    print("=== 1. Concurrent requests share one batch ===")
+    batcher = MicroBatcher(fake_embed, window_ms=20, max_batch_size=8, max_queue=16)
+    batcher.start()
+
+    texts = [f"запрос {'x' * i}" for i in range(5)]
+    vecs = await asyncio.gather(*(batcher.submit(t) for t in texts))
+    print("Batch sizes:", calls)
+    assert calls == [5], "Five concurrent queries must be embedded in one call!"
+    assert [int(v[0]) for v in vecs] == [len(t) for t in texts], "Results must match requests!"
+
+    print("\n=== 2. max_batch_size splits batches ===")
+    calls.clear()
+    await asyncio.gather(*(batcher.submit(str(i)) for i in range(12)))
+    print("Batch sizes:", calls)
+    assert max(calls) <= 8 and sum(calls) == 12
+
+    print("\n=== 3. Queue limit → QueueFull ===")
+    await batcher.stop()
+    small = MicroBatcher(fake_embed, window_ms=1, max_batch_size=2, max_queue=2)
+    small.queue = asyncio.Queue(maxsize=2)       # очередь без потребителя
+    small.submit("a")
+    small.submit("b")
+    try:
+        small.submit("c")
+        raise AssertionError("Third submit must overflow the queue!")
+    except asyncio.QueueFull:
+        print("QueueFull raised: OK")
+
+
+asyncio.run(main())
+
+print("\n=== BATCHER TEST PASSED ===")
@@ -0,0 +1,80 @@
+# test_context_packing_sanity.py
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.pipeline import OntologyRAGPipeline
+
+
+print("=== 1. Load ontology ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+# packing / assembly не требуют эмбеддингов
+pipeline = OntologyRAGPipeline(sections, text_nodes, graph_adj, embedding_model=None)
+
+
+print("\n=== 2. Fake ranked nodes ===")
+ranked = []
+for i, (nid, tn) in enumerate(text_nodes.items()):
+    if tn.section_id is None or i % 7:
+        continue
+    ranked.append({
+        "node_id": nid,
+        "section_id": tn.section_id,
+        "type": tn.node_type,
+        "text": tn.text,
+        "score": 1.0 - i / 10_000,
+    })
+    if len(ranked) >= 40:
+        break
+
+plans = pipeline.rank_sections(ranked)
+full = pipeline.build_full_sections(ranked)
+full_tokens = sum(
+    pipeline.node_tokens(nid)
+    for p in plans for nid in pipeline.section_chunk_ids(p["section_id"])
+)
+print("Sections:", len(plans), "Full payload tokens:", full_tokens)
+
+
+print("\n=== 3. Unlimited budget == full sections ===")
+packed, budget = pipeline.pack_sections(plans, max_tokens=10 ** 9)
+print("Budget:", budget)
+assert budget["used_tokens"] == full_tokens
+assert [pipeline.assemble_section(p)["text"] for p in packed] == [c["text"] for c in full]
+assert all(p["packing"] == "full" for p in packed)
+
+
+print("\n=== 4. Tight budget ===")
+limit = full_tokens // 5
+packed, budget = pipeline.pack_sections(plans, max_tokens=limit)
+print("Budget:", budget)
+assert budget["used_tokens"] <= limit, "Packing exceeded the budget!"
+assert sum(p["n_tokens"] for p in packed) == budget["used_tokens"]
+assert any(p["packing"] == "window" for p in packed), "Expected chunk windows under a tight budget"
+
+for p in packed:
+    cand = pipeline.assemble_section(p)
+    hit = [nid for nid in p["node_ids"] if nid in p["chunk_ids"]]
+    for nid in hit:
+        assert text_nodes[nid].text.strip() in cand["text"]
+
+
+print("\n=== 5. Section → chunk table and text cache ===")
+for sid, ids in pipeline.section_chunks.items():
+    assert all(text_nodes[nid].section_id == sid for nid in ids)
+    keys = [(text_nodes[nid].page_start, text_nodes[nid].order) for nid in ids]
+    assert keys == sorted(keys), f"Chunks of {sid} are not in document order!"
+
+pipeline.section_text_cache_size = 3
+pipeline._section_text_cache.clear()
+for c in pipeline.build_full_sections(ranked):
+    assert pipeline.section_title_and_text(c["section_id"]) == (c["title"], c["text"])
+print("Cached section texts:", len(pipeline._section_text_cache))
+assert len(pipeline._section_text_cache) <= 3, "Section text cache must stay bounded!"
+
+
+print("\n=== CONTEXT PACKING TEST PASSED ===")
@@ -0,0 +1,136 @@
+# test_deadline_sanity.py
+
+import time
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.pipeline import OntologyRAGPipeline, PLAN_ID_FIELDS
+from src.rag.deadline import DEGRADATIONS
+from src.rag.cache import SemanticCache
+from src.rag.instrument import Instrumentation
+
+
+class FixedModel:
+    """Запрос «похож» на заданный вектор; delay_s — медленный эмбеддинг."""
+
+    def __init__(self, target, delay_s: float = 0.0):
+        self.target = target
+        self.delay_s = delay_s
+
+    def encode(self, text):
+        time.sleep(self.delay_s)
+        return self.target
+
+
+print("=== 1. Load ontology + random embeddings ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(32).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = rng.standard_normal(32).astype(np.float32)
+    sec.E_subtree = sec.E_local
+
+root = next(s for s in sections.values() if s.level == 1)
+query = "настройки рассылки"
+
+
+def make_pipeline(**kwargs):
+    return OntologyRAGPipeline(
+        sections, text_nodes, graph_adj, embedding_model=FixedModel(root.E_local), top_k_text=40, **kwargs
+    )
+
+
+print("\n=== 2. Generous deadline: same result, nothing degraded ===")
+pipeline = make_pipeline()
+ref = pipeline.run_query(query, max_context_tokens=2000)
+res = pipeline.run_query(query, max_context_tokens=2000, deadline_ms=60_000)
+assert "deadline" not in ref
+print("Deadline report:", res["deadline"])
+assert res["deadline"]["met"] and res["deadline"]["degraded"] == []
+assert res["text_nodes"] == ref["text_nodes"]
+assert [s["section_id"] for s in res["section_candidates"]] == [s["section_id"] for s in ref["section_candidates"]]
+assert res["graph_context"] == ref["graph_context"]
+assert set(pipeline.stage_costs.snapshot()) >= {"drill", "expand", "score", "assemble"}
+
+
+print("\n=== 3. Budget gone during embed: flat fallback, still a valid result ===")
+pipeline.model = FixedModel(root.E_local, delay_s=0.03)
+pipeline.stage_costs.observe("flat", 0.0)   # плоский скоринг дешевле графового пути
+res = pipeline.run_query(query, max_context_tokens=2000, deadline_ms=10)
+print("Degraded:", res["deadline"]["degraded"])
+assert res["deadline"]["degraded"][0] == "flat_fallback"
+assert "assembly_skipped" in res["deadline"]["degraded"]
+assert not res["deadline"]["met"]
+
+flat = pipeline.scorer.score_flat(root.E_local, top_k=40, query_text=query)
+assert [x["node_id"] for x in res["text_nodes"]] == [nid for nid, _ in flat]
+assert res["section_candidates"], "Flat fallback must still return sections"
+for sec in res["section_candidates"]:
+    assert "text" not in sec and set(sec) <= set(PLAN_ID_FIELDS)
+assert res["graph_context"] == {"nodes": [], "edges": []}
+
+# на большом корпусе flat дороже графа: тогда ужатый drill и обход на один слой
+pipeline.stage_costs.observe("flat", 1e6)
+pipeline.stage_costs.observe("flat", 1e6)
+res = pipeline.run_query(query, max_context_tokens=2000, deadline_ms=10)
+print("Degraded (flat too slow):", res["deadline"]["degraded"])
+assert res["deadline"]["degraded"][:2] == ["drill_shrunk", "expand_cut"]
+assert res["text_nodes"] and all(x["section_id"] for x in res["text_nodes"])
+
+
+print("\n=== 4. Slow stage estimates: drill shrunk, expansion cut ===")
+inst = Instrumentation(timings=True)
+pipeline = make_pipeline(instrument=inst)
+full = pipeline.run_query(query, max_context_tokens=2000)
+for stage in ("drill", "expand", "score"):
+    pipeline.stage_costs.observe(stage, 1000.0)
+res = pipeline.run_query(query, max_context_tokens=2000, deadline_ms=1500)
+print("Degraded:", res["deadline"]["degraded"], "counters:", res["counters"])
+assert res["deadline"]["degraded"] == ["drill_shrunk", "expand_cut"]
+assert res["counters"]["seeds"] <= full["counters"]["seeds"]
+assert res["counters"]["expanded_nodes"] <= int(pipeline.max_graph_nodes * 0.75)
+assert res["counters"]["degraded_drill_shrunk"] == 1 and res["counters"]["degraded_expand_cut"] == 1
+assert all("text" in s for s in res["section_candidates"]), "Assembly had time, must not be skipped"
+# общий экспандер не тронут, оценки деградировавших стадий не занижены
+assert (pipeline.expander.max_depth, pipeline.expander.max_nodes) == (pipeline.max_graph_depth, pipeline.max_graph_nodes)
+assert pipeline.stage_costs.get("expand") == 1000.0
+
+
+print("\n=== 5. Degradation counters ===")
+stats = pipeline.deadline_stats.metrics()
+print("Deadline stats:", stats)
+assert stats["queries"] == 1 and stats["degraded_queries"] == 1
+assert set(stats["degraded"]) == set(DEGRADATIONS)
+assert stats["degraded"]["drill_shrunk"] == 1 and stats["degraded"]["flat_fallback"] == 0
+
+
+print("\n=== 6. Degraded results are not cached ===")
+cache = SemanticCache(threshold=0.99)
+pipeline = make_pipeline(result_cache=cache)
+pipeline.model = FixedModel(root.E_local, delay_s=0.02)
+res = pipeline.run_query(query, deadline_ms=5)
+assert res["deadline"]["degraded"] and cache.stats["puts"] == 0
+pipeline.model = FixedModel(root.E_local)
+res = pipeline.run_query(query, deadline_ms=60_000)
+assert res["deadline"]["degraded"] == [] and cache.stats["puts"] == 1
+hit = pipeline.run_query(query, deadline_ms=60_000)
+assert hit["cache"]["hit"] and hit["deadline"]["met"]
+assert pipeline.deadline_stats.metrics()["queries"] == 3
+
+
+print("\n=== 7. Streaming: report in the done event ===")
+pipeline = make_pipeline()
+events = list(pipeline.stream_query(query, deadline_ms=60_000))
+assert events[-1]["event"] == "done" and events[-1]["deadline"]["degraded"] == []
+assert "deadline" not in list(pipeline.stream_query(query))[-1]
+
+
+print("\n=== DEADLINE TEST PASSED ===")
@@ -0,0 +1,69 @@
+# test_dedup_sanity.py
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.data.models import TextNode
+from src.index.dedup import DedupConfig, find_near_duplicates
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.score import NodeScorer, ScoreConfig
+
+
+BASE = "Запорная арматура должна проходить гидравлические испытания на прочность и плотность"
+
+print("=== 1. Near-duplicates cluster, distinct texts don't ===")
+texts = {
+    "a": BASE + ".",
+    "b": BASE + "!",                      # почти тот же текст
+    "c": "  " + BASE.upper() + ".  ",     # регистр и пробелы нормализуются
+    "d": "Трубопроводы прокладываются с уклоном не менее 0,002 в сторону дренажа",
+    "e": "коротко",                       # короче min_chars — не проверяется
+}
+nodes = {nid: TextNode(id=nid, section_id=None, node_type="chunk", text=t) for nid, t in texts.items()}
+cluster_of, stats = find_near_duplicates(nodes, DedupConfig())
+print(cluster_of, stats)
+assert cluster_of == {"a": "a", "b": "a", "c": "a"}
+assert stats["clusters"] == 1 and stats["duplicates"] == 2 and stats["checked"] == 4
+assert stats["embeddings_saved"] == 2
+
+print("\n=== 2. Deterministic on the real ontology ===")
+sections, text_nodes, graph_adj = load_ontology("graphrag_nodes.json", "graphrag_edges.json")
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+c1, s1 = find_near_duplicates(text_nodes)
+c2, s2 = find_near_duplicates(text_nodes)
+print(s1)
+assert c1 == c2 and s1 == s2
+ids = list(text_nodes)
+assert all(ids.index(rep) <= ids.index(nid) for nid, rep in c1.items()), "Representative must come first!"
+
+print("\n=== 3. Scorer keeps the best node per cluster ===")
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(32).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = rng.standard_normal(32).astype(np.float32)
+    sec.E_subtree = sec.E_local
+q = rng.standard_normal(32).astype(np.float32)
+candidates = list(text_nodes) + list(sections)
+dist = {nid: i % 3 for i, nid in enumerate(candidates)}
+
+plain = NodeScorer(sections, text_nodes, ScoreConfig()).score_all(q, dist, candidates, top_k=len(candidates))
+
+for nid, rep in c1.items():
+    text_nodes[nid].cluster_id = rep
+scorer = NodeScorer(sections, text_nodes, ScoreConfig())
+st = {}
+collapsed = scorer.score_all(q, dist, candidates, top_k=len(candidates), stats=st)
+print("collapsed:", st)
+assert st["collapsed"] == s1["duplicates"]
+
+best = {}
+for nid, s in plain:
+    key = c1.get(nid, nid)
+    best.setdefault(key, (nid, s))
+assert collapsed == [(n, s) for n, s in plain if best[c1.get(n, n)][0] == n]
+
+off = NodeScorer(sections, text_nodes, ScoreConfig(collapse_duplicates=False))
+assert off.score_all(q, dist, candidates, top_k=len(candidates)) == plain, "Disabled collapse must not change ranking!"
+
+print("\n=== DEDUP TEST PASSED ===")
@@ -0,0 +1,84 @@
+# test_embedding_backend_sanity.py
+
+import os
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.index.embeddings import (
+    EmbeddingBackend, EmbeddingModel, HashingBackend, HASH_MODEL, BACKEND_ENV, DEFAULT_MODEL, resolve_model_name,
+)
+from src.index import lexical_index, textutil
+from src.index.section_index import SectionIndex
+from src.index.text_index import TextIndex
+from src.rag.pipeline import OntologyRAGPipeline
+
+
+print("=== 1. Shape, normalization, determinism ===")
+model = EmbeddingModel(HASH_MODEL)
+texts = [
+    "Запорная арматура должна проходить испытания",
+    "Запорная арматура проходит гидравлические испытания",
+    "Трубопроводы прокладываются с уклоном",
+    "",
+]
+vecs = model.encode(texts)
+print(vecs.shape, vecs.dtype)
+assert vecs.shape == (4, 768) and vecs.dtype == np.float32 and model.dim == 768
+assert np.allclose(np.linalg.norm(vecs, axis=1), 1.0, atol=1e-5), "Vectors must be L2-normalized!"
+assert np.array_equal(vecs, EmbeddingModel(HASH_MODEL).encode(texts)), "Backend must be deterministic!"
+assert np.allclose(np.stack([model.encode(t) for t in texts]), vecs, atol=1e-6), "Batch must equal single!"
+assert model.count_tokens(texts) == [5, 5, 4, 0]
+
+print("\n=== 2. Similar spelling → higher cosine, offset is linear ===")
+sims = vecs @ vecs.T
+print(np.round(sims, 3))
+assert sims[0, 1] > sims[0, 2] + 0.2
+raw = HashingBackend(cos_offset=0.0).encode(texts[:3])
+assert np.allclose(vecs[:3] @ vecs[:3].T, 0.6 * (raw @ raw.T) + 0.4, atol=1e-3)
+
+print("\n=== 3. Env override ===")
+saved = os.environ.pop(BACKEND_ENV, None)
+try:
+    assert resolve_model_name(DEFAULT_MODEL) == DEFAULT_MODEL
+    os.environ[BACKEND_ENV] = HASH_MODEL
+    assert resolve_model_name(DEFAULT_MODEL) == HASH_MODEL
+    assert isinstance(EmbeddingModel(DEFAULT_MODEL).backend, HashingBackend)
+finally:
+    os.environ.pop(BACKEND_ENV, None)
+    if saved is not None:
+        os.environ[BACKEND_ENV] = saved
+
+print("\n=== 4. Full build + query without model files ===")
+sections, text_nodes, graph_adj = load_ontology("graphrag_nodes.json", "graphrag_edges.json")
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+sections = SectionIndex(model).compute_section_embeddings(sections)
+text_nodes = TextIndex(model).compute_textnode_embeddings(text_nodes)
+
+pipeline = OntologyRAGPipeline(sections, text_nodes, graph_adj, model)
+res = pipeline.run_query("Как работает функциональная структура Maxbot?")
+print("Sections:", len(res["section_candidates"]), "text nodes:", len(res["text_nodes"]))
+assert res["section_candidates"] and res["text_nodes"], "Hash backend must drive the pipeline!"
+
+print("\n=== 5. Backend interface is abstract, tokenizer is shared ===")
+try:
+    EmbeddingBackend()
+    raise AssertionError("EmbeddingBackend must be abstract!")
+except TypeError as e:
+    print("TypeError:", e)
+
+
+class EncodeOnly(EmbeddingBackend):
+    def encode(self, texts):
+        return np.zeros((len(texts), 1), dtype=np.float32)
+
+
+try:
+    EncodeOnly()
+    raise AssertionError("A backend without count_tokens() must not instantiate!")
+except TypeError:
+    pass
+assert lexical_index.tokenize is textutil.tokenize, "BM25 and HashingBackend must share one tokenizer!"
+
+print("\n=== EMBEDDING BACKEND TEST PASSED ===")
@@ -0,0 +1,96 @@
+# test_expand_best_first_sanity.py
+
+import math
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.expand import GraphExpander
+from src.rag.score import NodeScorer, ScoreConfig
+import numpy as np
+
+
+print("=== 1. Load ontology ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+
+print("\n=== 2. Random embeddings, sections = mean of their chunks ===")
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(64).astype(np.float32)
+for sec in sections.values():
+    embs = [tn.embedding for tn in text_nodes.values() if tn.section_id == sec.id]
+    sec.E_subtree = np.mean(embs, axis=0) if embs else None
+
+cfg = ScoreConfig()
+scorer = NodeScorer(sections, text_nodes, cfg)
+
+roots = [s.id for s in sections.values() if s.level == 1][:3]
+target = next(tn for tn in text_nodes.values() if tn.section_id == roots[0] and tn.text)
+q_emb = target.embedding + 0.1 * rng.standard_normal(64).astype(np.float32)
+
+
+print("\n=== 3. estimate() == score_all() for text nodes ===")
+ids = [nid for nid in text_nodes][:50]
+est, is_text = scorer.estimate(q_emb, ids, 2)
+assert is_text.all(), "Text nodes must be flagged!"
+ref = dict(scorer.score_all(q_emb, {nid: 2 for nid in ids}, ids, top_k=len(ids)))
+assert all(math.isclose(est[i], ref[nid], abs_tol=1e-9) for i, nid in enumerate(ids)), "Estimate mismatch!"
+est, is_text = scorer.estimate(q_emb, roots, 0)
+assert not is_text.any() and not np.isnan(est).any(), "Sections must get a subtree estimate!"
+
+
+def estimator(node_ids, dist):
+    return scorer.estimate(q_emb, node_ids, dist)
+
+
+print("\n=== 4. No early stop == BFS ===")
+bfs = GraphExpander(graph_adj, max_depth=3, max_nodes=100_000)
+n1, e1, d1 = bfs.expand(roots)
+n2, e2, d2 = bfs.expand_best_first(roots, estimator, top_k=20, w_dist=cfg.w_dist, slack=math.inf)
+assert n1 == n2, "Node sets differ!"
+assert d1 == d2, "Distances differ!"
+assert {id(e) for e in e1} == {id(e) for e in e2}, "Edge sets differ!"
+
+
+print("\n=== 5. Early stop touches fewer nodes, keeps the best node ===")
+expander = GraphExpander(graph_adj, max_depth=3, max_nodes=800)
+n_bfs, _, d_bfs = expander.expand(roots)
+n_bf, e_bf, d_bf = expander.expand_best_first(roots, estimator, top_k=20, w_dist=cfg.w_dist)
+print("BFS nodes:", len(n_bfs), "best-first nodes:", len(n_bf))
+assert len(n_bf) < len(n_bfs), "Best-first must stop early!"
+assert all(s in n_bf for s in roots), "Seeds must be in result!"
+assert all(e.from_id in n_bf or e.to_id in n_bf for e in e_bf), "Edge outside result!"
+
+top_bfs = scorer.score_all(q_emb, d_bfs, list(n_bfs), top_k=5)
+top_bf = scorer.score_all(q_emb, d_bf, list(n_bf), top_k=5)
+print("Top BFS:", top_bfs[0], "top best-first:", top_bf[0])
+assert top_bf[0][0] == target.id == top_bfs[0][0], "Best node must survive early stop!"
+
+
+print("\n=== 6. slack = exact_slack(): top-K == BFS over several queries ===")
+slack = scorer.exact_slack()
+print("exact slack:", slack)
+expander = GraphExpander(graph_adj, max_depth=3, max_nodes=100_000)
+seed_sets = [roots, roots[1:], [s.id for s in sections.values() if s.level == 2][:4]]
+targets = rng.choice([nid for nid, tn in text_nodes.items() if tn.text], size=4, replace=False)
+queries = [text_nodes[t].embedding + 0.3 * rng.standard_normal(64).astype(np.float32) for t in targets]
+queries += [rng.standard_normal(64).astype(np.float32) for _ in range(4)]
+for seeds in seed_sets:
+    n_bfs, _, d_bfs = expander.expand(seeds)
+    for q in queries:
+        est = lambda node_ids, dist: scorer.estimate(q, node_ids, dist)
+        n_bf, _, d_bf = expander.expand_best_first(seeds, est, top_k=20, w_dist=cfg.w_dist, slack=slack)
+        top_bfs = scorer.score_all(q, d_bfs, list(n_bfs), top_k=20)
+        top_bf = scorer.score_all(q, d_bf, list(n_bf), top_k=20)
+        ref = dict(top_bfs)
+        assert set(dict(top_bf)) == set(ref), "Top-K differs from BFS!"
+        # float32 mat-vec по разным наборам строк: расхождение в последних битах
+        assert all(math.isclose(sc, ref[nid], abs_tol=1e-6) for nid, sc in top_bf), "Scores differ!"
+print("Top-20 parity:", len(seed_sets) * len(queries), "seed set × query pairs")
+
+
+print("\n=== BEST-FIRST EXPAND TEST PASSED ===")
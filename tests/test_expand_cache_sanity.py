@@ -0,0 +1,55 @@
+# test_expand_cache_sanity.py
+
+from src.data.loaders import load_ontology
+from src.rag.expand import GraphExpander
+
+
+print("=== 1. Load ontology ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+
+roots = [s.id for s in sections.values() if s.level == 1]
+seed_sets = [
+    roots[:1],
+    roots[:3],
+    [sid for sid in sections][10:14],
+]
+
+
+print("\n=== 2. Cached merge == BFS (no truncation) ===")
+bfs = GraphExpander(graph_adj, max_depth=3, max_nodes=100_000)
+cached = GraphExpander(graph_adj, max_depth=3, max_nodes=100_000, cache_size=16)
+
+for seeds in seed_sets:
+    n1, e1, d1 = bfs.expand(seeds)
+    n2, e2, d2 = cached.expand(seeds)
+    print("Seeds:", seeds, "nodes:", len(n1), len(n2))
+    assert n1 == n2, "Node sets differ!"
+    assert d1 == d2, "Distances differ!"
+    assert {id(e) for e in e1} == {id(e) for e in e2}, "Edge sets differ!"
+
+
+print("\n=== 3. Truncation keeps BFS layers ===")
+bfs = GraphExpander(graph_adj, max_depth=3, max_nodes=50)
+cached = GraphExpander(graph_adj, max_depth=3, max_nodes=50, cache_size=16)
+for seeds in seed_sets:
+    n1, _, d1 = bfs.expand(seeds)
+    n2, e2, d2 = cached.expand(seeds)
+    assert len(n1) == len(n2), "Truncated sizes differ!"
+    assert sorted(d1.values()) == sorted(d2.values()), "Layer sizes differ!"
+    assert all(e.from_id in n2 and e.to_id in n2 for e in e2), "Dangling edge!"
+    assert all(s in n2 for s in seeds), "Seeds must be in result!"
+
+
+print("\n=== 4. LRU bound and invalidation ===")
+small = GraphExpander(graph_adj, max_depth=3, max_nodes=200, cache_size=2)
+small.warm(roots[:5])
+print("Cached neighbourhoods:", len(small._nbhd_cache))
+assert len(small._nbhd_cache) == 2, "LRU must stay bounded!"
+small.clear_cache()
+assert len(small._nbhd_cache) == 0, "clear_cache must empty the cache!"
+
+
+print("\n=== EXPAND CACHE TEST PASSED ===")
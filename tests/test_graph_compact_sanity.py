@@ -0,0 +1,65 @@
+# test_graph_compact_sanity.py
+
+import collections
+
+from src.data.loaders import load_ontology, load_json
+from src.rag.expand import GraphExpander
+
+
+print("=== 1. Raw vs compacted graph ===")
+sections, text_nodes, raw_adj = load_ontology("graphrag_nodes.json", "graphrag_edges.json", compact=False)
+_, _, graph_adj = load_ontology("graphrag_nodes.json", "graphrag_edges.json")
+
+raw_edges = [e for es in raw_adj.values() for e in es]
+edges = [e for es in graph_adj.values() for e in es]
+print("Edges:", len(raw_edges), "→", len(edges))
+assert len(raw_edges) == len(load_json("graphrag_edges.json"))
+
+
+print("\n=== 2. Every endpoint is a section or text node ===")
+known = set(sections) | set(text_nodes)
+dangling = [e for e in edges if e.from_id not in known or e.to_id not in known]
+print("Dangling edges:", len(dangling))
+assert not dangling, "Compacted graph must not point at pass-through nodes!"
+assert all(src in known for src in graph_adj)
+assert not any(e.from_id == e.to_id for e in edges), "No self-loops!"
+assert len({(e.from_id, e.to_id, e.relation_type) for e in edges}) == len(edges), "No duplicates!"
+
+
+print("\n=== 3. LINKS_TO via ReferenceTarget is rewired, not lost ===")
+types = collections.Counter(e.relation_type for e in edges)
+print(types)
+raw_links = [e for e in raw_edges if e.relation_type == "LINKS_TO" and e.to_id.startswith("ref_")]
+assert types["LINKS_TO"] > 0 and types["LINKS_TO"] <= len(raw_links)
+assert "HAS_ITEM" not in types and "CAPTIONS" not in types
+
+nodes_by_id = {n["id"]: n for n in load_json("graphrag_nodes.json")}
+checked = 0
+for e in raw_links:
+    target_page = int(nodes_by_id[e.to_id]["text"])
+    new = [x for x in graph_adj.get(e.from_id, []) if x.relation_type == "LINKS_TO"]
+    tgt_pages = set()
+    for x in new:
+        if x.to_id in text_nodes:
+            tgt_pages.add(int(text_nodes[x.to_id].page_start))
+        else:
+            tgt_pages.update(int(t.page_start) for t in text_nodes.values() if t.section_id == x.to_id)
+    if new:
+        assert target_page in tgt_pages, f"{e.from_id} → page {target_page} lost"
+        checked += 1
+print("Rewired links checked:", checked)
+assert checked > 0
+
+
+print("\n=== 4. Expansion budget goes to scorable nodes ===")
+seeds = [s.id for s in sections.values() if s.level == 1]
+raw_nodes, _, _ = GraphExpander(raw_adj, max_depth=3, max_nodes=400).expand(seeds)
+new_nodes, _, _ = GraphExpander(graph_adj, max_depth=3, max_nodes=400).expand(seeds)
+raw_useful = len([n for n in raw_nodes if n in known])
+new_useful = len([n for n in new_nodes if n in known])
+print("Scorable nodes in budget:", raw_useful, "→", new_useful)
+assert all(n in known for n in new_nodes)
+assert new_useful >= raw_useful
+
+
+print("\n=== GRAPH COMPACTION TEST PASSED ===")
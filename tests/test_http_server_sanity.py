@@ -0,0 +1,137 @@
+# test_http_server_sanity.py
+
+import asyncio
+import http.client
+import json
+import tempfile
+import threading
+import time
+
+from src.index.embeddings import EmbeddingModel, HASH_MODEL
+from src.index.staged_build import StagedBuild, BuildConfig
+from src.rag.pipeline import OntologyRAGPipeline
+from src.serve.http_server import RAGServer, ServerConfig
+
+
+class GatedModel:
+    """Хеш-модель, эмбеддинг ждёт gate — запрос «висит» в работе сколько нужно."""
+
+    def __init__(self, model):
+        self.model = model
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def embed(self, texts):
+        self.entered.set()
+        self.gate.wait(timeout=30)
+        return self.model.embed(texts)
+
+
+def request(port: int, method: str, path: str, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(method, path, body=None if body is None else json.dumps(body),
+                     headers={"Connection": "close"})
+        resp = conn.getresponse()
+        return resp.status, resp.getheader("Content-Type"), resp.read()
+    finally:
+        conn.close()
+
+
+def post(port: int, path: str, body):
+    status, _, data = request(port, "POST", path, body)
+    return status, json.loads(data)
+
+
+print("=== 1. RAGServer on an ephemeral port, hash-backend index ===")
+model = GatedModel(EmbeddingModel(HASH_MODEL))
+with tempfile.TemporaryDirectory() as index_dir:
+    StagedBuild(BuildConfig(out_dir=index_dir, model_name=HASH_MODEL), lambda name: model.model).run()
+    pipeline = OntologyRAGPipeline.from_index(index_dir, model)
+
+    server = RAGServer(pipeline, ServerConfig(host="127.0.0.1", port=0, max_queue=1))
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    listener = asyncio.run_coroutine_threadsafe(server.start(), loop).result(timeout=10)
+    port = listener.sockets[0].getsockname()[1]
+    print("Port:", port)
+
+    try:
+        status, res = post(port, "/query", {"query": "настройки рассылки"})
+        assert status == 200 and res["section_candidates"], "Plain query must be answered!"
+
+        print("\n=== 2. Request validation: 400 ===")
+        bad = [
+            {"projection": "nope"},
+            {"deadline_ms": 0},
+            {"deadline_ms": -5},
+            {"deadline_ms": "100"},
+            {"deadline_ms": True},
+            {"max_context_tokens": 0},
+            {"max_context_tokens": 1.5},
+            {"max_context_tokens": "100"},
+            {"max_context_tokens": True},
+        ]
+        for extra in bad:
+            for path in ("/query", "/query/stream"):
+                status, res = post(port, path, {"query": "настройки рассылки", **extra})
+                assert status == 400 and "error" in res, f"{path} {extra} must be 400, got {status}"
+            print("400:", extra, "→", res["error"])
+        status, res = post(port, "/query", {"query": "   "})
+        assert status == 400
+        status, res = post(port, "/query", {
+            "query": "настройки рассылки", "projection": "ids_only",
+            "deadline_ms": 5000, "max_context_tokens": 200,
+        })
+        assert status == 200, "Valid options must pass!"
+
+        print("\n=== 3. max_queue is full: 503 from _admit ===")
+        model.gate.clear()
+        model.entered.clear()
+        first = {}
+        blocker = threading.Thread(
+            target=lambda: first.update(res=post(port, "/query", {"query": "первый запрос"}))
+        )
+        blocker.start()
+        assert model.entered.wait(timeout=10), "First request must reach the model!"
+        rejected_before = server.stats["rejected"]
+        for path in ("/query", "/query/stream"):
+            status, res = post(port, path, {"query": "второй запрос"})
+            print(path, status, res)
+            assert status == 503, f"{path}: queue is full, must be 503!"
+        assert server.stats["rejected"] == rejected_before + 2
+        model.gate.set()
+        blocker.join(timeout=30)
+        assert first["res"][0] == 200, "The admitted request must still be answered!"
+        status, res = post(port, "/query", {"query": "третий запрос"})
+        assert status == 200, "Slot must be released after the request finishes!"
+
+        print("\n=== 4. /query/stream: NDJSON events ===")
+        status, ctype, data = request(port, "POST", "/query/stream", {"query": "настройки рассылки"})
+        assert status == 200 and ctype.startswith("application/x-ndjson")
+        events = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+        kinds = [ev["event"] for ev in events]
+        print("Events:", kinds)
+        assert kinds[0] == "seeds" and kinds[-1] == "done"
+        assert {"text_nodes", "plan", "section", "graph_context"} <= set(kinds)
+        assert "error" not in kinds
+        plan = next(ev for ev in events if ev["event"] == "plan")
+        sections = [ev["section"]["section_id"] for ev in events if ev["event"] == "section"]
+        assert sections == plan["section_ids"], "Sections must stream in plan order!"
+
+        # все запросы завершены — счётчик в работе вернулся к нулю
+        deadline = time.monotonic() + 5
+        while server.inflight and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert server.inflight == 0
+
+    finally:
+        model.gate.set()
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+
+print("\n=== HTTP SERVER TEST PASSED ===")
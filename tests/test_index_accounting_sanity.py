@@ -0,0 +1,72 @@
+# test_index_accounting_sanity.py
+
+import json
+import tempfile
+
+from src.data.loaders import load_ontology, build_reverse_adj
+from src.ontology.hierarchy import build_hierarchy
+from src.index.accounting import index_report
+from src.index.store import save_index, load_index, attach_embedding_matrices
+import numpy as np
+
+
+print("=== 1. Load ontology ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+graph_radj = build_reverse_adj(graph_adj)
+
+
+print("\n=== 2. Random embeddings, one section without E_local ===")
+dim = 32
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(dim).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = rng.standard_normal(dim).astype(np.float32)
+    sec.E_subtree = rng.standard_normal(dim).astype(np.float32)
+missing = next(iter(sections))
+sections[missing].E_local = None
+
+
+print("\n=== 3. Report ===")
+report = index_report(sections, text_nodes, graph_adj, graph_radj=graph_radj)
+json.dumps(report)  # отчёт сериализуем как есть
+
+comp = report["components"]
+print({k: v for k, v in comp.items()})
+assert report["total_bytes"] == sum(v for k, v in comp.items() if k != "embeddings_mapped")
+assert report["embeddings"]["text"]["data_bytes"] == len(text_nodes) * dim * 4
+assert report["embeddings"]["section_local"]["count"] == len(sections) - 1
+assert report["counts"]["sections_missing_E_local"] == [missing]
+assert report["counts"]["sections_missing_E_subtree"] == []
+
+n_edges = sum(len(v) for v in graph_adj.values())
+assert sum(report["counts"]["relations"].values()) == n_edges
+# рёбра graph_radj — те же объекты, второй раз не считаются
+assert report["adjacency"]["graph_radj"]["edges"] == n_edges
+assert report["adjacency"]["graph_radj"]["edge_bytes"] == 0
+
+n_graph = sum(report["counts"]["graph_nodes_by_kind"].values())
+assert sum(report["degrees"]["out_histogram"].values()) == n_graph
+assert sum(report["degrees"]["in_histogram"].values()) == n_graph
+assert report["texts"]["subtree_over_local"] >= 1.0
+
+
+print("\n=== 4. Memory-mapped embeddings are reported as mapped ===")
+sections[missing].E_local = rng.standard_normal(dim).astype(np.float32)
+with tempfile.TemporaryDirectory() as d:
+    save_index(d, sections, text_nodes, graph_adj)
+    sec2, tn2, adj2 = load_index(d)
+    attach_embedding_matrices(d, sec2, tn2, mmap=True)
+    mapped = index_report(sec2, tn2, adj2, dir_path=d)
+    assert mapped["embeddings"]["text"]["data_bytes"] == 0
+    assert mapped["embeddings"]["text"]["mapped_bytes"] == len(tn2) * dim * 4
+    assert mapped["components"]["embeddings_mapped"] > 0
+    assert "text_emb.npy" in mapped["files"]["by_file"]
+    print("Heap:", mapped["total_bytes"], "mapped:", mapped["components"]["embeddings_mapped"])
+
+
+print("\n=== INDEX ACCOUNTING TEST PASSED ===")
@@ -0,0 +1,92 @@
+# test_instrument_sanity.py
+
+import time
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.pipeline import OntologyRAGPipeline
+from src.rag.instrument import Instrumentation
+
+
+class FixedModel:
+    def __init__(self, target):
+        self.target = target
+
+    def encode(self, text):
+        return self.target
+
+
+print("=== 1. Pipeline with random embeddings ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(32).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = rng.standard_normal(32).astype(np.float32)
+    sec.E_subtree = sec.E_local
+
+root = next(s for s in sections.values() if s.level == 1)
+pipeline = OntologyRAGPipeline(
+    sections, text_nodes, graph_adj, embedding_model=FixedModel(root.E_local)
+)
+plain = pipeline.run_query("q", max_context_tokens=2000)
+
+
+print("\n=== 2. Timings and counters ===")
+inst = Instrumentation(timings=True, profile_every=2)
+calls = []
+inst.add_hook(
+    before=lambda stage, tr: calls.append(("before", stage)),
+    after=lambda stage, tr: calls.append(("after", stage)),
+)
+pipeline.instrument = inst
+
+result = pipeline.run_query("q", max_context_tokens=2000)
+print("Timings:", {k: round(v, 3) for k, v in result["timings"].items()})
+print("Counters:", result["counters"])
+
+for stage in ("embed", "drill", "expand", "score", "text_nodes", "pack", "assemble", "graph_context"):
+    assert stage in result["timings"], f"Missing stage {stage}"
+c = result["counters"]
+assert c["seeds"] > 0 and c["expanded_nodes"] >= c["seeds"]
+assert c["sections"] == len(result["section_candidates"])
+assert c["text_bytes"] > 0
+
+# результат тот же, что без инструментирования
+assert {k: v for k, v in result.items() if k not in ("timings", "counters")} == plain
+
+
+print("\n=== 3. Hooks fire in pairs ===")
+assert calls[0] == ("before", "embed")
+for (k1, s1), (k2, s2) in zip(calls[::2], calls[1::2]):
+    assert (k1, k2) == ("before", "after") and s1 == s2
+
+
+print("\n=== 4. Sampling profiler ===")
+for _ in range(3):
+    pipeline.run_query("q")
+summary = inst.summary()
+print("Summary queries:", summary["queries"], "profiled:", summary["profiled"])
+assert summary["queries"] == 4 and summary["profiled"] == 2
+report = inst.profile_report(top=5)
+assert "function calls" in report
+print(report.splitlines()[0].strip())
+
+
+print("\n=== 5. Disabled → no trace ===")
+pipeline.instrument = Instrumentation()
+assert "timings" not in pipeline.run_query("q")
+
+t0 = time.perf_counter()
+for _ in range(200):
+    pipeline.run_query("q")
+print("Disabled: %.3f ms/query" % ((time.perf_counter() - t0) * 1000 / 200))
+
+print("\n=== Done ===")
@@ -0,0 +1,78 @@
+# test_knn_sanity.py
+
+import tempfile
+
+import numpy as np
+
+from src.index.knn import KnnConfig, knn_blocked, knn_edges, SIMILAR_TO
+from src.index.staged_build import StagedBuild, BuildConfig
+from src.index.embeddings import EmbeddingModel, HASH_MODEL
+from src.index.store import load_index
+from src.rag.expand import GraphExpander, DirectionPolicy, direction_policies
+
+
+print("=== 1. Blocked top-M == brute force ===")
+rng = np.random.default_rng(0)
+emb = rng.standard_normal((2500, 48)).astype(np.float32)
+emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+groups = rng.integers(0, 40, len(emb))
+
+cfg = KnnConfig(top_m=6, min_sim=-1.0, block_rows=300, block_cols=700)
+nbr, sim = knn_blocked(emb, cfg, groups=groups, progress=False)
+
+full = emb @ emb.T
+full[groups[:, None] == groups[None, :]] = -np.inf
+ref = np.argsort(-full, axis=1, kind="stable")[:, :6]
+print("Match:", (nbr == ref).mean())
+assert np.array_equal(nbr, ref), "Blocked kNN must equal brute force!"
+assert np.allclose(sim, np.take_along_axis(full, ref, axis=1), atol=1e-5)
+assert not (groups[nbr] == groups[:, None]).any(), "Same-section neighbours must be skipped!"
+
+part_n, part_s = knn_blocked(emb, cfg, groups=groups, rows=(1000, 1400), progress=False)
+assert np.array_equal(part_n, nbr[1000:1400]), "Row shards must match the full run!"
+
+strict = KnnConfig(top_m=6, min_sim=0.3, block_rows=512, block_cols=512)
+n2, s2 = knn_blocked(emb, strict, progress=False)
+assert ((n2 < 0) | (s2 >= 0.3)).all() and (n2 != np.arange(len(emb))[:, None]).all()
+print("Block memory:", strict.block_bytes(), "bytes")
+
+
+print("\n=== 2. Edges carry weights ===")
+ids = [f"n{i}" for i in range(len(emb))]
+adj = knn_edges(ids, n2, s2)
+e = next(iter(adj.values()))[0]
+assert e.relation_type == SIMILAR_TO and e.weight >= 0.3
+
+
+print("\n=== 3. Staged build with knn → SIMILAR_TO in the saved graph ===")
+model = EmbeddingModel(HASH_MODEL)
+with tempfile.TemporaryDirectory() as out:
+    cfg = BuildConfig(out_dir=out, model_name=HASH_MODEL, knn=KnnConfig(top_m=4, min_sim=0.6))
+    StagedBuild(cfg, lambda name: model).run()
+    sections, text_nodes, graph_adj = load_index(out)
+
+similar = [e for es in graph_adj.values() for e in es if e.relation_type == SIMILAR_TO]
+print("SIMILAR_TO edges:", len(similar))
+assert similar, "Build must add SIMILAR_TO edges!"
+assert all(e.weight >= 0.6 for e in similar)
+assert all(text_nodes[e.from_id].section_id != text_nodes[e.to_id].section_id for e in similar)
+
+
+print("\n=== 4. GraphExpander follows SIMILAR_TO only when asked ===")
+src = similar[0].from_id
+seed = text_nodes[src].section_id
+plain = GraphExpander(graph_adj, max_depth=2, max_nodes=1000)
+nodes, edges, _ = plain.expand([seed])
+assert not any(e.relation_type == SIMILAR_TO for e in edges)
+
+policies = direction_policies(down=2, similar=DirectionPolicy(down=2, min_weight=0.6))
+nodes_s, edges_s, _ = GraphExpander(graph_adj, max_depth=2, max_nodes=1000, policies=policies).expand([seed])
+print("Nodes:", len(nodes), "→", len(nodes_s))
+assert similar[0].to_id in nodes_s and any(e.relation_type == SIMILAR_TO for e in edges_s)
+
+high = direction_policies(down=2, similar=DirectionPolicy(down=2, min_weight=1.1))
+_, edges_h, _ = GraphExpander(graph_adj, max_depth=2, max_nodes=1000, policies=high).expand([seed])
+assert not any(e.relation_type == SIMILAR_TO for e in edges_h), "min_weight must filter edges!"
+
+
+print("\n=== KNN TEST PASSED ===")
@@ -0,0 +1,83 @@
+# test_lexical_index_sanity.py
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.index.lexical_index import (
+    build_lexical_indexes, analyze, stem_ru,
+    varint_encode, varint_decode,
+)
+from src.rag.score import NodeScorer, ScoreConfig
+import numpy as np
+import pickle
+import time
+
+
+print("=== 1. Stemming / analyzer ===")
+assert stem_ru("сообщения") == stem_ru("сообщение") == stem_ru("сообщений")
+assert stem_ru("рассылки") == stem_ru("рассылка")
+print(analyze("Отправлять сообщения даже если клиент отписался"))
+
+
+print("\n=== 2. Varint round-trip ===")
+v = np.array([0, 1, 127, 128, 16383, 16384, 2**32 - 1], dtype=np.uint64)
+assert (varint_decode(varint_encode(v)) == v).all(), "Varint round-trip failed!"
+
+
+print("\n=== 3. Build indexes over ontology ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+lexical = build_lexical_indexes(sections, text_nodes)
+chunks = lexical["chunks"]
+print("Docs:", len(chunks.doc_ids), "Terms:", len(chunks.vocab))
+
+
+print("\n=== 4. Pickle keeps postings ===")
+blob = pickle.dumps(chunks)
+restored = pickle.loads(blob)
+print("Pickled bytes:", len(blob), "raw postings bytes:",
+      chunks.post_docs.nbytes + chunks.post_tf.nbytes)
+assert (restored.post_docs == chunks.post_docs).all()
+assert (restored.post_tf == chunks.post_tf).all()
+assert np.allclose(restored.idf, chunks.idf)
+
+
+print("\n=== 5. Exact UI label ranks first ===")
+query = "Отправлять сообщения даже если клиент отписался"
+terms = restored.query_terms(query)
+dense = restored.score_dense(terms)
+best = restored.doc_ids[int(dense.argmax())]
+print("Best chunk:", best, "→", text_nodes[best].text[:80])
+assert "отписался" in text_nodes[best].text.lower()
+
+rows = np.arange(len(restored.doc_ids))[::-1]
+assert np.allclose(restored.score_rows(terms, rows), dense[rows]), "score_rows != score_dense"
+
+t0 = time.perf_counter()
+for _ in range(100):
+    restored.score_rows(terms, rows[:800])
+print(f"score_rows(800 candidates): {(time.perf_counter() - t0) * 10:.3f} ms/query")
+
+
+print("\n=== 6. Hybrid scoring in NodeScorer ===")
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(32).astype(np.float32)
+q_emb = rng.standard_normal(32).astype(np.float32)
+candidates = list(text_nodes.keys())
+dist = {nid: 1 for nid in candidates}
+
+dense_only = NodeScorer(sections, text_nodes, ScoreConfig(), lexical=restored)
+hybrid = NodeScorer(sections, text_nodes, ScoreConfig(w_bm25=5.0), lexical=restored)
+
+top_dense = dense_only.score_all(q_emb, dist, candidates, top_k=5, query_text=query)
+top_hybrid = hybrid.score_all(q_emb, dist, candidates, top_k=5, query_text=query)
+print("Dense top:", [n for n, _ in top_dense])
+print("Hybrid top:", [n for n, _ in top_hybrid])
+assert top_hybrid[0][0] == best, "Heavy BM25 weight must pull the exact match to the top!"
+assert top_dense == dense_only.score_all(q_emb, dist, candidates, top_k=5), "w_bm25=0 must ignore query_text"
+
+
+print("\n=== LEXICAL INDEX TEST PASSED ===")
@@ -26,9 +26,11 @@ print("Non-document Sections (no level):", len(sections_without_level))
 
 
 print("\n=== 2. Load ontology via loaders ===")
+# граф как в экспорте: CAPTIONS / HAS_ITEM проверяются ниже, compact_graph их сворачивает
 sections, text_nodes, graph_adj = load_ontology(
     "graphrag_nodes.json",
-    "graphrag_edges.json"
+    "graphrag_edges.json",
+    compact=False,
 )
 
 print("Sections loaded by loader:", len(sections))
@@ -0,0 +1,80 @@
+# test_memmap_embeddings_build_sanity.py
+
+import pickle
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from src.index.embeddings import EmbeddingModel, HASH_MODEL
+from src.index.staged_build import StagedBuild, BuildConfig
+from src.index import store
+from src.index.store import load_index, embeddings_external, write_embedding_matrix
+from src.rag import pipeline as pipeline_mod
+from src.rag.pipeline import OntologyRAGPipeline
+
+
+print("=== 1. write_embedding_matrix: chunked gather, -1 → zero row ===")
+with tempfile.TemporaryDirectory() as d:
+    src = np.arange(40, dtype=np.float32).reshape(10, 4)
+    rows = np.array([3, -1, 0, 9, 3])
+    write_embedding_matrix(d, "m", src, rows, chunk_rows=2)
+    mat = np.load(Path(d) / "m.npy")
+    mask = np.load(Path(d) / "m_mask.npy")
+    assert np.array_equal(mat[[0, 2, 3, 4]], src[[3, 0, 9, 3]]) and not mat[1].any()
+    assert mask.tolist() == [True, False, True, True, True]
+
+
+print("\n=== 2. In-memory vs memmap-embeddings build: same index ===")
+model = EmbeddingModel(HASH_MODEL)
+with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+    StagedBuild(BuildConfig(out_dir=a, model_name=HASH_MODEL), lambda name: model).run()
+    StagedBuild(BuildConfig(out_dir=b, model_name=HASH_MODEL, memmap_embeddings=True), lambda name: model).run()
+
+    assert not embeddings_external(a) and embeddings_external(b)
+    with open(Path(b) / "text_nodes.pkl", "rb") as f:
+        raw = pickle.load(f)
+    assert all(tn.embedding is None for tn in raw.values()), "Memmap-embeddings pickle must not hold vectors!"
+    size_a = (Path(a) / "text_nodes.pkl").stat().st_size
+    size_b = (Path(b) / "text_nodes.pkl").stat().st_size
+    print("text_nodes.pkl:", size_a, "→", size_b, "bytes")
+    assert size_b < size_a
+
+    sa, ta, ga = load_index(a)
+    sb, tb, gb = load_index(b)
+    for tn in tb.values():
+        assert isinstance(tn.embedding, np.memmap) or tn.embedding is None
+        ref = ta[tn.id].embedding
+        assert (ref is None) == (tn.embedding is None)
+        if ref is not None:
+            assert np.array_equal(ref, tn.embedding)
+        assert tn.n_tokens == ta[tn.id].n_tokens and tn.cluster_id == ta[tn.id].cluster_id
+    for sec in sb.values():
+        for attr in ("E_local", "E_subtree"):
+            ref, got = getattr(sa[sec.id], attr), getattr(sec, attr)
+            assert (ref is None) == (got is None)
+            if ref is not None:
+                assert np.array_equal(ref, got)
+
+
+    print("\n=== 3. Pipeline on the memmap-embeddings index ===")
+    query = "Как работает функциональная структура Maxbot?"
+    ra = OntologyRAGPipeline.from_index(a, model).run_query(query)
+    attach = store.attach_embedding_matrices
+    calls = []
+    patched = [m for m in (store, pipeline_mod) if hasattr(m, "attach_embedding_matrices")]
+    for m in patched:
+        m.attach_embedding_matrices = lambda *args, **kw: calls.append(1) or attach(*args, **kw)
+    try:
+        pb = OntologyRAGPipeline.from_index(b, model)
+    finally:
+        for m in patched:
+            m.attach_embedding_matrices = attach
+    assert len(calls) == 1, "External matrices must be attached once!"
+    assert isinstance(pb.scorer.emb, np.memmap), "Scorer must use the .npy matrix as is!"
+    rb = pb.run_query(query)
+    assert [s["section_id"] for s in ra["section_candidates"]] == [s["section_id"] for s in rb["section_candidates"]]
+    assert ra["text_nodes"] == rb["text_nodes"]
+
+
+print("\n=== MEMMAP EMBEDDINGS BUILD TEST PASSED ===")
@@ -0,0 +1,69 @@
+# test_mmap_index_sanity.py
+
+import tempfile
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.index.store import save_embedding_matrices, attach_embedding_matrices
+from src.rag.score import NodeScorer, ScoreConfig
+
+
+print("=== 1. Load ontology + random embeddings ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+rng = np.random.default_rng(0)
+for i, tn in enumerate(text_nodes.values()):
+    tn.embedding = None if i % 13 == 0 else rng.standard_normal(32).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = rng.standard_normal(32).astype(np.float32)
+    sec.E_subtree = None
+q_emb = rng.standard_normal(32).astype(np.float32)
+
+ref_scorer = NodeScorer(sections, text_nodes, ScoreConfig())
+before = {nid: (None if tn.embedding is None else tn.embedding.copy())
+          for nid, tn in text_nodes.items()}
+
+
+print("\n=== 2. Save matrices and attach as memmap ===")
+with tempfile.TemporaryDirectory() as tmp:
+    save_embedding_matrices(tmp, sections, text_nodes, 32)
+    text_emb = attach_embedding_matrices(tmp, sections, text_nodes, mmap=True)
+
+    assert isinstance(text_emb, np.memmap), "Text matrix must be memory-mapped"
+    assert text_emb.shape == (len(text_nodes), 32)
+
+    for nid, tn in text_nodes.items():
+        if before[nid] is None:
+            assert tn.embedding is None, "Missing embeddings must stay None"
+        else:
+            assert np.array_equal(tn.embedding, before[nid])
+            assert tn.embedding.base is not None, "Embedding must be a view, not a copy"
+    assert all(s.E_subtree is None for s in sections.values())
+    print("Rows:", text_emb.shape[0])
+
+
+    print("\n=== 3. NodeScorer over shared matrix == copied matrix ===")
+    scorer = NodeScorer(sections, text_nodes, ScoreConfig(), emb_matrix=text_emb)
+    assert scorer.emb is text_emb, "Scorer must reuse the shared matrix"
+
+    cands = list(text_nodes)[:300]
+    dist = {nid: i % 4 for i, nid in enumerate(cands)}
+    got = scorer.score_all(q_emb, dist, cands, top_k=25)
+    ref = ref_scorer.score_all(q_emb, dist, cands, top_k=25)
+    assert [nid for nid, _ in got] == [nid for nid, _ in ref]
+    assert np.allclose([s for _, s in got], [s for _, s in ref])
+    print("Top-3:", got[:3])
+
+
+    print("\n=== 4. Row order mismatch → fallback ===")
+    shuffled = dict(reversed(list(text_nodes.items())))
+    assert attach_embedding_matrices(tmp, sections, shuffled) is None
+    del scorer, text_emb, got
+
+print("\n=== Done ===")
@@ -0,0 +1,133 @@
+# test_prefork_sanity.py
+
+import http.client
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from src.index.embeddings import EmbeddingModel, HASH_MODEL
+from src.index.staged_build import StagedBuild, BuildConfig
+from src.rag.pipeline import OntologyRAGPipeline
+from src.serve.http_server import RAGServer, ServerConfig
+from src.serve.prefork import PreforkServer, PreforkConfig
+
+
+def request(port: int, method: str, path: str, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request(method, path, body=None if body is None else json.dumps(body),
+                     headers={"Connection": "close"})
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read())
+    finally:
+        conn.close()
+
+
+def wait_pid(pid: int, timeout_s: float):
+    """Код выхода pid или None, если не завершился за timeout_s."""
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return os.waitstatus_to_exitcode(status)
+        time.sleep(0.05)
+    return None
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+print("=== 1. Hash-backend index, pipeline loaded once in the master (mmap) ===")
+model = EmbeddingModel(HASH_MODEL)
+with tempfile.TemporaryDirectory() as index_dir:
+    StagedBuild(BuildConfig(out_dir=index_dir, model_name=HASH_MODEL), lambda name: model).run()
+    pipeline = OntologyRAGPipeline.from_index(index_dir, None, mmap=True)
+
+    server_cfg = ServerConfig(host="127.0.0.1", port=0, cpu_workers=1)
+
+    def make_server(worker_no: int) -> RAGServer:
+        pipeline.model = model      # модель — в воркере, после fork
+        return RAGServer(pipeline, server_cfg)
+
+    prefork = PreforkServer(
+        make_server,
+        server_cfg,
+        PreforkConfig(workers=2, max_requests=2, max_requests_jitter=0,
+                      check_interval_s=0.05, drain_timeout_s=2.0, backlog=64),
+    )
+    sock = prefork.bind()
+    port = sock.getsockname()[1]
+
+    sys.stdout.flush()
+    master = os.fork()
+    if master == 0:
+        code = 1
+        try:
+            prefork.run(sock)
+            # упавший (не EXIT_RECYCLE и не 0) воркер — ошибка теста
+            code = 0 if prefork.stats["crashed"] == 0 and prefork.stats["recycled"] > 0 else 2
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+    sock.close()
+
+    try:
+        print("\n=== 2. Two workers come up ===")
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                status, health = request(port, "GET", "/health")
+                break
+            except OSError:
+                assert time.monotonic() < deadline, "Workers did not start!"
+                time.sleep(0.1)
+        assert status == 200 and health["worker"]["max_requests"] == 2
+        print("First worker:", health["worker"])
+
+        print("\n=== 3. Workers recycle after max_requests and are respawned ===")
+        pids = set()
+        served = 0
+        deadline = time.monotonic() + 60
+        while len(pids) < 4:
+            assert time.monotonic() < deadline, f"No recycling, pids seen: {pids}"
+            try:
+                status, res = request(port, "POST", "/query", {"query": "настройки рассылки"})
+                _, health = request(port, "GET", "/health")
+            except OSError:
+                # соединение попало на воркер, который как раз уходит на перезапуск
+                time.sleep(0.05)
+                continue
+            assert status == 200 and res["section_candidates"], "Query must be answered!"
+            served += 1
+            pids.add(health["worker"]["pid"])
+            time.sleep(0.06)
+        print("Served", served, "queries, worker pids:", sorted(pids))
+        assert master not in pids and os.getpid() not in pids
+
+    finally:
+        print("\n=== 4. SIGTERM shuts the master and all workers down ===")
+        os.kill(master, signal.SIGTERM)
+        code = wait_pid(master, timeout_s=20)
+        if code is None:
+            os.kill(master, signal.SIGKILL)
+            wait_pid(master, timeout_s=5)
+
+    print("Master exit code:", code)
+    assert code == 0, "Master must exit cleanly on SIGTERM, with recycled and no crashed workers!"
+    assert not any(alive(pid) for pid in pids), "Workers must not outlive the master!"
+    try:
+        request(port, "GET", "/health")
+        raise AssertionError("Socket must be closed after shutdown!")
+    except ConnectionRefusedError:
+        pass
+
+
+print("\n=== PREFORK TEST PASSED ===")
@@ -0,0 +1,148 @@
+# test_rerank_sanity.py
+
+from src.rag.rerank import CrossEncoderReranker
+import time
+
+
+class OverlapModel:
+    """Детерминированный «cross-encoder»: доля общих слов. Считает вызовы."""
+
+    def __init__(self, delay_s: float = 0.0):
+        self.calls = 0
+        self.delay_s = delay_s
+
+    def predict(self, pairs, batch_size=32):
+        self.calls += 1
+        time.sleep(self.delay_s)
+        out = []
+        for q, t in pairs:
+            qw, tw = set(q.lower().split()), set(t.lower().split())
+            out.append(len(qw & tw) / (len(qw) or 1))
+        return out
+
+
+items = [
+    ("n1", "настройки профиля"),
+    ("n2", "отписка от рассылки"),
+    ("n3", "клиент отписался от рассылки"),
+    ("n4", "не попадёт в top_n"),
+]
+
+
+print("=== 1. One batched call, top_n respected ===")
+model = OverlapModel()
+rr = CrossEncoderReranker(model=model, top_n=3, budget_ms=None)
+scores, info = rr.rerank("клиент отписался от рассылки", items)
+print("Scores:", scores, "Info:", info)
+assert model.calls == 1, "All misses must go in one predict() call!"
+assert set(scores) == {"n1", "n2", "n3"}, "Only top_n items are reranked!"
+assert max(scores, key=scores.get) == "n3"
+
+
+print("\n=== 2. Pair cache ===")
+scores2, info2 = rr.rerank("клиент отписался от рассылки", items)
+print("Info:", info2)
+assert model.calls == 1, "Cached pairs must not hit the model!"
+assert info2["cache_hits"] == 3 and info2["cache_misses"] == 0
+assert scores2 == scores
+
+
+print("\n=== 2b. Cache is keyed by text, not node_id ===")
+changed = [("n1", "клиент отписался от рассылки"), ("n2", "отписка от рассылки")]
+scores3, info3 = rr.rerank("клиент отписался от рассылки", changed)
+print("Info:", info3)
+assert info3["cache_hits"] == 2 and info3["cache_misses"] == 0, "Same texts must hit!"
+assert scores3["n1"] == scores["n3"], "n1 now has n3's text and must get its score!"
+changed = [("n1", "новый текст после переиндексации")]
+_, info3 = rr.rerank("клиент отписался от рассылки", changed)
+assert info3["cache_misses"] == 1 and model.calls == 2, "Changed text must not reuse the old score!"
+rr.clear_cache()
+_, info3 = rr.rerank("клиент отписался от рассылки", items)
+assert info3["cache_misses"] == 3 and model.calls == 3
+assert rr.stats["calls"] == 5 and rr.stats["cache_hits"] == 5
+
+
+print("\n=== 3. Budget skip ===")
+slow = OverlapModel(delay_s=0.02)
+rr = CrossEncoderReranker(model=slow, top_n=3, budget_ms=5.0)
+scores, info = rr.rerank("первый запрос", items)        # первая оценка стоимости
+assert scores is not None
+scores, info = rr.rerank("второй запрос", items)
+print("Info:", info)
+assert scores is None and info["skipped"], "Over-budget rerank must be skipped!"
+assert rr.stats["skipped"] == 1
+
+
+print("\n=== 4. Over budget: cached hits + as many misses as fit ===")
+model = OverlapModel()
+rr = CrossEncoderReranker(model=model, top_n=4, budget_ms=25.0)
+rr.rerank("клиент отписался от рассылки", items[:1])       # n1 в кэше
+rr.ms_per_pair = 10.0                                        # 3 промаха = 30 мс > 25
+scores, info = rr.rerank("клиент отписался от рассылки", items)
+print("Scores:", scores, "Info:", info)
+assert info["truncated"] == 1 and not info["skipped"]
+assert set(scores) == {"n1", "n2", "n3"}, "Hit + the first misses that fit must be scored!"
+assert rr.stats["truncated"] == 1 and rr.stats["skipped"] == 0
+
+
+print("\n=== 5. A slow first batch does not disable rerank forever ===")
+model = OverlapModel()
+rr = CrossEncoderReranker(model=model, top_n=3, budget_ms=5.0, probe_every=3)
+rr.ms_per_pair = 1000.0                                      # «холодная» первая пачка
+results = [rr.rerank(f"запрос {i}", items)[0] for i in range(3)]
+assert results[:2] == [None, None], "Nothing fits the budget: skipped"
+assert results[2] is not None and len(results[2]) == 1, "Every probe_every-th call scores one pair"
+assert rr.stats["probes"] == 1 and rr.ms_per_pair < 1000.0
+scores, info = rr.rerank("запрос 3", items)
+assert scores is not None and len(scores) >= 1, "Estimate has decayed, rerank is back"
+
+
+print("\n=== 6. Pipeline: rerank reorders section_candidates ===")
+import numpy as np
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.pipeline import OntologyRAGPipeline
+
+sections, text_nodes, graph_adj = load_ontology("graphrag_nodes.json", "graphrag_edges.json")
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(32).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = sec.E_subtree = rng.standard_normal(32).astype(np.float32)
+
+
+class PreferModel:
+    """Любит один текст: он должен стать первым и в text_nodes, и в секциях."""
+
+    def __init__(self):
+        self.favourite = None
+
+    def predict(self, pairs, batch_size=32):
+        return [1.0 if t == self.favourite else 0.0 for _, t in pairs]
+
+
+class Fixed:
+    def encode(self, text):
+        return next(iter(sections.values())).E_local
+
+
+prefer = PreferModel()
+pipeline = OntologyRAGPipeline(
+    sections, text_nodes, graph_adj, embedding_model=Fixed(), top_k_text=20,
+    reranker=CrossEncoderReranker(model=prefer, top_n=20, budget_ms=None),
+)
+plain = OntologyRAGPipeline(sections, text_nodes, graph_adj, embedding_model=Fixed(), top_k_text=20)
+ref = plain.run_query("настройки рассылки")
+# любимый — узел из секции, которая без rerank не первая
+fav = next(x for x in reversed(ref["text_nodes"]) if x["section_id"] != ref["section_candidates"][0]["section_id"])
+prefer.favourite = text_nodes[fav["node_id"]].text
+res = pipeline.run_query("настройки рассылки")
+assert res["text_nodes"][0]["node_id"] == fav["node_id"]
+top = res["section_candidates"][0]
+print("Top section:", top["section_id"], "rerank_score:", top.get("rerank_score"))
+assert top["section_id"] == fav["section_id"], "Rerank must reach section_candidates!"
+assert top["rerank_score"] == 1.0
+
+
+print("\n=== RERANK TEST PASSED ===")
@@ -0,0 +1,59 @@
+# test_reverse_adj_sanity.py
+
+from src.data.loaders import load_ontology, build_reverse_adj
+from src.rag.expand import GraphExpander, direction_policies
+
+
+print("=== 1. Load ontology ===")
+# граф без compact_graph: переписанные LINKS_TO ведут и к родительским секциям
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json",
+    compact=False,
+)
+graph_radj = build_reverse_adj(graph_adj)
+
+n_fwd = sum(len(v) for v in graph_adj.values())
+n_rev = sum(len(v) for v in graph_radj.values())
+print("Forward edges:", n_fwd)
+print("Reverse edges:", n_rev)
+assert n_fwd == n_rev, "Reverse adjacency must hold every edge exactly once!"
+
+for tgt, edges in graph_radj.items():
+    assert all(e.to_id == tgt for e in edges), f"Bad reverse key {tgt}"
+
+
+print("\n=== 2. Pick child section ===")
+child = next(s for s in sections.values() if s.parent_id is not None)
+parent_id = child.parent_id
+print("Child:", child.id, "Parent:", parent_id)
+
+
+print("\n=== 3. Default policy: outgoing edges only ===")
+expander = GraphExpander(graph_adj, max_depth=3, max_nodes=200)
+nodes, edges, dist = expander.expand([child.id])
+print("Expanded nodes:", len(nodes))
+assert parent_id not in nodes, "Default expansion must not climb to parent!"
+
+
+print("\n=== 4. up 1 via HAS_SUBSECTION, down 3 ===")
+policies = direction_policies(down=3, up={"HAS_SUBSECTION": 1})
+expander = GraphExpander(
+    graph_adj, max_depth=3, max_nodes=500,
+    graph_radj=graph_radj, policies=policies,
+)
+nodes, edges, dist = expander.expand([child.id])
+print("Expanded nodes:", len(nodes))
+assert parent_id in nodes, "Parent must be reachable with up=1!"
+assert dist[parent_id] == 1, "Parent must be one hop away!"
+
+grandparent_id = sections[parent_id].parent_id
+if grandparent_id is not None:
+    assert grandparent_id not in nodes, "up=1 must not climb two levels!"
+
+siblings = [cid for cid in sections[parent_id].children_ids if cid != child.id]
+print("Siblings reached:", [s for s in siblings if s in nodes])
+assert all(s in nodes for s in siblings), "Siblings must be reachable via parent!"
+
+
+print("\n=== REVERSE ADJACENCY TEST PASSED ===")
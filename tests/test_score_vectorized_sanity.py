@@ -0,0 +1,62 @@
+# test_score_vectorized_sanity.py
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.expand import GraphExpander
+from src.rag.score import NodeScorer, ScoreConfig, top_k_stable
+import numpy as np
+
+
+print("=== 1. Load ontology ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+
+print("\n=== 2. Random embeddings (no model needed) ===")
+rng = np.random.default_rng(0)
+for i, tn in enumerate(text_nodes.values()):
+    # часть узлов — без эмбеддинга, как пустые тексты
+    tn.embedding = None if i % 17 == 0 else rng.standard_normal(64).astype(np.float32)
+q_emb = rng.standard_normal(64).astype(np.float32)
+
+
+print("\n=== 3. Candidates from BFS ===")
+roots = [s.id for s in sections.values() if s.level == 1][:3]
+all_nodes, _, dist = GraphExpander(graph_adj, max_depth=3, max_nodes=400).expand(roots)
+candidates = list(all_nodes)
+print("Candidates:", len(candidates))
+
+
+print("\n=== 4. Vectorized == reference loop ===")
+scorer = NodeScorer(sections, text_nodes, ScoreConfig())
+
+reference = []
+for nid in candidates:
+    if nid not in text_nodes:
+        assert scorer.score_one(nid, q_emb, dist) == -999.0, "Non-text node must score -999"
+        continue
+    reference.append((nid, scorer.score_one(nid, q_emb, dist)))
+reference.sort(key=lambda x: x[1], reverse=True)
+
+for top_k in (1, 10, 50, 10_000):
+    ranked = scorer.score_all(q_emb, dist, candidates, top_k=top_k)
+    expected = reference[:top_k]
+    assert [n for n, _ in ranked] == [n for n, _ in expected], f"Ranking differs at top_k={top_k}"
+    assert np.allclose([s for _, s in ranked], [s for _, s in expected], atol=1e-6), "Scores differ"
+    print(f"top_k={top_k}: OK ({len(ranked)} nodes)")
+
+assert scorer.score_all(q_emb, dist, [], top_k=10) == [], "Empty candidates → empty result"
+
+
+print("\n=== 5. Ties keep candidate order ===")
+ties = np.array([0.5, 0.9, 0.5, 0.9, 0.1, 0.5])
+for k in range(1, len(ties) + 1):
+    expected = sorted(range(len(ties)), key=lambda i: ties[i], reverse=True)[:k]
+    assert list(top_k_stable(ties, k)) == expected, f"Unstable top-k at k={k}"
+print("Ties: OK")
+
+
+print("\n=== VECTORIZED SCORE TEST PASSED ===")
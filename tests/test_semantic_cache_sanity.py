@@ -0,0 +1,109 @@
+# test_semantic_cache_sanity.py
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.index.lexical_index import build_lexical_indexes
+from src.rag.cache import SemanticCache
+from src.rag.pipeline import OntologyRAGPipeline
+from src.rag.score import ScoreConfig
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+rng = np.random.default_rng(0)
+clock = FakeClock()
+cache = SemanticCache(threshold=0.95, max_entries=3, ttl_s=60, clock=clock)
+
+a = rng.standard_normal(16).astype(np.float32)
+paraphrase = a + 0.05 * rng.standard_normal(16).astype(np.float32)
+other = rng.standard_normal(16).astype(np.float32)
+
+
+print("=== 1. Miss → put → hit on a paraphrase ===")
+assert cache.lookup(a, "fp") is None
+cache.put(a, "fp", "как отписаться", {"query": "как отписаться"}, latency_ms=40.0)
+
+hit = cache.lookup(paraphrase, "fp")
+assert hit is not None, "Paraphrase must hit"
+query, result, sim, latency = hit
+print("Similarity:", round(sim, 4))
+assert query == "как отписаться" and sim >= 0.95 and latency == 40.0
+assert cache.lookup(other, "fp") is None, "Unrelated query must miss"
+
+
+print("\n=== 2. Fingerprint must match ===")
+assert cache.lookup(a, "other-config") is None
+
+
+print("\n=== 3. LRU eviction ===")
+b, c, d = (rng.standard_normal(16).astype(np.float32) for _ in range(3))
+clock.now = 1
+cache.put(b, "fp", "b", {}, 10.0)
+clock.now = 2
+cache.put(c, "fp", "c", {}, 10.0)
+clock.now = 3
+assert cache.lookup(a, "fp") is not None      # a — самая свежая по использованию
+clock.now = 4
+cache.put(d, "fp", "d", {}, 10.0)             # вытесняет b
+assert len(cache) == 3
+assert cache.lookup(b, "fp") is None
+assert cache.lookup(a, "fp") is not None
+
+
+print("\n=== 4. TTL ===")
+clock.now = 100
+assert cache.lookup(a, "fp") is None
+assert len(cache) == 0
+
+
+print("\n=== 5. Metrics ===")
+m = cache.metrics()
+print(m)
+assert m["hits"] == 3 and m["evictions"] == 1 and m["expired"] == 3
+assert 0 < m["hit_rate"] < 1
+assert m["saved_ms"] > 0
+
+
+print("\n=== 6. Pipeline with BM25: different exact terms must miss ===")
+
+
+class FixedModel:
+    """Любой запрос → один и тот же эмбеддинг (как у почти совпадающих формулировок)."""
+
+    def __init__(self, vec):
+        self.vec = vec
+
+    def encode(self, text):
+        return self.vec
+
+
+sections, text_nodes, graph_adj = load_ontology("graphrag_nodes.json", "graphrag_edges.json")
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(16).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = sec.E_subtree = rng.standard_normal(16).astype(np.float32)
+root = next(s for s in sections.values() if s.level == 1)
+
+pipe_cache = SemanticCache(threshold=0.95)
+pipeline = OntologyRAGPipeline(
+    sections, text_nodes, graph_adj, embedding_model=FixedModel(root.E_local),
+    score_cfg=ScoreConfig(w_bm25=0.3), lexical=build_lexical_indexes(sections, text_nodes),
+    result_cache=pipe_cache,
+)
+first = pipeline.run_query("ошибка при отправке рассылки")
+same_terms = pipeline.run_query("Ошибки отправки рассылки")
+assert same_terms.get("cache", {}).get("hit"), "Same analyzed terms must hit"
+other = pipeline.run_query("ошибка при импорте контактов")
+assert "cache" not in other, "Different exact terms must miss despite identical embeddings"
+print("Cache:", pipe_cache.metrics())
+
+print("\n=== Done ===")
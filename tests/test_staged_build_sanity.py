@@ -0,0 +1,112 @@
+# test_staged_build_sanity.py
+
+import tempfile
+import zlib
+
+import numpy as np
+
+from src.index.staged_build import StagedBuild, BuildConfig, node_texts
+from src.index.store import load_index, load_lexical
+
+
+class CrcModel:
+    """Детерминированный вектор по crc32 текста; может «упасть» после N вызовов encode."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.calls = 0
+        self.texts = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("simulated crash")
+        self.texts += len(texts)
+        return np.stack([vec(t) for t in texts])
+
+    def count_tokens(self, texts):
+        return [len(t.split()) for t in texts]
+
+
+def vec(text):
+    return np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(16).astype(np.float32)
+
+
+def no_model(name):
+    raise AssertionError("model must not be loaded for cached stages")
+
+
+with tempfile.TemporaryDirectory() as out:
+    cfg = BuildConfig(out_dir=out, model_name="crc", batch_size=16, flush_every=2)
+
+    print("=== 1. Crash in the middle of section embeddings ===")
+    crashing = CrcModel(fail_after=5)
+    try:
+        StagedBuild(cfg, lambda name: crashing).run()
+        raise AssertionError("build must fail")
+    except RuntimeError as e:
+        print("Crashed:", e)
+
+    print("\n=== 2. Rerun resumes from the last flushed batch ===")
+    model = CrcModel()
+    build = StagedBuild(cfg, lambda name: model)
+    status = build.run()
+    print(status)
+    assert status["load"] == status["hierarchy"] == status["dedup"] == "cached"
+    assert status["section_embeddings"] == "resumed"
+    assert status["text_embeddings"] == status["save"] == "built"
+
+    # 4 сброшенных пачки по 16 не считаются повторно
+    n_sec = len({t for s in build.sections.values() for t in (s.local_text.strip(), s.subtree_text.strip()) if t})
+    # почти-дубликаты не эмбеддятся: их вектор — вектор представителя
+    n_txt = len(node_texts(build.text_nodes, build.cluster_of))
+    assert build.cluster_of, "Ontology must contain near-duplicate chunks!"
+    assert n_txt < len({tn.text for tn in build.text_nodes.values() if tn.text and tn.text.strip()})
+    assert model.texts == (n_sec - 4 * 16) + n_txt, "Flushed rows must not be re-embedded!"
+
+    print("\n=== 3. Result == embeddings of the same texts ===")
+    sections, text_nodes, _ = load_index(out)
+    for sec in sections.values():
+        t = sec.local_text.strip()
+        assert (sec.E_local is None) == (not t)
+        if t:
+            assert np.array_equal(sec.E_local, vec(t))
+        if sec.subtree_text.strip():
+            assert np.array_equal(sec.E_subtree, vec(sec.subtree_text.strip()))
+    for tn in text_nodes.values():
+        assert tn.cluster_id == build.cluster_of.get(tn.id)
+        text = text_nodes[tn.cluster_id].text if tn.cluster_id else tn.text
+        if text and text.strip():
+            assert np.array_equal(tn.embedding, vec(text))
+        assert tn.n_tokens == len(tn.text.split())
+    assert load_lexical(out) is not None
+
+    print("\n=== 4. Everything cached: no model, nothing rebuilt ===")
+    status = StagedBuild(cfg, no_model).run()
+    assert set(status.values()) == {"cached"}, status
+
+    print("\n=== 5. --force lexical rebuilds lexical and save only ===")
+    status = StagedBuild(cfg, no_model).run(force=["lexical"])
+    print(status)
+    assert status["lexical"] == status["save"] == "built"
+    assert status["section_embeddings"] == status["text_embeddings"] == "cached"
+
+    print("\n=== 6. Dedup disabled: every text embedded again ===")
+    cfg_nd = BuildConfig(out_dir=out, model_name="crc", batch_size=16, flush_every=2, dedup=None)
+    model = CrcModel()
+    status = StagedBuild(cfg_nd, lambda name: model).run()
+    print(status)
+    assert status["dedup"] == status["text_embeddings"] == "built"
+    assert status["section_embeddings"] == status["lexical"] == "cached"
+    assert model.texts == len({tn.text for tn in text_nodes.values() if tn.text and tn.text.strip()})
+
+    print("\n=== 7. Another model name invalidates embeddings ===")
+    cfg2 = BuildConfig(out_dir=out, model_name="crc-2", batch_size=16, flush_every=2)
+    model = CrcModel()
+    status = StagedBuild(cfg2, lambda name: model).run()
+    assert status["hierarchy"] == status["graph"] == status["lexical"] == "cached"
+    assert status["section_embeddings"] == status["text_embeddings"] == "built"
+    assert model.texts == n_sec + n_txt
+
+
+print("\n=== STAGED BUILD TEST PASSED ===")
@@ -0,0 +1,106 @@
+# test_stream_query_sanity.py
+
+import numpy as np
+
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+from src.rag.pipeline import OntologyRAGPipeline
+
+
+class FixedModel:
+    """Запрос «похож» на заданный вектор — модель не нужна."""
+
+    def __init__(self, target):
+        self.target = target
+
+    def encode(self, text):
+        return self.target
+
+
+print("=== 1. Load ontology + random embeddings ===")
+sections, text_nodes, graph_adj = load_ontology(
+    "graphrag_nodes.json",
+    "graphrag_edges.json"
+)
+sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+rng = np.random.default_rng(0)
+for tn in text_nodes.values():
+    tn.embedding = rng.standard_normal(32).astype(np.float32)
+for sec in sections.values():
+    sec.E_local = rng.standard_normal(32).astype(np.float32)
+    sec.E_subtree = sec.E_local
+
+# запрос рядом с первой корневой секцией — drill гарантированно найдёт seed-ы
+root = next(s for s in sections.values() if s.level == 1)
+pipeline = OntologyRAGPipeline(
+    sections, text_nodes, graph_adj, embedding_model=FixedModel(root.E_local), top_k_text=40
+)
+query = "настройки рассылки"
+
+
+print("\n=== 2. Event order ===")
+events = list(pipeline.stream_query(query, max_context_tokens=2000))
+kinds = [ev["event"] for ev in events]
+print("Events:", kinds)
+
+n_sections = kinds.count("section")
+assert kinds[:3] == ["seeds", "text_nodes", "plan"]
+assert kinds[3:3 + n_sections] == ["section"] * n_sections
+assert kinds[-2:] == ["graph_context", "done"]
+assert n_sections == len(events[2]["section_ids"]) > 0
+assert "context_budget" in events[2]
+
+elapsed = [ev["elapsed_ms"] for ev in events]
+assert elapsed == sorted(elapsed), "elapsed_ms must be monotonic"
+done = events[-1]
+print("First section ms: %.2f, total ms: %.2f" % (done["first_section_ms"], done["total_ms"]))
+assert done["first_section_ms"] <= done["total_ms"]
+
+
+print("\n=== 3. Stream == run_query ===")
+result = pipeline.run_query(query, max_context_tokens=2000)
+sections_streamed = [ev["section"] for ev in events if ev["event"] == "section"]
+assert result["section_candidates"] == sections_streamed
+assert result["text_nodes"] == events[1]["text_nodes"]
+assert result["graph_context"] == events[-2]["graph_context"]
+assert result["context_budget"] == events[2]["context_budget"]
+assert list(result) == ["query", "section_candidates", "text_nodes", "graph_context", "context_budget"]
+
+
+print("\n=== 4. Early stop ===")
+unbudgeted = pipeline.run_query(query)
+expected_first = unbudgeted["section_candidates"][0]["section_id"]
+
+gen = pipeline.stream_query(query)
+first = next(ev for ev in gen if ev["event"] == "section")
+gen.close()
+assert first["rank"] == 0 and first["section"]["section_id"] == expected_first
+
+
+print("\n=== 5. Projections ===")
+full = pipeline.run_query(query, max_context_tokens=2000, projection="full")
+assert full == result
+
+only = pipeline.run_query(query, max_context_tokens=2000, projection="sections_only")
+assert list(only) == ["query", "section_candidates", "context_budget"]
+assert only["section_candidates"] == full["section_candidates"]
+
+ids = pipeline.run_query(query, max_context_tokens=2000, projection="ids_only")
+assert "graph_context" not in ids
+assert all("text" not in x for x in ids["text_nodes"] + ids["section_candidates"])
+assert [x["section_id"] for x in ids["section_candidates"]] == \
+    [x["section_id"] for x in full["section_candidates"]]
+
+debug = pipeline.run_query(query, max_context_tokens=2000, projection="debug")
+assert debug["section_candidates"] == full["section_candidates"]
+assert all("dist" in x for x in debug["text_nodes"])
+print("Debug:", {k: v for k, v in debug["debug"].items() if k != "fingerprint"})
+
+try:
+    pipeline.run_query(query, projection="everything")
+    assert False, "Unknown projection must raise"
+except ValueError:
+    pass
+
+print("\n=== Done ===")
@@ -0,0 +1,59 @@
+# test_synth_ontology_sanity.py
+
+import collections
+import json
+import tempfile
+from pathlib import Path
+
+from benchmarks.synth_ontology import SynthConfig, generate
+from src.data.loaders import load_ontology
+from src.ontology.hierarchy import build_hierarchy
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    print("=== 1. Generate ===")
+    cfg = SynthConfig(n_nodes=3000, depth=3, fanout=3, seed=1)
+    stats = generate(tmp, cfg)
+    print("Stats:", {k: v for k, v in stats.items() if k != "config"})
+    assert stats["nodes"] >= cfg.n_nodes
+    assert stats["nodes"] < cfg.n_nodes * 1.1, "Generator overshoots the node budget"
+
+    raw_nodes = json.load(open(Path(tmp) / "graphrag_nodes.json", encoding="utf-8"))
+    raw_edges = json.load(open(Path(tmp) / "graphrag_edges.json", encoding="utf-8"))
+    assert len(raw_nodes) == stats["nodes"] and len(raw_edges) == stats["edges"]
+
+    types = collections.Counter(n["type"] for n in raw_nodes)
+    rels = collections.Counter(e["type"] for e in raw_edges)
+    print("Node types:", dict(types))
+    print("Edge types:", dict(rels))
+    assert set(types) == {"Section", "Chunk", "ListItem", "Figure", "ReferenceTarget", "Url"}
+    assert set(rels) == {"HAS_SUBSECTION", "HAS_CHUNK", "HAS_ITEM", "CAPTIONS", "LINKS_TO"}
+
+    ids = {n["id"] for n in raw_nodes}
+    assert len(ids) == len(raw_nodes), "Duplicate node ids"
+    assert all(e["source"] in ids and e["target"] in ids for e in raw_edges), "Dangling edge"
+
+
+    print("\n=== 2. Same schema as the manual: loaders accept it ===")
+    sections, text_nodes, graph_adj = load_ontology(
+        str(Path(tmp) / "graphrag_nodes.json"),
+        str(Path(tmp) / "graphrag_edges.json"),
+    )
+    sections, text_nodes = build_hierarchy(sections, text_nodes)
+
+    assert len(sections) == types["Section"]
+    assert {s.level for s in sections.values()} == {1, 2, 3}
+    assert all(tn.section_id is not None for tn in text_nodes.values())
+    assert any(tn.node_type == "caption" for tn in text_nodes.values())
+    # номера страниц отброшены loader-ом, как в исходных данных
+    assert not any(tn.text.isdigit() for tn in text_nodes.values())
+    print("Sections:", len(sections), "Text nodes:", len(text_nodes))
+
+
+    print("\n=== 3. Deterministic ===")
+    with tempfile.TemporaryDirectory() as tmp2:
+        generate(tmp2, cfg)
+        assert (Path(tmp) / "graphrag_edges.json").read_bytes() == \
+            (Path(tmp2) / "graphrag_edges.json").read_bytes()
+
+print("\n=== Done ===")